@@ -1,13 +1,39 @@
+import logging
+import secrets
+import threading
 from flask import Flask,session
 from flask_sqlalchemy import SQLAlchemy
-from config import Config
+from sqlalchemy import event
+from config import Config, engine_options
 
 db = SQLAlchemy()
 
+# Held while init_services() runs, so concurrent first requests start the services once.
+_services_lock = threading.Lock()
+
+def configure_sqlite(engine, config):
+    # Per-connection SQLite settings (see Config): by default WAL so readers don't block
+    # the writers, the matching synchronous level, and a busy timeout instead of "database is locked".
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f"PRAGMA journal_mode={config.get('SQLITE_JOURNAL_MODE', 'WAL')}")
+        cursor.execute(f"PRAGMA synchronous={config.get('SQLITE_SYNCHRONOUS', 'NORMAL')}")
+        cursor.execute(f"PRAGMA busy_timeout={int(config.get('SQLITE_BUSY_TIMEOUT', 5000))}")
+        cursor.execute(f"PRAGMA cache_size={int(config.get('SQLITE_CACHE_SIZE', -20000))}")
+        cursor.close()
+
 def create_app():
     app = Flask(__name__)
     app.config.from_object(Config)
-    app.secret_key='your_secret_key'
+    # Sessions and bearer tokens are signed with the secret key: never run with a known one.
+    if not app.config.get('SECRET_KEY'):
+        if not app.debug:
+            raise RuntimeError("SECRET_KEY is not set (set the SECRET_KEY environment variable)")
+        logging.getLogger(__name__).warning("SECRET_KEY is not set, using a random key for this debug run")
+        app.config['SECRET_KEY'] = secrets.token_hex(32)
+    # Pooling and driver options matching the configured database (see config.engine_options).
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config))
     db.init_app(app)
     from .routes.index_routes import index as index_blueprint
     app.register_blueprint(index_blueprint)
@@ -15,6 +41,111 @@ def create_app():
     app.register_blueprint(auth_blueprint)
     from .routes.user_routes import user as user_blueprint
     app.register_blueprint(user_blueprint)
+    from .routes.ocr_routes import ocr as ocr_blueprint
+    app.register_blueprint(ocr_blueprint)
+    from .routes.vehicle_routes import vehicle as vehicle_blueprint
+    app.register_blueprint(vehicle_blueprint)
+    from .routes.event_routes import event as event_blueprint
+    app.register_blueprint(event_blueprint)
+    from .routes.recognize_routes import recognize as recognize_blueprint
+    app.register_blueprint(recognize_blueprint)
+    from .routes.metrics_routes import metrics as metrics_blueprint
+    app.register_blueprint(metrics_blueprint)
+    from .routes.gate_routes import gate as gate_blueprint
+    app.register_blueprint(gate_blueprint)
+    # Request latency and database query metrics, served on /metrics.
+    from .instrumentation import init_request_metrics, init_query_metrics
+    init_request_metrics(app)
+    from .cli import db_cli, users_cli
+    app.cli.add_command(users_cli)
+    app.cli.add_command(db_cli)
+    # How long a logged in user's identity and role are cached (see app.auth).
+    from .auth import identity_cache
+    identity_cache.ttl = app.config.get('AUTH_CACHE_TTL', 30)
+    # How often gate settings changed by other processes are picked up (see app.gates).
+    from .gates import gate_configs
+    gate_configs.refresh_interval = app.config.get('GATE_CONFIG_REFRESH', 5.0)
+    # Serialized user pages kept for conditional GETs (see app.http_cache).
+    from .http_cache import page_cache
+    page_cache.max_entries = app.config.get('USER_PAGE_CACHE_SIZE', 256)
+    # Password hashing pool and login rate limits.
+    from .passwords import PasswordHasher
+    from .rate_limit import RateLimiter
+    app.extensions['password_hasher'] = PasswordHasher(
+        method=app.config.get('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1'),
+        workers=app.config.get('PASSWORD_HASH_WORKERS', 2),
+        max_pending=app.config.get('PASSWORD_HASH_QUEUE', 64)
+    )
+    app.extensions['login_ip_limiter'] = RateLimiter(app.config.get('LOGIN_IP_LIMIT', 30), 60)
+    app.extensions['login_account_limiter'] = RateLimiter(app.config.get('LOGIN_ACCOUNT_LIMIT', 5), 300)
+    # Gate events are written in the background (the writer thread starts with the first event)
+    # and also feed the live gate streams.
+    from .events import EventRecorder
+    from .stream import GateHub
+    app.extensions['gate_hub'] = GateHub(max_buffer=app.config.get('STREAM_BUFFER_SIZE', 100))
+    app.extensions['event_recorder'] = EventRecorder(
+        app,
+        max_batch=app.config.get('EVENT_BATCH_SIZE', 500),
+        flush_interval=app.config.get('EVENT_FLUSH_INTERVAL', 1.0),
+        hub=app.extensions['gate_hub']
+    )
     with app.app_context():
-        db.create_all()
-        return app
+        if db.engine.dialect.name == 'sqlite':
+            configure_sqlite(db.engine, app.config)
+        init_query_metrics(db.engine)
+
+    # Migrations, the plate index and the background workers start with the first request
+    # (or an explicit init_services call), not here: CLI commands and scripts don't need them.
+    @app.before_request
+    def start_services():
+        if not app.extensions.get('services_started'):
+            init_services(app)
+
+    return app
+
+def prepare_database(app):
+    """
+    Bring the schema up to date (see app.migrations), or warn if that is left
+    to the CLI (DB_AUTO_MIGRATE off), and detect the user search index.
+    Runs once per app; the users CLI commands and init_services call it.
+    """
+    if 'user_fts' in app.extensions:
+        return
+    with app.app_context():
+        from . import migrations
+        if app.config.get('DB_AUTO_MIGRATE', True):
+            migrations.upgrade(db.engine)
+        elif migrations.current_version(db.engine) < migrations.head():
+            logging.getLogger(__name__).warning(
+                "Database schema is out of date, run: flask --app run db upgrade")
+        # Full-text index for the /users search (SQLite with FTS5 only).
+        from .search import has_user_search
+        app.extensions['user_fts'] = has_user_search(db.engine)
+
+def init_services(app):
+    """
+    Start what serving requests needs: the database schema, the in-memory
+    plate index, the OCR warmup and the /recognize runner if jobs are waiting.
+    Runs once per app, on the first request; scripts that use the app without
+    requests can call it themselves.
+    """
+    with _services_lock:
+        if app.extensions.get('services_started'):
+            return
+        prepare_database(app)
+        if app.config.get('OCR_WARMUP'):
+            # Warm the shared OCR reader without delaying the request.
+            import ocr_reader
+            ocr_reader.warmup_in_background()
+        with app.app_context():
+            # Load the registered vehicles into the in-memory plate index for gate decisions.
+            from .models import Vehicle
+            from .http_cache import table_version
+            from .plate_index import plate_index
+            plate_index.refresh_interval = app.config.get('PLATE_INDEX_REFRESH', 5.0)
+            plate_index.load(Vehicle.query.yield_per(10000), table_version('vehicle'))
+            # Resume /recognize jobs that are queued, or were running in a process that stopped (lease expired).
+            from .jobs import get_runner, recover_jobs
+            if recover_jobs():
+                get_runner()
+        app.extensions['services_started'] = True
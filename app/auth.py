@@ -0,0 +1,131 @@
+import threading
+import time
+from collections import namedtuple
+from functools import wraps
+from flask import current_app, g, jsonify, request, session
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+from . import db
+from .models import User
+
+# What protected routes need to know about the caller; no password hash.
+Identity = namedtuple('Identity', ['id', 'name', 'role', 'status', 'gate_no'])
+
+class IdentityCache:
+    """
+    Short-lived in-process cache of user id -> Identity, so protected routes
+    don't query the user table on every request. Entries expire after `ttl`
+    seconds and are dropped as soon as the user is updated or deleted here;
+    the ttl bounds how stale a change made by another process can be.
+    """
+
+    def __init__(self, ttl=30):
+        self.ttl = ttl
+        self.entries = {}  # user id -> (expiry time, Identity)
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        entry = self.entries.get(user_id)
+        if entry is None or entry[0] < time.monotonic():
+            return None
+        return entry[1]
+
+    def set(self, identity):
+        with self._lock:
+            self.entries[identity.id] = (time.monotonic() + self.ttl, identity)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self.entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+
+# The cache used by the app.
+identity_cache = IdentityCache()
+
+def token_serializer():
+    return URLSafeTimedSerializer(current_app.secret_key, salt='auth-token')
+
+def issue_token(user_id):
+    """ Signed bearer token for API clients (gate controllers) that don't keep cookies. """
+    return token_serializer().dumps({'user_id': user_id})
+
+def request_user_id():
+    # From the signed session cookie, or an "Authorization: Bearer <token>" header.
+    user_id = session.get('user_id')
+    if user_id is not None:
+        return user_id
+    header = request.headers.get('Authorization', '')
+    if header.startswith('Bearer '):
+        max_age = current_app.config.get('AUTH_TOKEN_MAX_AGE', 12 * 3600)
+        try:
+            return token_serializer().loads(header[7:], max_age=max_age)['user_id']
+        except (BadSignature, KeyError, TypeError):
+            return None
+    return None
+
+def load_identity(user_id):
+    identity = identity_cache.get(user_id)
+    if identity is None:
+        row = db.session.execute(
+            db.select(User.id, User.name, User.role, User.status, User.gate_no).where(User.id == user_id)).first()
+        if row is None:
+            return None
+        identity = Identity(*row)
+        identity_cache.set(identity)
+    return identity
+
+def current_user():
+    """
+    Identity of the logged in user, or None. Resolved at most once per request
+    (kept on flask.g) and served from identity_cache when possible.
+    """
+    if 'current_user' not in g:
+        user_id = request_user_id()
+        g.current_user = load_identity(user_id) if user_id is not None else None
+    return g.current_user
+
+def require_role(*roles):
+    """
+    Route decorator: 401 if nobody is logged in, 403 unless the user has one
+    of the given roles and an active account, e.g. @require_role('admin').
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            user = current_user()
+            if user is None:
+                return jsonify({'error': 'Login required'}), 401
+            if user.role not in roles or user.status != 'active':
+                return jsonify({'error': 'Permission denied'}), 403
+            return view(*args, **kwargs)
+        return wrapped
+    return decorator
+
+def login_required(view):
+    """ Route decorator: 401 if nobody is logged in. """
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        if current_user() is None:
+            return jsonify({'error': 'Login required'}), 401
+        return view(*args, **kwargs)
+    return wrapped
+
+# Drop cached identities of users changed or deleted in a committed session,
+# the same way app.models keeps the plate index in sync.
+@db.event.listens_for(db.session, 'after_flush')
+def collect_user_changes(session, flush_context):
+    changed = session.info.setdefault('changed_users', set())
+    for obj in list(session.dirty) + list(session.deleted):
+        if isinstance(obj, User):
+            changed.add(obj.id)
+
+@db.event.listens_for(db.session, 'after_commit')
+def invalidate_changed_users(session):
+    for user_id in session.info.pop('changed_users', ()):
+        identity_cache.invalidate(user_id)
+
+@db.event.listens_for(db.session, 'after_rollback')
+def discard_user_changes(session):
+    session.info.pop('changed_users', None)
@@ -0,0 +1,213 @@
+import csv
+import io
+import json
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from . import db
+from .http_cache import bump_version
+from .models import User
+from .passwords import get_hasher
+
+# Columns written by export and read by import. Password hashes are never exported.
+EXPORT_FIELDS = ['id', 'name', 'email', 'phone_number', 'role', 'status', 'gate_no']
+# Rows are checked, hashed and committed this many at a time.
+CHUNK_SIZE = 1000
+# Per-row errors kept in the import report; further failures are only counted.
+MAX_REPORTED_ERRORS = 1000
+
+def read_rows(stream, fmt):
+    """
+    Parse an uploaded file into dicts one row at a time.
+    stream is a binary file object, fmt 'csv' or 'ndjson'. Rows that can't be
+    parsed are yielded as ValueError instances so they can be reported. A
+    file that can't be read any further (malformed CSV, not UTF-8) ends with
+    one such error instead of raising.
+    """
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    try:
+        if fmt == 'csv':
+            yield from csv.DictReader(text)
+            return
+        for line in text:
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield ValueError(f'Invalid JSON: {e}')
+                continue
+            yield row if isinstance(row, dict) else ValueError('Expected a JSON object')
+    except (csv.Error, UnicodeDecodeError) as e:
+        # Earlier chunks are already committed: report where reading stopped.
+        yield ValueError(f'Unreadable file, the rest was skipped: {e}')
+
+def text_field(row, *keys, numbers=False):
+    """
+    First non-empty value of keys in the row as a stripped string ('' if
+    none). Raises ValueError for other JSON types (numbers only if allowed).
+    """
+    for key in keys:
+        value = row.get(key)
+        if value is None or value == '':
+            continue
+        if numbers and isinstance(value, int) and not isinstance(value, bool):
+            value = str(value)
+        if not isinstance(value, str):
+            raise ValueError(f'{key} must be a string')
+        return value.strip()
+    return ''
+
+def clean_row(row, default_role, default_status):
+    """ Validate one input row and turn it into column values. Raises ValueError. """
+    name = text_field(row, 'name')
+    # Emails are matched exactly, like registration and login do.
+    email = text_field(row, 'email')
+    phone = text_field(row, 'phone_number', 'phone', numbers=True)
+    if not name or not email or not phone:
+        raise ValueError('name, email and phone_number are required')
+    if '@' not in email:
+        raise ValueError('Invalid email')
+    if len(phone) > 15:
+        raise ValueError('Phone number is too long')
+    # Either a plain password (hashed here) or a hash exported from another werkzeug-based system.
+    password = text_field(row, 'password')
+    password_hash = text_field(row, 'password_hash')
+    if not password and not password_hash:
+        raise ValueError('password or password_hash is required')
+    if password_hash and password_hash.count('$') < 2:
+        raise ValueError('password_hash is not a werkzeug password hash')
+    gate_no = row.get('gate_no')
+    try:
+        if isinstance(gate_no, bool):
+            raise TypeError
+        gate_no = int(gate_no) if gate_no not in (None, '') else None
+    except (TypeError, ValueError):
+        raise ValueError('gate_no must be a number')
+    role = text_field(row, 'role') or default_role
+    if role not in User.ROLES:
+        raise ValueError(f"role must be one of {', '.join(User.ROLES)}")
+    status = text_field(row, 'status') or default_status
+    if status not in User.STATUSES:
+        raise ValueError(f"status must be one of {', '.join(User.STATUSES)}")
+    return {
+        'name': name,
+        'email': email,
+        'password': password_hash or password,
+        'phone_number': phone,
+        'role': role,
+        'status': status,
+        'gate_no': gate_no,
+    }, not password_hash
+
+class ImportReport:
+    """ Counts and per-row errors of one import run. """
+
+    def __init__(self):
+        self.imported = 0
+        self.failed = 0
+        self.errors = []
+
+    def error(self, line, email, message):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'row': line, 'email': email, 'error': message})
+
+    def to_dict(self):
+        return {'imported': self.imported, 'failed': self.failed, 'errors': self.errors}
+
+def import_users(rows, chunk_size=CHUNK_SIZE, default_role='pending', default_status='active'):
+    """
+    Create users from an iterable of dicts (see read_rows) and return an ImportReport.
+    Each chunk costs one query to find already registered emails, one
+    password-hashing pass and one bulk INSERT + commit. Rows are numbered from 1
+    in the report.
+    """
+    report = ImportReport()
+    # Passwords are hashed on the app's shared hasher pool (same KDF parameters
+    # as logins), so an import can't take more cores than PASSWORD_HASH_WORKERS.
+    hasher = get_hasher()
+    seen = set()  # Emails earlier in the same file
+    chunk = []
+    for line, row in enumerate(rows, 1):
+        chunk.append((line, row))
+        if len(chunk) >= chunk_size:
+            _import_chunk(chunk, seen, hasher, report, default_role, default_status)
+            chunk = []
+    if chunk:
+        _import_chunk(chunk, seen, hasher, report, default_role, default_status)
+    return report
+
+def _import_chunk(chunk, seen, hasher, report, default_role, default_status):
+    valid = []  # (line, values, needs hashing)
+    for line, row in chunk:
+        if isinstance(row, Exception):
+            report.error(line, None, str(row))
+            continue
+        try:
+            values, needs_hash = clean_row(row, default_role, default_status)
+        except ValueError as e:
+            email = row.get('email')
+            report.error(line, email if isinstance(email, str) else None, str(e))
+            continue
+        if values['email'] in seen:
+            report.error(line, values['email'], 'Duplicate email in file')
+            continue
+        seen.add(values['email'])
+        valid.append((line, values, needs_hash))
+
+    # One set-based lookup for the whole chunk instead of one query per user.
+    emails = [values['email'] for _, values, _ in valid]
+    registered = set(db.session.scalars(select(User.email).where(User.email.in_(emails)))) if emails else set()
+    pending = []
+    for line, values, needs_hash in valid:
+        if values['email'] in registered:
+            report.error(line, values['email'], 'Email already registered')
+        else:
+            pending.append((line, values, needs_hash))
+
+    to_hash = [values for _, values, needs_hash in pending if needs_hash]
+    for values, hashed in zip(to_hash, hasher.hash_many([v['password'] for v in to_hash])):
+        values['password'] = hashed
+
+    if not pending:
+        return
+    try:
+        db.session.execute(User.__table__.insert(), [values for _, values, _ in pending])
+        bump_version('user')  # Core inserts don't go through the ORM flush that bumps it.
+        db.session.commit()
+        report.imported += len(pending)
+    except IntegrityError:
+        # Someone registered one of these emails meanwhile: retry row by row to find it.
+        db.session.rollback()
+        for line, values, _ in pending:
+            try:
+                db.session.execute(User.__table__.insert(), [values])
+                bump_version('user')
+                db.session.commit()
+                report.imported += 1
+            except IntegrityError:
+                db.session.rollback()
+                report.error(line, values['email'], 'Email already registered')
+
+def export_users(fmt, batch_size=CHUNK_SIZE):
+    """
+    Yield all users as CSV or NDJSON text, a batch of rows at a time.
+    Rows are streamed from the database cursor instead of loaded all at once.
+    """
+    columns = [getattr(User, field) for field in EXPORT_FIELDS]
+    result = db.session.execute(
+        select(*columns).order_by(User.id).execution_options(yield_per=batch_size))
+    if fmt == 'csv':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(EXPORT_FIELDS)
+        for rows in result.partitions():
+            writer.writerows(rows)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
+    else:
+        for rows in result.partitions():
+            yield ''.join(json.dumps(dict(zip(EXPORT_FIELDS, row))) + '\n' for row in rows)
@@ -0,0 +1,65 @@
+import json
+import sys
+import time
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from . import db, migrations, prepare_database
+from .bulk_users import CHUNK_SIZE, export_users, import_users, read_rows
+from .models import User
+
+users_cli = AppGroup('users', help='Bulk user import and export.')
+db_cli = AppGroup('db', help='Database schema migrations.')
+
+def file_format(path, fmt):
+    # Use --format if given, otherwise guess from the file extension.
+    if fmt:
+        return fmt
+    return 'csv' if path.lower().endswith('.csv') else 'ndjson'
+
+@users_cli.command('import')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'ndjson']), help='Input format (default: from extension).')
+@click.option('--chunk-size', default=CHUNK_SIZE, show_default=True, help='Rows committed per transaction.')
+@click.option('--role', default='pending', show_default=True, type=click.Choice(User.ROLES),
+              help='Role for rows without one.')
+@click.option('--status', default='active', show_default=True, type=click.Choice(User.STATUSES),
+              help='Status for rows without one.')
+def import_command(path, fmt, chunk_size, role, status):
+    """ Import users from a CSV or NDJSON file, e.g. flask --app run users import staff.csv """
+    prepare_database(current_app)
+    start = time.perf_counter()
+    with open(path, 'rb') as f:
+        report = import_users(read_rows(f, file_format(path, fmt)), chunk_size=chunk_size,
+                              default_role=role, default_status=status)
+    for error in report.errors:
+        click.echo(json.dumps(error), err=True)
+    click.echo(f"Imported {report.imported} users, {report.failed} failed "
+               f"in {time.perf_counter() - start:.1f}s")
+    if report.failed:
+        sys.exit(1)
+
+@users_cli.command('export')
+@click.argument('path', required=False)
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'ndjson']), help='Output format (default: from extension, csv for stdout).')
+def export_command(path, fmt):
+    """ Export all users to a file, or to stdout if no path is given. """
+    prepare_database(current_app)
+    if not path:
+        for chunk in export_users(fmt or 'csv'):
+            sys.stdout.write(chunk)
+        return
+    with open(path, 'w', encoding='utf-8', newline='') as out:
+        for chunk in export_users(file_format(path, fmt)):
+            out.write(chunk)
+
+@db_cli.command('upgrade')
+def upgrade_command():
+    """ Apply pending schema migrations. """
+    applied = migrations.upgrade(db.engine)
+    click.echo(f"Applied migrations {applied}" if applied else "Schema is up to date")
+
+@db_cli.command('current')
+def current_command():
+    """ Show the schema version of the database and of the code. """
+    click.echo(f"Database: {migrations.current_version(db.engine)}, code: {migrations.head()}")
@@ -0,0 +1,184 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from flask import current_app
+from . import db
+from .models import GateEvent
+
+logger = logging.getLogger(__name__)
+
+def utcnow():
+    # Naive UTC timestamp, the way the DateTime columns are stored.
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+class EventRecorder:
+    """
+    Write-behind recorder for gate events.
+    record() only puts the event on an in-memory queue, so it never blocks the
+    recognition path; a background thread writes the queued events with one
+    bulk INSERT whenever max_batch events are waiting or flush_interval
+    seconds have passed. The thread starts with the first recorded event, so
+    apps that never record (CLI commands) don't run it, and pending events are
+    flushed on shutdown. If the queue is full (the database can't keep up),
+    new events are dropped and counted.
+    If a batch fails, its events are written one by one, and the ones that
+    still fail are logged and kept in dead_letters (the latest 1000).
+    Recorded events are also pushed to live subscribers through `hub` (a
+    GateHub) right away, without waiting for the database write.
+    """
+
+    def __init__(self, app, max_batch=500, flush_interval=1.0, max_queue=100000, hub=None):
+        self.app = app
+        self.hub = hub
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.dropped = 0
+        self.written = 0
+        self.failed = 0
+        self.dead_letters = deque(maxlen=1000)
+        self._stop = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def _start(self):
+        # Start the writer thread once, on the first record().
+        with self._start_lock:
+            if self._thread is None and not self._stop.is_set():
+                self._thread = threading.Thread(target=self._run, name='gate-event-writer', daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+
+    def record(self, plate, confidence=0.0, gate_no=None, image_ref=None, decision=None, created_at=None):
+        """ Queue one gate event for writing. Returns False if it had to be dropped. """
+        if self._thread is None:
+            self._start()
+        event = {
+            'created_at': created_at or utcnow(),
+            'gate_no': gate_no,
+            'plate': plate,
+            'confidence': float(confidence or 0.0),
+            'decision': decision,
+            'image_ref': image_ref,
+        }
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            self.dropped += 1
+            return False
+        if self.hub is not None:
+            self.hub.publish(gate_no, dict(event, created_at=event['created_at'].isoformat()))
+        return True
+
+    def _take_batch(self, timeout):
+        # Wait for the first event, then take whatever else is queued up to max_batch.
+        try:
+            batch = [self.queue.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+        while len(batch) < self.max_batch:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        pending = []
+        deadline = time.monotonic() + self.flush_interval
+        while not self._stop.is_set():
+            for item in self._take_batch(max(0.0, deadline - time.monotonic())):
+                if isinstance(item, threading.Event):
+                    # A flush() marker: everything queued before it is in pending now.
+                    self._write(pending)
+                    pending = []
+                    item.set()
+                else:
+                    pending.append(item)
+            if len(pending) >= self.max_batch or time.monotonic() >= deadline:
+                self._write(pending)
+                pending = []
+                deadline = time.monotonic() + self.flush_interval
+        self._write_items(pending + self._drain())
+
+    def _drain(self):
+        items = []
+        while True:
+            try:
+                items.append(self.queue.get_nowait())
+            except queue.Empty:
+                return items
+
+    def _write_items(self, items):
+        # Write queued events mixed with flush() markers, then release the markers.
+        self._write([item for item in items if not isinstance(item, threading.Event)])
+        for item in items:
+            if isinstance(item, threading.Event):
+                item.set()
+
+    def _write(self, events):
+        if not events:
+            return
+        try:
+            with self.app.app_context():
+                # One executemany INSERT and one commit for the whole batch.
+                db.session.execute(GateEvent.__table__.insert(), events)
+                db.session.commit()
+            self.written += len(events)
+            return
+        except Exception:
+            logger.exception("Failed to write %d gate events, retrying one by one", len(events))
+        self._write_each(events)
+
+    def _write_each(self, events):
+        # Only the events that fail on their own are lost to the table; they are logged in full.
+        with self.app.app_context():
+            db.session.rollback()
+            for event in events:
+                try:
+                    db.session.execute(GateEvent.__table__.insert(), [event])
+                    db.session.commit()
+                    self.written += 1
+                except Exception:
+                    db.session.rollback()
+                    self.failed += 1
+                    self.dead_letters.append(event)
+                    logger.exception("Dropped gate event %r", event)
+
+    def flush(self, timeout=None):
+        """
+        Write everything recorded so far, including the events the writer
+        thread already took off the queue. Returns False on timeout.
+        """
+        if self._stop.is_set() or self._thread is None or not self._thread.is_alive():
+            self._write_items(self._drain())
+            return True
+        marker = threading.Event()
+        try:
+            self.queue.put(marker, timeout=timeout)
+        except queue.Full:
+            return False
+        return marker.wait(timeout)
+
+    def close(self):
+        """ Stop the writer thread and flush the remaining events. """
+        with self._start_lock:
+            if self._stop.is_set():
+                return
+            self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        else:
+            self._write_items(self._drain())
+
+def get_recorder(app=None):
+    # The recorder is created by create_app() and kept in app.extensions.
+    return (app or current_app).extensions['event_recorder']
+
+def record_event(plate, confidence=0.0, gate_no=None, image_ref=None, decision=None):
+    """ Record a gate event with the current app's recorder. """
+    return get_recorder().record(plate, confidence, gate_no, image_ref, decision)
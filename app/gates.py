@@ -0,0 +1,97 @@
+import threading
+import time
+from collections import namedtuple
+from sqlalchemy import func, select
+from . import db
+from .models import Gate
+
+# Snapshot of a gate's settings, safe to use outside the session that loaded it.
+GateConfig = namedtuple('GateConfig', 'gate_no name camera_url profile ocr_budget_ms weight max_frame_age_ms')
+
+def default_config(gate_no):
+    # Settings of a gate without a Gate row: default profile, no budget, weight 1, nothing dropped.
+    return GateConfig(gate_no, None, None, None, None, 1, None)
+
+class GateConfigCache:
+    """
+    In-process copy of the gate table, so the job dispatcher and the OCR
+    routes don't query it per frame. Commits in this process that change a
+    gate clear the cache right away; changes made by other processes are
+    noticed within refresh_interval seconds by a cheap check of the row
+    count and the latest updated_at.
+    """
+
+    def __init__(self, refresh_interval=5.0):
+        self.refresh_interval = refresh_interval
+        self._configs = None  # gate number -> GateConfig, None until loaded
+        self._stamp = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+
+    def _load(self):
+        # Needs an app context.
+        stamp = tuple(db.session.execute(select(func.count(Gate.id), func.max(Gate.updated_at))).one())
+        if self._configs is not None and stamp == self._stamp:
+            return
+        configs = {gate.gate_no: GateConfig(gate.gate_no, gate.name, gate.camera_url, gate.profile,
+                                            gate.ocr_budget_ms, gate.weight, gate.max_frame_age_ms)
+                   for gate in Gate.query.all()}
+        self._configs, self._stamp = configs, stamp
+
+    def all(self):
+        """ All configured gates, by gate number. """
+        with self._lock:
+            now = time.monotonic()
+            if self._configs is None or now - self._checked > self.refresh_interval:
+                self._load()
+                self._checked = now
+            return self._configs
+
+    def get(self, gate_no):
+        """ The settings of a gate, or the defaults for gates that are not configured (and None). """
+        return self.all().get(gate_no) or default_config(gate_no)
+
+    def invalidate(self):
+        with self._lock:
+            self._configs = None
+
+gate_configs = GateConfigCache()
+
+@db.event.listens_for(db.session, 'after_flush')
+def collect_gate_changes(session, flush_context):
+    if any(isinstance(obj, Gate) for obj in list(session.new) + list(session.dirty) + list(session.deleted)):
+        session.info['gates_changed'] = True
+
+@db.event.listens_for(db.session, 'after_commit')
+def invalidate_gate_configs(session):
+    if session.info.pop('gates_changed', False):
+        gate_configs.invalidate()
+
+@db.event.listens_for(db.session, 'after_rollback')
+def discard_gate_changes(session):
+    session.info.pop('gates_changed', None)
+
+class WeightedRoundRobin:
+    """
+    Smooth weighted round-robin (as used by nginx): every pick, each gate
+    with work gains its weight in credit, the gate with the most credit is
+    served and pays back the total. A gate of weight 3 next to a gate of
+    weight 1 is served 3 times out of 4, interleaved rather than in bursts,
+    and a busy gate can't take the turns of the others. Gates without work
+    lose their credit, so an idle gate can't save up turns for a burst.
+    """
+
+    def __init__(self):
+        self.credit = {}
+        self._lock = threading.Lock()
+
+    def pick(self, weights):
+        """ Choose among {gate: weight} the gates that have work. Returns None if there are none. """
+        if not weights:
+            return None
+        with self._lock:
+            self.credit = {gate: self.credit.get(gate, 0) + max(1, weight) for gate, weight in weights.items()}
+            # Ties go to the lowest gate number (gate None, jobs without a gate, last).
+            chosen = max(sorted(weights, key=lambda gate: (gate is None, gate or 0)), key=self.credit.get)
+            self.credit[chosen] -= sum(max(1, weight) for weight in weights.values())
+            return chosen
@@ -0,0 +1,95 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from flask import current_app, jsonify, request
+from sqlalchemy import select, update
+from . import db
+from .models import TableVersion, User, Vehicle
+
+# Models whose writes bump a table version, by version name. The plate index
+# also uses the 'vehicle' version to pick up changes made by other processes.
+TRACKED = {User: 'user', Vehicle: 'vehicle'}
+
+def table_version(name):
+    """ Current change counter of a table (one primary key lookup). """
+    return db.session.execute(select(TableVersion.version).where(TableVersion.name == name)).scalar() or 0
+
+def bump_version(name, session=None):
+    """
+    Increase a table's version in the current transaction, so it is only
+    visible once the write it belongs to is committed. The ORM writes to
+    tracked models bump it by themselves; call this after Core bulk writes.
+    """
+    connection = (session or db.session).connection()
+    bumped = connection.execute(update(TableVersion).where(TableVersion.name == name)
+                                .values(version=TableVersion.version + 1)).rowcount
+    if not bumped:
+        connection.execute(TableVersion.__table__.insert().values(name=name, version=1))
+
+@db.event.listens_for(db.session, 'after_flush')
+def bump_changed_tables(session, flush_context):
+    changed = {TRACKED[type(obj)] for obj in list(session.new) + list(session.dirty) + list(session.deleted)
+               if type(obj) in TRACKED}
+    for name in changed:
+        bump_version(name, session)
+
+class PageCache:
+    """
+    Small LRU cache of serialized JSON responses, keyed by the table version
+    and the request's query string. A write bumps the version, so stale
+    pages are never served; they just age out of the cache.
+    """
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            payload = self._entries.get(key)
+            if payload is not None:
+                self._entries.move_to_end(key)
+            return payload
+
+    def set(self, key, payload):
+        with self._lock:
+            self._entries[key] = payload
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+page_cache = PageCache()
+
+def query_key():
+    # The query parameters in a canonical order, so ?a=1&b=2 and ?b=2&a=1 share a cache entry.
+    return '&'.join(f'{k}={v}' for k, v in sorted(request.args.items(multi=True)))
+
+def cached_json(name, key, build):
+    """
+    Serve a read endpoint with an ETag derived from a table version.
+    A request whose If-None-Match matches gets 304 without running build;
+    otherwise the serialized body is taken from the page cache or produced
+    by build() -> (body dict, status). Only 200 responses are cached.
+    """
+    version = table_version(name)
+    etag = f"{name}-{version}-{hashlib.sha1(f'{request.path}?{key}'.encode()).hexdigest()[:16]}"
+    if request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+    else:
+        payload = page_cache.get((name, version, request.path, key))
+        if payload is None:
+            body, status = build()
+            if status != 200:
+                return jsonify(body), status
+            payload = jsonify(body).get_data()
+            page_cache.set((name, version, request.path, key), payload)
+        response = current_app.response_class(payload, mimetype='application/json')
+    response.set_etag(etag)
+    # Clients may keep the response but must check it is still current (a cheap 304) before using it.
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
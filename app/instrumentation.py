@@ -0,0 +1,54 @@
+import time
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from metrics import REGISTRY
+
+REQUEST_SECONDS = REGISTRY.histogram(
+    'anpr_http_request_seconds', 'Request latency by route (blueprint endpoint), method and status.',
+    ['endpoint', 'method', 'status'])
+DB_QUERY_SECONDS = REGISTRY.histogram(
+    'anpr_db_query_seconds', 'Database statement time by the route that ran it.', ['endpoint'],
+    buckets=(0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0))
+
+FRAMES_DROPPED = REGISTRY.counter(
+    'anpr_gate_frames_dropped_total', 'Queued recognition jobs dropped for waiting longer than their gate allows.',
+    ['gate'])
+
+def current_endpoint():
+    # Route of the current request, 'background' for work outside requests (e.g. the event writer).
+    if not has_request_context():
+        return 'background'
+    return request.endpoint or 'unmatched'
+
+def init_request_metrics(app):
+    """ Time every request of the app. """
+    @app.before_request
+    def start_timer():
+        g.request_start = time.perf_counter()
+
+    @app.after_request
+    def observe_request(response):
+        start = g.get('request_start')
+        if start is not None:
+            REQUEST_SECONDS.observe(time.perf_counter() - start, current_endpoint(), request.method,
+                                    str(response.status_code))
+        return response
+
+def init_query_metrics(engine):
+    """ Count and time every statement run on the engine. """
+    @event.listens_for(engine, 'before_cursor_execute')
+    def start_query_timer(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def observe_query(conn, cursor, statement, parameters, context, executemany):
+        start = conn.info['query_start'].pop()
+        DB_QUERY_SECONDS.observe(time.perf_counter() - start, current_endpoint())
+
+    @event.listens_for(engine, 'handle_error')
+    def drop_query_timer(context):
+        # A failed statement never reaches after_cursor_execute: drop its start time,
+        # or the stack of a pooled connection grows with every error.
+        conn = context.connection
+        if conn is not None and conn.info.get('query_start'):
+            conn.info['query_start'].pop()
@@ -0,0 +1,282 @@
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from urllib.parse import urlsplit
+import requests
+from flask import current_app
+from sqlalchemy import delete, select, update
+from image_fetch import get_fetcher
+from ocr_pool import PoolBusy
+from . import db
+from .events import get_recorder, utcnow
+from .gates import WeightedRoundRobin, gate_configs
+from .instrumentation import FRAMES_DROPPED
+from .models import RecognitionJob
+from .plate_index import plate_index
+
+logger = logging.getLogger(__name__)
+
+def new_job_id():
+    return uuid.uuid4().hex
+
+class JobRunner:
+    """
+    Works through the RecognitionJob queue stored in the database.
+    A dispatcher thread picks a gate by weighted round-robin among the gates
+    with queued jobs, drops that gate's jobs that are older than its
+    max_frame_age_ms, and claims its oldest remaining job (a conditional
+    UPDATE, so several app processes can share one queue). A claimed job
+    records the claiming process and a lease that the dispatcher renews
+    while the job runs; jobs whose lease ran out (their process died) are
+    queued again by any runner. The image is
+    downloaded if it was given as a URL and handed to the OCR worker pool
+    with the gate's preprocessing profile, OCR budget and weight (the pool
+    shares its workers between these jobs and /ocr/frames by gate weight). The pool's
+    callbacks only hand the outcome to the I/O threads, which store the
+    result, record a gate event if the job has a gate number, and POST the
+    job to its callback URL. At most max_in_flight jobs
+    are claimed at a time; the rest wait in the table, so the queue survives
+    restarts.
+    """
+
+    def __init__(self, app, pool, max_in_flight=8, poll_interval=1.0, keep_for=timedelta(days=1),
+                 lease=timedelta(seconds=60)):
+        self.app = app
+        self.pool = pool
+        self.poll_interval = poll_interval
+        self.keep_for = keep_for  # Finished jobs are deleted after this long.
+        self.lease = lease
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"[-64:]
+        self._renewed = 0.0
+        self.slots = threading.BoundedSemaphore(max_in_flight)
+        self.scheduler = WeightedRoundRobin()
+        self.wake = threading.Event()
+        self._stop = threading.Event()
+        # Downloads, result writes and webhooks run here, so they never block the dispatcher or the pool.
+        self.io = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix='recognize-io')
+        self.session = requests.Session()
+        self._thread = threading.Thread(target=self._run, name='recognize-dispatcher', daemon=True)
+        self._thread.start()
+
+    def notify(self):
+        """ Wake the dispatcher after new jobs were queued. """
+        self.wake.set()
+
+    def _run(self):
+        last_purge = None
+        while not self._stop.is_set():
+            if time.monotonic() - self._renewed > self.lease.total_seconds() / 3:
+                self._renew_leases()
+            if not self.slots.acquire(timeout=self.poll_interval):
+                continue
+            try:
+                with self.app.app_context():
+                    job = self._claim()
+                    if job is None and (last_purge is None or utcnow() - last_purge > timedelta(minutes=10)):
+                        last_purge = utcnow()
+                        self._purge()
+            except Exception:
+                logger.exception("Could not claim a recognition job")
+                job = None
+            if job is None:
+                self.slots.release()
+                self.wake.wait(self.poll_interval)
+                self.wake.clear()
+                continue
+            self.io.submit(self._start, *job)
+
+    def _renew_leases(self):
+        # Heartbeat: extend the leases of the jobs this process runs, and take back the expired ones of others.
+        self._renewed = time.monotonic()
+        try:
+            with self.app.app_context():
+                db.session.execute(
+                    update(RecognitionJob)
+                    .where(RecognitionJob.status == 'running', RecognitionJob.worker_id == self.worker_id)
+                    .values(lease_until=utcnow() + self.lease))
+                db.session.commit()
+                if recover_jobs():
+                    self.notify()
+        except Exception:
+            logger.exception("Could not renew recognition job leases")
+
+    def _claim(self):
+        # Take the next job by gate; returns (id, image, image_url, profile, budget_ms, gate_no, weight) or None.
+        gates = set(db.session.execute(
+            select(RecognitionJob.gate_no).where(RecognitionJob.status == 'queued').distinct()).scalars())
+        while gates:
+            config = gate_configs.get(self.scheduler.pick({g: gate_configs.get(g).weight for g in gates}))
+            self._expire(config)
+            job = self._claim_from(config.gate_no)
+            if job is not None:
+                return tuple(job) + (config.profile, config.ocr_budget_ms, config.gate_no, config.weight)
+            gates.discard(config.gate_no)  # Nothing left at this gate (expired, or claimed elsewhere).
+        db.session.rollback()
+        return None
+
+    def _expire(self, config):
+        # Deadline: a frame that waited longer than the gate allows is stale, drop it without OCR.
+        if not config.max_frame_age_ms:
+            return
+        now = utcnow()
+        dropped = db.session.execute(
+            update(RecognitionJob)
+            .where(RecognitionJob.status == 'queued', gate_filter(config.gate_no),
+                   RecognitionJob.created_at < now - timedelta(milliseconds=config.max_frame_age_ms))
+            .values(status='expired', finished_at=now, image=None, error='Frame too old, dropped')
+        ).rowcount
+        db.session.commit()
+        if dropped:
+            FRAMES_DROPPED.inc(str(config.gate_no), amount=dropped)
+
+    def _claim_from(self, gate_no):
+        # Take the oldest queued job of a gate; returns (id, image, image_url) or None.
+        while True:
+            row = db.session.execute(
+                select(RecognitionJob.id)
+                .where(RecognitionJob.status == 'queued', gate_filter(gate_no))
+                .order_by(RecognitionJob.created_at)
+                .limit(1)
+            ).first()
+            if row is None:
+                return None
+            now = utcnow()
+            claimed = db.session.execute(
+                update(RecognitionJob)
+                .where(RecognitionJob.id == row.id, RecognitionJob.status == 'queued')
+                .values(status='running', started_at=now, worker_id=self.worker_id, lease_until=now + self.lease)
+            ).rowcount
+            if claimed:
+                job = db.session.execute(
+                    select(RecognitionJob.id, RecognitionJob.image, RecognitionJob.image_url)
+                    .where(RecognitionJob.id == row.id)
+                ).first()
+                db.session.commit()
+                return job
+            # Another process took it first.
+            db.session.commit()
+
+    def _start(self, job_id, image, image_url, profile, budget_ms, gate_no, weight):
+        try:
+            # No redirects: the url's host was checked when the job was queued, a redirect could lead anywhere.
+            image_bytes = image if image is not None else bytes(get_fetcher().fetch_bytes(image_url, allow_redirects=False))
+            self.pool.submit(
+                image_bytes,
+                timeout=60,
+                profile=profile,
+                budget_ms=budget_ms,
+                gate=gate_no,
+                weight=weight,
+                callback=lambda result: self.io.submit(self._finish, job_id, result=result),
+                errback=lambda error: self.io.submit(self._finish, job_id, error=error)
+            )
+        except PoolBusy:
+            # The pool is saturated (e.g. by /ocr/frames): put the job back in the queue.
+            self._requeue(job_id)
+        except Exception as e:
+            self._finish(job_id, error=e)
+
+    def _requeue(self, job_id):
+        try:
+            with self.app.app_context():
+                db.session.execute(update(RecognitionJob).where(RecognitionJob.id == job_id)
+                                   .values(status='queued', started_at=None, worker_id=None, lease_until=None))
+                db.session.commit()
+        finally:
+            self.slots.release()
+
+    def _finish(self, job_id, result=None, error=None):
+        try:
+            values = {'finished_at': utcnow(), 'image': None, 'lease_until': None}
+            if error is None:
+                values.update(status='done', plate=result['plate'], confidence=result['confidence'])
+            else:
+                values.update(status='failed', error=str(error)[:255])
+            with self.app.app_context():
+                db.session.execute(update(RecognitionJob).where(RecognitionJob.id == job_id).values(**values))
+                db.session.commit()
+                job = db.session.get(RecognitionJob, job_id)
+                if error is None and job.gate_no is not None:
+                    decision = plate_index.decide(job.plate)['decision'] if job.plate else None
+                    get_recorder(self.app).record(job.plate, job.confidence, job.gate_no, f'job:{job_id}', decision)
+                callback_url, payload = job.callback_url, job.to_dict()
+            if callback_url:
+                self.io.submit(self._send_callback, callback_url, payload)
+        except Exception:
+            logger.exception("Could not store the result of recognition job %s", job_id)
+        finally:
+            self.slots.release()
+
+    def _send_callback(self, url, payload):
+        # Checked again here: the allowed hosts may have changed since the job was queued.
+        if not host_allowed(url, self.app.config.get('RECOGNIZE_CALLBACK_HOSTS', [])):
+            logger.warning("Callback for recognition job %s to %s is not allowed", payload['job_id'], url)
+            return
+        try:
+            # No redirects, they could lead anywhere.
+            self.session.post(url, json=payload, timeout=5, allow_redirects=False).raise_for_status()
+        except requests.RequestException as e:
+            logger.warning("Callback for recognition job %s to %s failed: %s", payload['job_id'], url, e)
+
+    def _purge(self):
+        db.session.execute(delete(RecognitionJob).where(
+            RecognitionJob.status.in_(('done', 'failed', 'expired')), RecognitionJob.finished_at < utcnow() - self.keep_for))
+        db.session.commit()
+
+    def close(self):
+        self._stop.set()
+        self.wake.set()
+        self._thread.join()
+        self.io.shutdown(wait=True)
+
+def gate_filter(gate_no):
+    # Jobs of one gate; gate None holds the jobs submitted without a gate number.
+    return RecognitionJob.gate_no.is_(None) if gate_no is None else RecognitionJob.gate_no == gate_no
+
+def host_allowed(url, allowed_hosts):
+    """ True if the URL's host (or host:port) is one of allowed_hosts. """
+    try:
+        parts = urlsplit(url)
+        host, port = (parts.hostname or '').lower(), parts.port
+    except ValueError:
+        return False
+    allowed = {h.lower() for h in allowed_hosts}
+    return bool(host) and (host in allowed or (port is not None and f"{host}:{port}" in allowed))
+
+def recover_jobs():
+    """
+    Queue again the running jobs whose lease ran out: their process stopped
+    or crashed (jobs of live processes keep their lease renewed).
+    Returns the number of queued jobs.
+    """
+    db.session.execute(update(RecognitionJob)
+                       .where(RecognitionJob.status == 'running',
+                              (RecognitionJob.lease_until.is_(None)) | (RecognitionJob.lease_until < utcnow()))
+                       .values(status='queued', started_at=None, worker_id=None, lease_until=None))
+    db.session.commit()
+    return db.session.query(RecognitionJob).filter(RecognitionJob.status == 'queued').count()
+
+# Held while the runner is created, so concurrent first requests start only one.
+_runner_lock = threading.Lock()
+
+def get_runner():
+    # Start the runner (and with it the OCR pool) on first use, like ocr_routes.get_pool().
+    runner = current_app.extensions.get('job_runner')
+    if runner is None:
+        with _runner_lock:
+            runner = current_app.extensions.get('job_runner')
+            if runner is None:
+                from .routes.ocr_routes import get_pool
+                runner = JobRunner(
+                    current_app._get_current_object(), get_pool(),
+                    max_in_flight=current_app.config.get('RECOGNIZE_IN_FLIGHT', 8),
+                    keep_for=timedelta(hours=current_app.config.get('RECOGNIZE_KEEP_HOURS', 24)),
+                    lease=timedelta(seconds=current_app.config.get('RECOGNIZE_LEASE_SECONDS', 60))
+                )
+                current_app.extensions['job_runner'] = runner
+    return runner
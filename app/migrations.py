@@ -0,0 +1,101 @@
+import logging
+from sqlalchemy import Column, DateTime, Integer, MetaData, Table, inspect, select
+from . import db
+from .events import utcnow
+from .models import Gate, RecognitionJob, TableVersion
+from .search import setup_user_search
+
+logger = logging.getLogger(__name__)
+
+# Applied schema versions, kept apart from the models' metadata so create_all() never touches it.
+version_metadata = MetaData()
+schema_version = Table(
+    'schema_version', version_metadata,
+    Column('version', Integer, primary_key=True),
+    Column('applied_at', DateTime, nullable=False),
+)
+
+# (version, description, function(connection)), in order. Append new migrations at the end
+# and never edit applied ones. Migration 1 creates tables from the current models, so later
+# migrations that add columns must check the column is missing (see has_column).
+MIGRATIONS = []
+
+def migration(version, description):
+    def register(fn):
+        MIGRATIONS.append((version, description, fn))
+        return fn
+    return register
+
+def has_column(connection, table, column):
+    return any(c['name'] == column for c in inspect(connection).get_columns(table))
+
+@migration(1, 'Create missing tables and indexes')
+def create_tables(connection):
+    # Databases from before versioning were made by create_all() and may lack newer tables or indexes.
+    db.metadata.create_all(connection)
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
+
+@migration(2, 'Full-text index for user search')
+def user_search(connection):
+    setup_user_search(connection)
+
+@migration(3, 'Gates and the per-gate job queue index')
+def gates(connection):
+    Gate.__table__.create(connection, checkfirst=True)
+    for index in RecognitionJob.__table__.indexes:
+        index.create(connection, checkfirst=True)
+
+@migration(4, 'Table versions for ETags')
+def table_versions(connection):
+    TableVersion.__table__.create(connection, checkfirst=True)
+    connection.execute(TableVersion.__table__.insert().values(name='user', version=0))
+
+@migration(5, 'Recognition job leases')
+def job_leases(connection):
+    for name in ('worker_id', 'lease_until'):
+        if not has_column(connection, 'recognition_job', name):
+            column = RecognitionJob.__table__.c[name]
+            connection.exec_driver_sql(
+                f"ALTER TABLE recognition_job ADD COLUMN {name} {column.type.compile(connection.dialect)}")
+
+@migration(6, 'Vehicle table version for the plate index')
+def vehicle_version(connection):
+    connection.execute(TableVersion.__table__.insert().values(name='vehicle', version=0))
+
+@migration(7, 'Widen user.password for scrypt hashes')
+def password_length(connection):
+    # SQLite doesn't enforce VARCHAR lengths (and can't alter a column type); server databases do.
+    dialect = connection.dialect
+    if dialect.name == 'sqlite':
+        return
+    table, column = dialect.identifier_preparer.quote('user'), dialect.identifier_preparer.quote('password')
+    if dialect.name in ('mysql', 'mariadb'):
+        connection.exec_driver_sql(f"ALTER TABLE {table} MODIFY {column} VARCHAR(255) NOT NULL")
+    else:
+        connection.exec_driver_sql(f"ALTER TABLE {table} ALTER COLUMN {column} TYPE VARCHAR(255)")
+
+def head():
+    return MIGRATIONS[-1][0]
+
+def current_version(engine):
+    """ Highest applied migration, 0 for a database that has never been migrated. """
+    with engine.connect() as connection:
+        if not inspect(connection).has_table('schema_version'):
+            return 0
+        return connection.execute(select(db.func.max(schema_version.c.version))).scalar() or 0
+
+def upgrade(engine):
+    """ Apply the pending migrations, each in its own transaction. Returns the versions applied. """
+    version_metadata.create_all(engine)
+    applied = []
+    for version, description, fn in MIGRATIONS:
+        if version <= current_version(engine):
+            continue
+        logger.info("Applying schema migration %d: %s", version, description)
+        with engine.begin() as connection:
+            fn(connection)
+            connection.execute(schema_version.insert().values(version=version, applied_at=utcnow()))
+        applied.append(version)
+    return applied
@@ -1,26 +1,199 @@
 from . import db
+from .plate_index import normalize_plate, plate_index
 
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)  # Name is mandatory
     email = db.Column(db.String(100), nullable=False, unique=True)  # Email is mandatory and must be unique
-    password = db.Column(db.String(100), nullable=False)  # Password is mandatory
+    password = db.Column(db.String(255), nullable=False)  # Password hash is mandatory (scrypt hashes are ~160 characters)
     phone_number = db.Column(db.String(15), nullable=False)  # Phone number can be stored as a string to accommodate formatting
-    role = db.Column(db.String(20), nullable=False)  # Role is mandatory
-    status = db.Column(db.String(20), nullable=False)  # Status is mandatory
-    gate_no = db.Column(db.Integer, nullable=True)  # Gate number is optional
+    role = db.Column(db.String(20), nullable=False, index=True)  # Role is mandatory
+    status = db.Column(db.String(20), nullable=False, index=True)  # Status is mandatory
+    gate_no = db.Column(db.Integer, nullable=True, index=True)  # Gate number is optional
+
+    ROLES = ('pending', 'user', 'guard', 'admin')
+    STATUSES = ('active', 'inactive')
+
+    # Fields of the user responses as (response key, column name).
+    API_FIELDS = (('id', 'id'), ('name', 'name'), ('email', 'email'), ('phone', 'phone_number'),
+                  ('role', 'role'), ('status', 'status'), ('gate', 'gate_no'))
+
+    def to_dict(self):
+        return {key: getattr(self, column) for key, column in self.API_FIELDS}
+
+    @classmethod
+    def api_columns(cls):
+        # Select only these columns to skip building User objects for read-only listings.
+        return [getattr(cls, column) for _, column in cls.API_FIELDS]
+
+    @classmethod
+    def to_api_dicts(cls, rows):
+        """ Serialize rows selected with api_columns() like to_dict() serializes users. """
+        keys = [key for key, _ in cls.API_FIELDS]
+        return [dict(zip(keys, row)) for row in rows]
+
+    # String representation of the User object
+    def __repr__(self):
+        return f"<User {self.name} - Role: {self.role}>"
+
+class TableVersion(db.Model):
+    # Change counter per table, bumped by every write; ETags and cached pages are keyed by it (app.http_cache).
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+class Vehicle(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)  # Owner of the vehicle
+    plate = db.Column(db.String(20), nullable=False)  # Plate as entered, e.g. "MH 12 DE 1433"
+    plate_normalized = db.Column(db.String(20), nullable=False, unique=True, index=True)  # Upper-case, letters and digits only
+    status = db.Column(db.String(20), nullable=False, default='allowed')  # 'allowed' or 'denied'
+    description = db.Column(db.String(100), nullable=True)  # Make, model, colour...
+
+    STATUSES = ('allowed', 'denied')
+
+    user = db.relationship('User', backref=db.backref('vehicles', lazy='dynamic', cascade='all, delete-orphan'))
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "user_id": self.user_id,
+            "plate": self.plate,
+            "status": self.status,
+            "description": self.description
+        }
+
+    def __repr__(self):
+        return f"<Vehicle {self.plate} - Status: {self.status}>"
+
+@db.event.listens_for(Vehicle.plate, 'set', retval=True)
+def set_plate_normalized(target, value, oldvalue, initiator):
+    # Keep the indexed column in sync with the plate as entered.
+    target.plate_normalized = normalize_plate(value)
+    return value
+
+# Keep the in-memory plate index in sync with committed vehicle changes.
+# Changes are collected per session and applied only once the commit succeeds.
+@db.event.listens_for(db.session, 'after_flush')
+def collect_vehicle_changes(session, flush_context):
+    # Snapshot the values now: after the commit the objects are expired and can't be loaded.
+    changes = session.info.setdefault('vehicle_changes', [])
+    count = len(changes)
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, Vehicle):
+            changes.append(('add', (obj.id, obj.plate, obj.user_id, obj.status)))
+    for obj in session.deleted:
+        if isinstance(obj, Vehicle):
+            changes.append(('remove', obj.id))
+    if len(changes) > count:
+        # Each such flush bumps the 'vehicle' table version once (see app.http_cache).
+        session.info['vehicle_versions'] = session.info.get('vehicle_versions', 0) + 1
+
+@db.event.listens_for(db.session, 'after_commit')
+def apply_vehicle_changes(session):
+    for action, item in session.info.pop('vehicle_changes', []):
+        if action == 'add':
+            plate_index.add(*item)
+        else:
+            plate_index.remove(item)
+    plate_index.applied(session.info.pop('vehicle_versions', 0))
+
+@db.event.listens_for(db.session, 'after_rollback')
+def discard_vehicle_changes(session):
+    session.info.pop('vehicle_changes', None)
+    session.info.pop('vehicle_versions', None)
+
+class GateEvent(db.Model):
+    # Append-only log of plate recognitions, written in batches by app.events.EventRecorder.
+    __table_args__ = (
+        db.Index('ix_gate_event_gate_time', 'gate_no', 'created_at'),  # Per-gate time-range queries
+        db.Index('ix_gate_event_plate_time', 'plate', 'created_at'),   # History of one plate
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    created_at = db.Column(db.DateTime, nullable=False, index=True)  # UTC time of the recognition
+    gate_no = db.Column(db.Integer, nullable=True)  # Gate where the plate was read
+    plate = db.Column(db.String(20), nullable=True)  # None if no plate was recognised
+    confidence = db.Column(db.Float, nullable=False, default=0.0)
+    decision = db.Column(db.String(20), nullable=True)  # 'allow' / 'review' / 'deny' if a decision was made
+    image_ref = db.Column(db.String(255), nullable=True)  # Path, URL or job id of the image
 
     def to_dict(self):
         return {
             "id": self.id,
+            "created_at": self.created_at.isoformat(),
+            "gate_no": self.gate_no,
+            "plate": self.plate,
+            "confidence": self.confidence,
+            "decision": self.decision,
+            "image_ref": self.image_ref
+        }
+
+    def __repr__(self):
+        return f"<GateEvent {self.plate} - Gate: {self.gate_no}>"
+
+class Gate(db.Model):
+    # Camera and processing settings of a gate, cached in-process by app.gates.gate_configs.
+    id = db.Column(db.Integer, primary_key=True)
+    gate_no = db.Column(db.Integer, nullable=False, unique=True)  # Number used by users, events and jobs
+    name = db.Column(db.String(100), nullable=True)
+    camera_url = db.Column(db.String(2048), nullable=True)  # Snapshot URL of the gate camera
+    profile = db.Column(db.String(20), nullable=True)  # Preprocessing profile (None: the default)
+    ocr_budget_ms = db.Column(db.Float, nullable=True)  # Latency budget of the OCR per frame
+    weight = db.Column(db.Integer, nullable=False, default=1)  # Share of the OCR capacity under load
+    max_frame_age_ms = db.Column(db.Float, nullable=True)  # Queued frames older than this are dropped
+    updated_at = db.Column(db.DateTime, nullable=False)
+
+    def to_dict(self):
+        return {
+            "gate_no": self.gate_no,
             "name": self.name,
-            "email": self.email,
-            "phone_number": self.phone_number,
-            "role": self.role,
+            "camera_url": self.camera_url,
+            "profile": self.profile,
+            "ocr_budget_ms": self.ocr_budget_ms,
+            "weight": self.weight,
+            "max_frame_age_ms": self.max_frame_age_ms,
+            "updated_at": self.updated_at.isoformat()
+        }
+
+    def __repr__(self):
+        return f"<Gate {self.gate_no} - {self.name}>"
+
+class RecognitionJob(db.Model):
+    # Persistent queue of /recognize jobs, processed by app.jobs.JobRunner.
+    __table_args__ = (
+        db.Index('ix_recognition_job_status_created', 'status', 'created_at'),  # Claiming the oldest queued job
+        db.Index('ix_recognition_job_status_gate', 'status', 'gate_no', 'created_at'),  # ... of one gate
+    )
+
+    id = db.Column(db.String(32), primary_key=True)  # uuid4 hex
+    batch_id = db.Column(db.String(32), nullable=True, index=True)  # Set for jobs submitted together
+    status = db.Column(db.String(10), nullable=False, default='queued')  # queued, running, done, failed or expired
+    created_at = db.Column(db.DateTime, nullable=False)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    image = db.deferred(db.Column(db.LargeBinary, nullable=True))  # Uploaded image, dropped once the job has finished
+    image_url = db.Column(db.String(2048), nullable=True)  # Or the URL to download it from
+    gate_no = db.Column(db.Integer, nullable=True)  # Record a gate event for the result
+    callback_url = db.Column(db.String(2048), nullable=True)  # POSTed the job when it finishes
+    plate = db.Column(db.String(20), nullable=True)
+    confidence = db.Column(db.Float, nullable=True)
+    error = db.Column(db.String(255), nullable=True)
+    worker_id = db.Column(db.String(64), nullable=True)  # Process running the job
+    lease_until = db.Column(db.DateTime, nullable=True)  # Renewed while it runs; after it, the job can be taken over
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "batch_id": self.batch_id,
             "status": self.status,
-            "gate_no": self.gate_no  # This will return None if not assigned
+            "created_at": self.created_at.isoformat(),
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "image_url": self.image_url,
+            "gate_no": self.gate_no,
+            "plate": self.plate,
+            "confidence": self.confidence,
+            "error": self.error
         }
 
-    # String representation of the User object
     def __repr__(self):
-        return f"<User {self.name} - Role: {self.role}>"
+        return f"<RecognitionJob {self.id} - Status: {self.status}>"
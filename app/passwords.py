@@ -0,0 +1,76 @@
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+from werkzeug.security import check_password_hash, generate_password_hash
+
+class HasherBusy(Exception):
+    """ Raised when too many password hashes are already waiting. """
+
+class PasswordHasher:
+    """
+    Runs password hashing and verification on a small, bounded thread pool.
+    KDFs are slow on purpose; running them on at most `workers` threads
+    (hashlib releases the GIL, so they use one core each) bounds the CPU a
+    login burst can take. The calling request still waits for its own hash,
+    so at most workers + max_pending requests wait here at once; beyond that
+    HasherBusy is raised straight away and routes answer 503.
+    `method` is a werkzeug method string such as 'scrypt:32768:8:1' or
+    'pbkdf2:sha256:600000'; hashes made with other parameters are upgraded
+    on the next successful login (see needs_rehash).
+    """
+
+    def __init__(self, method='scrypt:32768:8:1', workers=2, max_pending=64):
+        self.method = method
+        # The prefix werkzeug writes for this method, e.g. 'scrypt:32768:8:1'.
+        self.prefix = generate_password_hash('', method=method).split('$', 1)[0]
+        self.workers = workers
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+        self.slots = threading.BoundedSemaphore(workers + max_pending)
+
+    def _submit(self, fn, *args, blocking=False):
+        if not self.slots.acquire(blocking=blocking):
+            raise HasherBusy("Too many password checks in progress")
+        try:
+            future = self.executor.submit(fn, *args)
+        except BaseException:
+            self.slots.release()
+            raise
+        future.add_done_callback(lambda _: self.slots.release())
+        return future
+
+    def _run(self, fn, *args, timeout=None):
+        return self._submit(fn, *args).result(timeout=timeout)
+
+    def hash(self, password, timeout=None):
+        """ Hash a password with the configured method. """
+        return self._run(generate_password_hash, password, self.method, timeout=timeout)
+
+    def hash_many(self, passwords):
+        """
+        Hash passwords for a bulk import on the same pool, yielding hashes in order.
+        Waits for free slots instead of raising HasherBusy, and keeps at most
+        `workers` hashes queued so logins still get a slot meanwhile.
+        """
+        queued = deque()
+        for password in passwords:
+            if len(queued) >= self.workers:
+                yield queued.popleft().result()
+            queued.append(self._submit(generate_password_hash, password, self.method, blocking=True))
+        while queued:
+            yield queued.popleft().result()
+
+    def verify(self, pwhash, password, timeout=None):
+        """ Check a password against a stored hash. """
+        return self._run(check_password_hash, pwhash, password, timeout=timeout)
+
+    def needs_rehash(self, pwhash):
+        """ True if the hash was made with a different method or cost parameters. """
+        return pwhash.split('$', 1)[0] != self.prefix
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
+
+def get_hasher(app=None):
+    # The hasher is created by create_app() and kept in app.extensions.
+    return (app or current_app).extensions['password_hasher']
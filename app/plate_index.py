@@ -0,0 +1,224 @@
+import threading
+import time
+from flask import has_app_context
+
+# Characters that OCR commonly confuses, folded onto one representative so
+# that e.g. "MH12AB1O34" and "MH12A81034" end up with the same key.
+CONFUSIONS = str.maketrans({'O': '0', 'Q': '0', 'I': '1', 'B': '8', 'S': '5', 'Z': '2', 'G': '6'})
+
+def normalize_plate(plate):
+    """ Upper-case a plate and drop spaces, dashes and other separators. """
+    return ''.join(c for c in (plate or '').upper() if c.isalnum())
+
+def fold_plate(plate):
+    """ Normalize a plate and fold OCR-confusable characters. """
+    return normalize_plate(plate).translate(CONFUSIONS)
+
+def edit_distance(a, b, limit):
+    """
+    Levenshtein distance between a and b, or limit + 1 as soon as it is
+    known to be larger than limit (cheap rejection for far-apart plates).
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+def deletions(key, depth):
+    """ All strings obtained by deleting up to depth characters from key (key included). """
+    variants, frontier = {key}, {key}
+    for _ in range(depth):
+        frontier = {k[:i] + k[i + 1:] for k in frontier for i in range(len(k))}
+        variants |= frontier
+    return variants
+
+class DeletionIndex:
+    """
+    Edit-distance search over plate keys using a deletion neighbourhood
+    (the SymSpell approach): every key is stored under each string obtained by
+    deleting up to `tolerance` characters. Two keys within edit distance
+    `tolerance` always share such a variant, so a search is a handful of
+    dictionary lookups plus an exact check on the few candidates found,
+    independent of the number of registered plates. Unlike a BK-tree it
+    needs no edit-distance computations to insert keys.
+    """
+
+    def __init__(self, tolerance=1):
+        self.tolerance = tolerance
+        self.variants = {}  # variant -> set of keys
+
+    def add(self, key):
+        for variant in deletions(key, self.tolerance):
+            self.variants.setdefault(variant, set()).add(key)
+
+    def remove(self, key):
+        for variant in deletions(key, self.tolerance):
+            keys = self.variants.get(variant)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.variants[variant]
+
+    def search(self, key):
+        """ Return (distance, key) pairs within the tolerance. """
+        candidates = set()
+        for variant in deletions(key, self.tolerance):
+            candidates |= self.variants.get(variant, set())
+        found = []
+        for candidate in candidates:
+            distance = edit_distance(key, candidate, self.tolerance)
+            if distance <= self.tolerance:
+                found.append((distance, candidate))
+        return found
+
+class PlateIndex:
+    """
+    In-memory lookup of registered vehicles by plate, loaded at startup and
+    kept in sync when vehicles are committed in this process (see
+    app.models). Changes made by other processes are noticed within
+    refresh_interval seconds through the 'vehicle' table version (see
+    app.http_cache), and the index is then reloaded.
+    Lookups try, in order: the exact normalized plate, the plate with
+    OCR-confusable characters folded, and an edit-distance search on the
+    folded plates.
+    """
+
+    def __init__(self, tolerance=1, refresh_interval=5.0):
+        self.tolerance = tolerance
+        self.refresh_interval = refresh_interval
+        self.exact = {}    # normalized plate -> entry
+        self.folded = {}   # folded plate -> {vehicle id: entry}
+        self.keys = {}     # vehicle id -> normalized plate
+        self.fuzzy = DeletionIndex(tolerance)
+        self.version = None  # 'vehicle' table version the index reflects, None if unknown
+        self._checked = 0.0
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+    def load(self, vehicles, version=None):
+        """
+        Rebuild the index from an iterable of Vehicle rows, read at table
+        version `version`. Lookups use the old index until the new one is built.
+        """
+        fresh = PlateIndex(self.tolerance)
+        for vehicle in vehicles:
+            fresh.add(vehicle.id, vehicle.plate, vehicle.user_id, vehicle.status)
+        with self._lock:
+            self.exact, self.folded, self.keys, self.fuzzy = fresh.exact, fresh.folded, fresh.keys, fresh.fuzzy
+            self.version = version
+            self._checked = time.monotonic()
+
+    def applied(self, versions):
+        """ Count table version bumps whose changes were applied here (by app.models after a commit). """
+        with self._lock:
+            if self.version is not None:
+                self.version += versions
+
+    def refresh(self):
+        """
+        Reload the index if the vehicles were changed by another process.
+        Checked at most every refresh_interval seconds; needs an app context.
+        """
+        if time.monotonic() - self._checked < self.refresh_interval:
+            return
+        if not self._refresh_lock.acquire(blocking=False):
+            return  # Another thread is checking.
+        try:
+            from .http_cache import table_version
+            from .models import Vehicle
+            self._checked = time.monotonic()
+            version = table_version('vehicle')
+            if version != self.version:
+                self.load(Vehicle.query.yield_per(10000), version)
+        finally:
+            self._refresh_lock.release()
+
+    def add(self, vehicle_id, plate, user_id, status):
+        """ Add or update a vehicle. """
+        entry = {
+            'vehicle_id': vehicle_id,
+            'plate': plate,
+            'user_id': user_id,
+            'allowed': status == 'allowed',
+        }
+        normalized = normalize_plate(plate)
+        folded = normalized.translate(CONFUSIONS)
+        with self._lock:
+            self._discard(vehicle_id)
+            self.exact[normalized] = entry
+            self.keys[vehicle_id] = normalized
+            self.folded.setdefault(folded, {})[vehicle_id] = entry
+            self.fuzzy.add(folded)
+
+    def remove(self, vehicle_id):
+        with self._lock:
+            self._discard(vehicle_id)
+
+    def _discard(self, vehicle_id):
+        normalized = self.keys.pop(vehicle_id, None)
+        if normalized is None:
+            return
+        if self.exact.get(normalized, {}).get('vehicle_id') == vehicle_id:
+            del self.exact[normalized]
+        folded = normalized.translate(CONFUSIONS)
+        entries = self.folded.get(folded, {})
+        entries.pop(vehicle_id, None)
+        if not entries:
+            self.folded.pop(folded, None)
+            self.fuzzy.remove(folded)
+
+    def lookup(self, plate):
+        """
+        Find the registered vehicles closest to a recognised plate.
+        Returns (distance, entries): distance 0 for an exact or confusion-only
+        match, None and an empty list when nothing is within the tolerance.
+        """
+        normalized = normalize_plate(plate)
+        folded = normalized.translate(CONFUSIONS)
+        # Entries are copied out under the lock: add() and remove() change these dicts in place.
+        with self._lock:
+            entry = self.exact.get(normalized)
+            if entry is not None:
+                return 0, [entry]
+
+            entries = self.folded.get(folded)
+            if entries:
+                return 0, list(entries.values())
+
+            best, found = None, []
+            for distance, key in sorted(self.fuzzy.search(folded)):
+                entries = self.folded.get(key)
+                if not entries:
+                    continue
+                if best is not None and distance > best:
+                    break
+                best = distance
+                found.extend(entries.values())
+        return best, found
+
+    def decide(self, plate):
+        """
+        Gate decision for a recognised plate: 'allow' only when exactly one
+        allowed vehicle matches exactly or up to OCR confusions (O/0, I/1,
+        B/8...). A single allowed vehicle that is only within edit distance
+        (a different character, e.g. ...1235 for ...1234) gives 'review', so
+        a guard checks it; anything else is 'deny'.
+        """
+        if has_app_context():
+            self.refresh()
+        distance, entries = self.lookup(plate)
+        if len(entries) == 1 and entries[0]['allowed']:
+            decision = 'allow' if distance == 0 else 'review'
+        else:
+            decision = 'deny'
+        return {'decision': decision, 'plate': normalize_plate(plate), 'distance': distance, 'matches': entries}
+
+# The index used by the app, loaded in create_app().
+plate_index = PlateIndex()
@@ -0,0 +1,53 @@
+import threading
+import time
+
+class RateLimiter:
+    """
+    In-memory token buckets, one per key (an email, an IP address...).
+    Each key may spend `limit` tokens, refilled evenly over `period` seconds.
+    Buckets that have refilled completely are dropped once more than max_keys
+    keys are tracked, so memory stays bounded under address-spraying traffic.
+    """
+
+    def __init__(self, limit, period, max_keys=100000):
+        self.limit = limit
+        self.rate = limit / period  # Tokens per second
+        self.max_keys = max_keys
+        self.buckets = {}  # key -> (tokens, time of last update)
+        self._lock = threading.Lock()
+
+    def _tokens(self, key, now):
+        tokens, updated = self.buckets.get(key, (self.limit, now))
+        return min(self.limit, tokens + (now - updated) * self.rate)
+
+    def allow(self, key, cost=1):
+        """ Spend cost tokens for key. Returns False (and spends nothing) if not enough are left. """
+        now = time.monotonic()
+        with self._lock:
+            tokens = self._tokens(key, now)
+            if tokens < cost:
+                return False
+            self.buckets[key] = (tokens - cost, now)
+            if len(self.buckets) > self.max_keys:
+                self._prune(now)
+            return True
+
+    def blocked(self, key):
+        """ True if key has no token left, without spending one. """
+        with self._lock:
+            return key in self.buckets and self._tokens(key, time.monotonic()) < 1
+
+    def retry_after(self, key):
+        """ Seconds until key has a token again. """
+        with self._lock:
+            missing = 1 - self._tokens(key, time.monotonic())
+        return max(0, int(missing / self.rate) + 1) if missing > 0 else 0
+
+    def reset(self, key):
+        with self._lock:
+            self.buckets.pop(key, None)
+
+    def _prune(self, now):
+        full = [key for key in self.buckets if self._tokens(key, now) >= self.limit]
+        for key in full:
+            del self.buckets[key]
@@ -1,9 +1,19 @@
-from flask import Blueprint,request,render_template,session, jsonify
-from werkzeug.security import generate_password_hash, check_password_hash
+from flask import Blueprint,request,render_template,session, jsonify, current_app
 from .. import db
+from ..auth import issue_token
 from ..models import User
+from ..passwords import HasherBusy, get_hasher
 auth = Blueprint('auth', __name__)
 
+def too_many_attempts(limiter, key):
+    # 429 response telling the client when it may try again.
+    retry_after = str(limiter.retry_after(key))
+    return jsonify({"error": "Too many login attempts, try again later"}), 429, {'Retry-After': retry_after}
+
+def server_busy():
+    # The password hashing pool is full; the client should retry shortly.
+    return jsonify({"error": "Server busy, try again"}), 503, {'Retry-After': '1'}
+
 @auth.route('/register',methods=['POST'])
 def register():
     data = request.json  # Get JSON data from the request
@@ -18,8 +28,11 @@ def register():
     if User.query.filter_by(email=email).first():
         return jsonify({"error": "Email already registered"}), 400
 
-    # Hash the password
-    hashed_password = generate_password_hash(password)
+    # Hash the password (on the bounded hashing pool)
+    try:
+        hashed_password = get_hasher().hash(password)
+    except HasherBusy:
+        return server_busy()
 
     # Create a new user instance
     new_user = User(
@@ -45,18 +58,42 @@ def login():
     email = data.get('email')
     password = data.get('password')
     
+    # Rate limits are checked before any hashing, so brute-force traffic is
+    # turned away cheaply: every attempt counts against the client address,
+    # failed attempts count against the account.
+    ip_limiter = current_app.extensions['login_ip_limiter']
+    account_limiter = current_app.extensions['login_account_limiter']
+    account = (email or '').lower()
+    if not ip_limiter.allow(request.remote_addr):
+        return too_many_attempts(ip_limiter, request.remote_addr)
+    if account_limiter.blocked(account):
+        return too_many_attempts(account_limiter, account)
+
     # Query the database to find the user by email
     user = User.query.filter_by(email=email).first()
     # Check if user exists and password is correct
-    if user and check_password_hash(user.password, password):
+    hasher = get_hasher()
+    try:
+        valid = user is not None and hasher.verify(user.password, password or '')
+        if valid and hasher.needs_rehash(user.password):
+            # Cost parameters changed since this hash was made: upgrade it now that we know the password.
+            user.password = hasher.hash(password)
+            db.session.commit()
+    except HasherBusy:
+        return server_busy()
+
+    if valid:
+        account_limiter.reset(account)
         # Store necessary user details in session
         session['user_id'] = user.id
         session['user_name'] = user.name
         session['user_role'] = user.role
         session['user_status'] = user.status
         session['gate_no'] = user.gate_no
-        return jsonify({"message": "User logged in successfully!", "user": {"name": user.name, "role": user.role}}), 200
+        return jsonify({"message": "User logged in successfully!", "user": {"name": user.name, "role": user.role},
+                        "token": issue_token(user.id)}), 200
     else:
+        account_limiter.allow(account)
         # Return JSON response for failed login
         return jsonify({"error": "User not found or incorrect password"}), 401  # 401 Unauthorized status
 
@@ -0,0 +1,106 @@
+from datetime import datetime
+from flask import Blueprint, Response, current_app, request, jsonify
+from ..auth import current_user, require_role
+from ..events import record_event
+from ..models import GateEvent
+from ..plate_index import plate_index
+event = Blueprint('event', __name__)
+
+def parse_time(value):
+    # Accept ISO 8601 timestamps, e.g. 2024-10-31T08:00:00
+    return datetime.fromisoformat(value) if value else None
+
+def check_event(data):
+    # Validate a posted event; returns an error message or None.
+    if not isinstance(data, dict):
+        return 'Send the event as a JSON object'
+    for field, size in (('plate', 20), ('decision', 20), ('image_ref', 255)):
+        value = data.get(field)
+        if value is not None and (not isinstance(value, str) or len(value) > size):
+            return f'{field} must be a string of at most {size} characters'
+    confidence = data.get('confidence', 0.0)
+    if not isinstance(confidence, (int, float)) or isinstance(confidence, bool) or not 0 <= confidence <= 1:
+        return 'confidence must be a number between 0 and 1'
+    gate_no = data.get('gate_no')
+    if gate_no is not None and (not isinstance(gate_no, int) or isinstance(gate_no, bool)):
+        return 'gate_no must be an integer'
+    return None
+
+@event.route('/events', methods=['POST'])
+@require_role('guard', 'admin')
+def add_event():
+    # Record a recognition sent by a gate controller. The event is written in the background.
+    data = request.get_json(silent=True)
+    error = check_event(data)
+    if error:
+        return jsonify({'error': error}), 400
+    # Gate controllers log in as the guard of their gate and can only post events for it.
+    user = current_user()
+    if user.role != 'admin' and data.get('gate_no') != user.gate_no:
+        return jsonify({'error': 'Permission denied'}), 403
+
+    plate = data.get('plate')
+    decision = data.get('decision')
+    if plate and not decision:
+        decision = plate_index.decide(plate)['decision']
+
+    if not record_event(plate, data.get('confidence', 0.0), data.get('gate_no'), data.get('image_ref'), decision):
+        return jsonify({'error': 'Event queue is full'}), 503
+    return jsonify({'message': 'Event recorded', 'decision': decision}), 202
+
+@event.route('/events', methods=['GET'])
+@require_role('guard', 'admin')
+def get_events():
+    # Filter by gate and time range; served by the (gate_no, created_at) and created_at indexes.
+    # Guards only see their own gate's history, like its live stream.
+    user = current_user()
+    gate_no = request.args.get('gate_no', type=int)
+    if user.role != 'admin':
+        if gate_no is not None and gate_no != user.gate_no:
+            return jsonify({'error': 'Permission denied'}), 403
+        if user.gate_no is None:
+            return jsonify({'events': []}), 200
+        gate_no = user.gate_no
+    try:
+        since = parse_time(request.args.get('since'))
+        until = parse_time(request.args.get('until'))
+    except ValueError:
+        return jsonify({'error': 'since and until must be ISO 8601 timestamps'}), 400
+    plate = request.args.get('plate')
+    limit = min(request.args.get('limit', 100, type=int), 1000)
+
+    query = GateEvent.query
+    if gate_no is not None:
+        query = query.filter(GateEvent.gate_no == gate_no)
+    if plate:
+        query = query.filter(GateEvent.plate == plate)
+    if since:
+        query = query.filter(GateEvent.created_at >= since)
+    if until:
+        query = query.filter(GateEvent.created_at < until)
+
+    events = query.order_by(GateEvent.created_at.desc()).limit(limit).all()
+    return jsonify({'events': [e.to_dict() for e in events]}), 200
+
+def event_stream(gate_no):
+    # Server-sent event response fed by the gate hub; Last-Event-ID resumes after a reconnect.
+    hub = current_app.extensions['gate_hub']
+    last_event_id = request.headers.get('Last-Event-ID', type=int)
+    subscription = hub.subscribe(gate_no, last_event_id)
+    return Response(hub.stream(subscription), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@event.route('/gates/<int:gate_no>/stream', methods=['GET'])
+@require_role('guard', 'admin')
+def gate_stream(gate_no):
+    # Live recognitions and decisions of one gate. Guards can only watch their own gate.
+    user = current_user()
+    if user.role != 'admin' and user.gate_no != gate_no:
+        return jsonify({'error': 'Permission denied'}), 403
+    return event_stream(gate_no)
+
+@event.route('/events/stream', methods=['GET'])
+@require_role('admin')
+def all_gates_stream():
+    # Live events of every gate.
+    return event_stream(None)
@@ -0,0 +1,102 @@
+from flask import Blueprint, request, jsonify
+from sqlalchemy.exc import IntegrityError
+from preprocessing import PROFILES
+from .. import db
+from ..auth import current_user, login_required, require_role
+from ..events import utcnow
+from ..jobs import get_runner, new_job_id
+from ..models import Gate, RecognitionJob
+from .recognize_routes import is_http_url
+gate = Blueprint('gate', __name__)
+
+def apply_settings(found, data):
+    # Copy the settings in data onto the gate; returns an error message or None.
+    if 'camera_url' in data and data['camera_url'] is not None and not is_http_url(data['camera_url']):
+        return 'camera_url must be an http(s) url'
+    if data.get('profile') is not None and data['profile'] not in PROFILES:
+        return f"profile must be one of {sorted(PROFILES)}"
+    if 'weight' in data and (type(data['weight']) is not int or data['weight'] < 1):
+        return 'weight must be a positive integer'
+    for field in ('ocr_budget_ms', 'max_frame_age_ms'):
+        if data.get(field) is not None and (type(data[field]) not in (int, float) or data[field] <= 0):
+            return f'{field} must be a positive number'
+    for field in ('name', 'camera_url', 'profile', 'ocr_budget_ms', 'weight', 'max_frame_age_ms'):
+        if field in data:
+            setattr(found, field, data[field])
+    found.updated_at = utcnow()
+    return None
+
+@gate.route('/gates', methods=['GET'])
+@login_required
+def get_gates():
+    gates = Gate.query.order_by(Gate.gate_no).all()
+    return jsonify({'gates': [g.to_dict() for g in gates]}), 200
+
+@gate.route('/gates/<int:gate_no>', methods=['GET'])
+@login_required
+def get_gate(gate_no):
+    found = Gate.query.filter_by(gate_no=gate_no).first()
+    if found is None:
+        return jsonify({'error': 'Gate not found'}), 404
+    return jsonify(found.to_dict()), 200
+
+@gate.route('/gates', methods=['POST'])
+@require_role('admin')
+def add_gate():
+    data = request.get_json() or {}
+    if not isinstance(data.get('gate_no'), int):
+        return jsonify({'error': 'gate_no is required'}), 400
+
+    new_gate = Gate(gate_no=data['gate_no'], weight=1)
+    error = apply_settings(new_gate, data)
+    if error:
+        return jsonify({'error': error}), 400
+    db.session.add(new_gate)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({'error': 'Gate already exists'}), 400
+
+    return jsonify(new_gate.to_dict()), 201
+
+@gate.route('/gates/<int:gate_no>', methods=['PUT'])
+@require_role('admin')
+def update_gate(gate_no):
+    found = Gate.query.filter_by(gate_no=gate_no).first()
+    if found is None:
+        return jsonify({'error': 'Gate not found'}), 404
+
+    error = apply_settings(found, request.get_json() or {})
+    if error:
+        return jsonify({'error': error}), 400
+    db.session.commit()
+    return jsonify(found.to_dict()), 200
+
+@gate.route('/gates/<int:gate_no>', methods=['DELETE'])
+@require_role('admin')
+def delete_gate(gate_no):
+    found = Gate.query.filter_by(gate_no=gate_no).first()
+    if found is None:
+        return jsonify({'error': 'Gate not found'}), 404
+
+    db.session.delete(found)
+    db.session.commit()
+    return jsonify({'message': 'Gate deleted'}), 200
+
+@gate.route('/gates/<int:gate_no>/capture', methods=['POST'])
+@require_role('guard', 'admin')
+def capture(gate_no):
+    # Queue recognition of a snapshot from the gate camera. Guards can only trigger their own gate.
+    user = current_user()
+    if user.role != 'admin' and user.gate_no != gate_no:
+        return jsonify({'error': 'Permission denied'}), 403
+    found = Gate.query.filter_by(gate_no=gate_no).first()
+    if found is None or not found.camera_url:
+        return jsonify({'error': 'Gate has no camera'}), 404
+
+    job = RecognitionJob(id=new_job_id(), created_at=utcnow(), image_url=found.camera_url, gate_no=gate_no)
+    db.session.add(job)
+    db.session.commit()
+    get_runner().notify()
+    return jsonify({'job_id': job.id, 'status': 'queued'}), 202
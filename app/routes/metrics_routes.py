@@ -0,0 +1,8 @@
+from flask import Blueprint, Response
+from metrics import REGISTRY
+metrics = Blueprint('metrics', __name__)
+
+@metrics.route('/metrics', methods=['GET'])
+def get_metrics():
+    # Request, database and OCR pipeline metrics in the Prometheus text format.
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
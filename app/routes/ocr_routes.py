@@ -0,0 +1,90 @@
+import threading
+from concurrent.futures import TimeoutError
+from flask import Blueprint, request, current_app, jsonify
+from ocr_pool import OcrWorkerPool, PoolBusy, UnknownJob
+from ..auth import current_user, require_role
+from ..events import get_recorder
+from ..gates import WeightedRoundRobin, gate_configs
+from ..plate_index import plate_index
+ocr = Blueprint('ocr', __name__)
+
+# Held while the pool is created, so concurrent first requests start only one.
+_pool_lock = threading.Lock()
+
+def get_pool():
+    # Start the OCR worker pool on first use, so apps that never run OCR don't pay for it.
+    pool = current_app.extensions.get('ocr_pool')
+    if pool is None:
+        with _pool_lock:
+            pool = current_app.extensions.get('ocr_pool')
+            if pool is None:
+                pool = OcrWorkerPool(
+                    workers=current_app.config.get('OCR_WORKERS'),
+                    max_pending=current_app.config.get('OCR_QUEUE_SIZE'),
+                    scheduler=WeightedRoundRobin()
+                )
+                current_app.extensions['ocr_pool'] = pool
+    return pool
+
+def wait_seconds():
+    # How long to wait for the result before returning a job id, capped by OCR_MAX_WAIT.
+    wait = request.args.get('wait', 0, type=float)
+    return max(0.0, min(wait, current_app.config.get('OCR_MAX_WAIT', 10.0)))
+
+def job_response(pool, job_id, timeout):
+    # Return the job result if it finishes within the timeout, otherwise its id to poll.
+    try:
+        result = pool.result(job_id, timeout=timeout)
+    except TimeoutError:
+        return {'job_id': job_id, 'status': 'pending'}, 202
+    except UnknownJob:
+        # Never submitted, or finished long enough ago to be forgotten by the pool.
+        return {'error': 'Job not found'}, 404
+    except Exception as e:
+        return {'job_id': job_id, 'status': 'failed', 'error': str(e)}, 422
+    return {'job_id': job_id, 'status': 'done', **result}, 200
+
+@ocr.route('/ocr/frames', methods=['POST'])
+@require_role('guard', 'admin')
+def submit_frame():
+    # With a gate number, the result is recorded as a gate event when the job finishes.
+    # Guards can only submit frames for their own gate.
+    gate_no = request.args.get('gate_no', type=int)
+    user = current_user()
+    if user.role != 'admin' and gate_no is not None and gate_no != user.gate_no:
+        return jsonify({'error': 'Permission denied'}), 403
+
+    # The frame can be sent as an 'image' file upload or as the raw request body.
+    image = request.files.get('image')
+    image_bytes = image.read() if image else request.get_data()
+    if not image_bytes:
+        return jsonify({'error': 'No image provided'}), 400
+
+    callback = None
+    if gate_no is not None:
+        recorder = get_recorder()
+
+        def callback(result):
+            decision = plate_index.decide(result['plate'])['decision'] if result['plate'] else None
+            recorder.record(result['plate'], result['confidence'], gate_no, image.filename if image else None, decision)
+
+    # A configured gate's preprocessing profile and OCR budget apply to its frames,
+    # and its weight sets its share of the workers.
+    config = gate_configs.get(gate_no)
+    pool = get_pool()
+    try:
+        job_id = pool.submit(image_bytes, callback=callback, profile=config.profile, budget_ms=config.ocr_budget_ms,
+                             gate=gate_no, weight=config.weight)
+    except PoolBusy:
+        # Back-pressure: tell the camera to retry instead of queueing without limit.
+        return jsonify({'error': 'OCR queue is full'}), 503, {'Retry-After': '1'}
+
+    response, status = job_response(pool, job_id, wait_seconds())
+    return jsonify(response), status
+
+@ocr.route('/ocr/jobs/<job_id>', methods=['GET'])
+@require_role('guard', 'admin')
+def get_job(job_id):
+    # Wait briefly for the result if requested, like submit_frame.
+    response, status = job_response(get_pool(), job_id, wait_seconds())
+    return jsonify(response), status
@@ -0,0 +1,96 @@
+from urllib.parse import urlsplit
+from flask import Blueprint, request, current_app, jsonify
+from .. import db
+from ..auth import current_user, login_required, require_role
+from ..events import utcnow
+from ..jobs import get_runner, host_allowed, new_job_id
+from ..models import RecognitionJob
+recognize = Blueprint('recognize', __name__)
+
+def is_http_url(url):
+    return isinstance(url, str) and urlsplit(url).scheme in ('http', 'https')
+
+@recognize.route('/recognize', methods=['POST'])
+@require_role('guard', 'admin')
+def submit_jobs():
+    """
+    Queue plate recognition and return job ids immediately (202).
+    Send one or more 'image' file uploads (multipart), or JSON with 'url' or
+    'urls' (only from the hosts in RECOGNIZE_IMAGE_HOSTS). Several images make
+    one batch. Optional: gate_no to record gate events (guards only for their
+    own gate), callback_url to be POSTed each finished job (only to the hosts
+    in RECOGNIZE_CALLBACK_HOSTS).
+    """
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Send a JSON object'}), 400
+    files = request.files.getlist('image')
+    urls = data.get('urls') or ([data['url']] if data.get('url') else [])
+    if not isinstance(urls, list):
+        return jsonify({'error': 'urls must be a list of urls'}), 400
+    if not files and not urls:
+        return jsonify({'error': 'Upload an image or give a url'}), 400
+    if any(not is_http_url(url) for url in urls):
+        return jsonify({'error': 'Image urls must be http(s) urls'}), 400
+    # Only known camera/storage hosts: the server must not be made to fetch internal addresses.
+    if any(not host_allowed(url, current_app.config.get('RECOGNIZE_IMAGE_HOSTS', [])) for url in urls):
+        return jsonify({'error': 'Image url host is not allowed'}), 400
+    if len(files) + len(urls) > current_app.config.get('RECOGNIZE_MAX_BATCH', 100):
+        return jsonify({'error': 'Too many images in one request'}), 400
+
+    # Options come from the JSON body or the form/query string.
+    gate_no = data.get('gate_no', request.values.get('gate_no'))
+    if isinstance(gate_no, str) and gate_no.strip().lstrip('-').isdigit():
+        gate_no = int(gate_no)
+    if gate_no is not None and (not isinstance(gate_no, int) or isinstance(gate_no, bool)):
+        return jsonify({'error': 'gate_no must be an integer'}), 400
+    callback_url = data.get('callback_url', request.values.get('callback_url'))
+    if callback_url and not is_http_url(callback_url):
+        return jsonify({'error': 'callback_url must be an http(s) url'}), 400
+    if callback_url and not host_allowed(callback_url, current_app.config.get('RECOGNIZE_CALLBACK_HOSTS', [])):
+        return jsonify({'error': 'callback_url host is not allowed'}), 400
+    user = current_user()
+    if user.role != 'admin' and gate_no is not None and gate_no != user.gate_no:
+        return jsonify({'error': 'Permission denied'}), 403
+
+    # Back-pressure: refuse new work while the persistent queue is full.
+    queued = RecognitionJob.query.filter(RecognitionJob.status == 'queued').count()
+    if queued >= current_app.config.get('RECOGNIZE_MAX_QUEUED', 10000):
+        return jsonify({'error': 'Recognition queue is full'}), 503, {'Retry-After': '5'}
+
+    now = utcnow()
+    batch_id = new_job_id() if len(files) + len(urls) > 1 else None
+    jobs = [RecognitionJob(id=new_job_id(), batch_id=batch_id, created_at=now, image=f.read(),
+                           gate_no=gate_no, callback_url=callback_url) for f in files]
+    jobs += [RecognitionJob(id=new_job_id(), batch_id=batch_id, created_at=now, image_url=url,
+                            gate_no=gate_no, callback_url=callback_url) for url in urls]
+    if any(job.image_url is None and not job.image for job in jobs):
+        return jsonify({'error': 'Empty image upload'}), 400
+
+    # One commit for the whole batch.
+    db.session.add_all(jobs)
+    db.session.commit()
+    get_runner().notify()
+
+    if batch_id is None:
+        return jsonify({'job_id': jobs[0].id, 'status': 'queued'}), 202
+    return jsonify({'batch_id': batch_id, 'jobs': [job.id for job in jobs]}), 202
+
+@recognize.route('/recognize/<job_id>', methods=['GET'])
+@login_required
+def get_job(job_id):
+    # Poll one job: status, then plate and confidence (or error) once finished.
+    job = db.session.get(RecognitionJob, job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job.to_dict()), 200
+
+@recognize.route('/recognize/batches/<batch_id>', methods=['GET'])
+@login_required
+def get_batch(batch_id):
+    # Poll all jobs of a batch at once.
+    jobs = RecognitionJob.query.filter(RecognitionJob.batch_id == batch_id).order_by(RecognitionJob.created_at).all()
+    if not jobs:
+        return jsonify({'error': 'Batch not found'}), 404
+    pending = sum(job.status in ('queued', 'running') for job in jobs)
+    return jsonify({'batch_id': batch_id, 'pending': pending, 'jobs': [job.to_dict() for job in jobs]}), 200
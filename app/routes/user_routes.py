@@ -1,88 +1,185 @@
-from flask import Blueprint,request,render_template,session, jsonify
-from flask_sqlalchemy import pagination
-from werkzeug.security import generate_password_hash, check_password_hash
+import base64
+import json
+from flask import Blueprint,request,render_template, jsonify, current_app, Response, stream_with_context
+from sqlalchemy import tuple_
+from sqlalchemy.exc import IntegrityError
 from .. import db
+from ..auth import current_user, login_required, require_role
+from ..bulk_users import export_users, import_users, read_rows
+from ..http_cache import cached_json, query_key
 from ..models import User
+from ..passwords import HasherBusy, get_hasher
+from ..search import user_search_filter
 user = Blueprint('user', __name__)
 
+# Columns the listing can be sorted by. Each has an index, and ties are broken
+# by id so that every row has a unique position for cursor pagination.
+SORT_COLUMNS = ['id', 'email', 'role', 'status']
+# Estimated totals count at most this many rows.
+COUNT_CAP = 10000
+
+def encode_cursor(sort_by, user):
+    # Opaque cursor holding the sort key of the last user on the page.
+    value = [sort_by, getattr(user, sort_by), user.id]
+    return base64.urlsafe_b64encode(json.dumps(value).encode()).decode()
+
+def decode_cursor(cursor, sort_by):
+    # Returns (sort value, id) or raises ValueError for a bad or mismatched cursor.
+    try:
+        cursor_sort, value, last_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except Exception:
+        raise ValueError('Invalid cursor')
+    if cursor_sort != sort_by:
+        raise ValueError('Cursor was issued for a different sort order')
+    return value, last_id
+
+def count_users(query, filtered, mode):
+    """
+    Total for the listing: 'exact' runs a COUNT over all matching rows,
+    'estimate' is cheap at any size (the highest id when nothing is filtered,
+    otherwise a count that stops at COUNT_CAP). Returns (total, is_exact).
+    """
+    if mode == 'exact':
+        return query.order_by(None).count(), True
+    if not filtered:
+        return db.session.query(db.func.max(User.id)).scalar() or 0, False
+    capped = query.order_by(None).with_entities(User.id).limit(COUNT_CAP + 1).subquery()
+    total = db.session.query(db.func.count()).select_from(capped).scalar()
+    return min(total, COUNT_CAP), total <= COUNT_CAP
+
 @user.route('/users', methods=['GET'])
 def get_user():
+    # Polling dashboards get 304 (or a cached page) until a user is written.
+    return cached_json('user', query_key(), list_users)
+
+def list_users():
     # Get the search term, sort order, pagination parameters, role, and status from the request
     search_term = request.args.get('search', '')
     sort_by = request.args.get('sort', 'id')  # Default sort by 'id'
     page = request.args.get('page', 1, type=int)  # Default to page 1
-    per_page = request.args.get('per_page', 10, type=int)  # Default to 10 users per page
+    per_page = max(1, min(request.args.get('per_page', 10, type=int), 100))  # Default to 10 users per page, 1 to 100
     role = request.args.get('role')  # Filter by role
     status = request.args.get('status')  # Filter by status
+    gate_no = request.args.get('gate_no', type=int)  # Filter by gate
+    # Cursor pagination: pass cursor= (empty) for the first page, then the returned next_cursor.
+    cursor = request.args.get('cursor')
+    # Totals: 'exact', 'estimate' or 'none'. Cursor pages don't count unless asked to.
+    count_mode = request.args.get('count', 'none' if cursor is not None else 'exact')
+    if sort_by not in SORT_COLUMNS:
+        sort_by = 'id'
 
     # Query the database
     query = User.query
 
-    # Apply search filter if search term is provided
+    # Apply search filter if search term is provided (full-text index, or a prefix match without FTS5)
     if search_term:
-        query = query.filter(User.email.ilike(f'%{search_term}%'))
+        search = user_search_filter(search_term, current_app.extensions.get('user_fts', False))
+        if search is not None:
+            query = query.filter(search)
 
     # Apply role filter if provided
     if role:
-        query = query.filter(User.role == role)  # Assuming 'role' is a field in User model
+        query = query.filter(User.role == role)
 
     # Apply status filter if provided
     if status:
-        query = query.filter(User.status == status)  # Assuming 'status' is a field in User model
-
-    # Apply sorting
-    if sort_by in [ 'email', 'id', 'role', 'status']:
-        query = query.order_by(getattr(User, sort_by))
-
-    # Correctly apply pagination
-    users = query.paginate(page=page, per_page=per_page, error_out=False)
+        query = query.filter(User.status == status)
+
+    if gate_no is not None:
+        query = query.filter(User.gate_no == gate_no)
+
+    filtered = bool(search_term or role or status or gate_no is not None)
+
+    # Apply sorting, with id as the tie-breaker
+    sort_column = getattr(User, sort_by)
+    if sort_by == 'id':
+        query = query.order_by(User.id)
+    else:
+        query = query.order_by(sort_column, User.id)
+
+    response = {'per_page': per_page}
+    listing = query  # Before the cursor filter, for counting
+    if cursor is not None:
+        # Keyset pagination: seek past the last row of the previous page, so
+        # every page costs the same no matter how deep it is.
+        if cursor:
+            try:
+                value, last_id = decode_cursor(cursor, sort_by)
+            except ValueError as e:
+                return {'error': str(e)}, 400
+            if sort_by == 'id':
+                query = query.filter(User.id > last_id)
+            else:
+                query = query.filter(tuple_(sort_column, User.id) > tuple_(value, last_id))
+        # Fetch one extra row to know whether there is a next page.
+        items = query.with_entities(*User.api_columns()).limit(per_page + 1).all()
+        has_next = len(items) > per_page
+        items = items[:per_page]
+        response['next_cursor'] = encode_cursor(sort_by, items[-1]) if has_next else None
+    else:
+        items = query.with_entities(*User.api_columns()).offset((max(page, 1) - 1) * per_page).limit(per_page).all()
+        response['page'] = page
+
+    if count_mode in ('exact', 'estimate'):
+        total, exact = count_users(listing, filtered, count_mode)
+        response['total'] = total
+        response['total_exact'] = exact
+        if cursor is None:
+            response['pages'] = -(-total // per_page) if per_page > 0 else 0
 
     # Prepare the JSON response
-    user_list = [
-        {
-            'id': user.id,
-            'name': user.name,
-            'email': user.email,
-            'phone':user.phone_number,
-            'role': user.role,
-            'status': user.status,
-            'gate':user.gate_no
-        } for user in users.items
-    ]
-
-    response = {
-        'total': users.total,
-        'page': users.page,
-        'pages': users.pages,
-        'per_page': users.per_page,
-        'users': user_list
-    }
-
-    return jsonify(response), 200  # Return a 200 OK status code
+    response['users'] = User.to_api_dicts(items)
+
+    return response, 200  # Return a 200 OK status code
+
+def bulk_format():
+    # 'csv' or 'ndjson', from ?format= or the request content type.
+    fmt = request.args.get('format')
+    if not fmt:
+        fmt = 'csv' if 'csv' in (request.content_type or '') else 'ndjson'
+    return fmt if fmt in ('csv', 'ndjson') else None
+
+@user.route('/users/import', methods=['POST'])
+@require_role('admin')
+def import_users_route():
+    # Bulk create users from a CSV or NDJSON request body; returns a per-row error report.
+    fmt = bulk_format()
+    if fmt is None:
+        return jsonify({'error': 'format must be csv or ndjson'}), 400
+
+    # The file is read and committed in chunks, so it isn't held to MAX_CONTENT_LENGTH.
+    request.max_content_length = None
+    report = import_users(read_rows(request.stream, fmt))
+    return jsonify(report.to_dict()), 200
+
+@user.route('/users/export', methods=['GET'])
+@require_role('admin')
+def export_users_route():
+    # Stream all users as CSV or NDJSON without loading them into memory.
+    fmt = request.args.get('format', 'csv')
+    if fmt not in ('csv', 'ndjson'):
+        return jsonify({'error': 'format must be csv or ndjson'}), 400
+
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    return Response(stream_with_context(export_users(fmt)), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename=users.{fmt}'})
 
 @user.route('/users/<int:user_id>', methods=['GET'])
 def get_user_by_id(user_id):
-    # Fetch the user by ID
-    user = User.query.get(user_id)
-    
-    if user is None:
-        # If user not found, return a 404 error
-        return jsonify({'error': 'User not found'}), 404
+    def build():
+        # Fetch the user by ID, only the columns of the response
+        row = db.session.execute(db.select(*User.api_columns()).where(User.id == user_id)).first()
 
-    # Prepare the JSON response with user details
-    response = {
-        'id': user.id,
-        'name': user.name,
-        'email': user.email,
-        'phone':user.phone_number,
-        'role': user.role,
-        'status': user.status,
-        'gate':user.gate_no
-    }
+        if row is None:
+            # If user not found, return a 404 error
+            return {'error': 'User not found'}, 404
+
+        return User.to_api_dicts([row])[0], 200
 
-    return jsonify(response), 200  # Return a 200 OK status code
+    return cached_json('user', '', build)
 
 @user.route('/users/<int:user_id>', methods=['PUT'])
+@require_role('admin')
 def update_user(user_id):
     # Fetch the user by ID
     user = User.query.get(user_id)
@@ -90,13 +187,6 @@ def update_user(user_id):
     if user is None:
         return jsonify({'error': 'User not found'}), 404
 
-    # Check if the request is made by an admin or the user themselves
-    curr_user_id = session.get('user_id')
-    if curr_user_id:
-        current_user = User.query.get(curr_user_id)
-    if current_user.role != 'admin':
-        return jsonify({'error': 'Permission denied'}), 403
-
     # Get updated fields from the request
     data = request.get_json()
     
@@ -131,6 +221,7 @@ def update_user(user_id):
     }), 200  # Return a 200 OK status code
 
 @user.route('/users/<int:user_id>', methods=['DELETE'])
+@require_role('admin')  # Only admins can delete users
 def delete_user(user_id):
     # Fetch the user by ID
     user = User.query.get(user_id)
@@ -138,14 +229,6 @@ def delete_user(user_id):
     if user is None:
         return jsonify({'error': 'User not found'}), 404
 
-    curr_user_id = session.get('user_id')
-    if curr_user_id:
-        current_user = User.query.get(curr_user_id)
-
-    # Check if the current user has permission to delete (e.g., only admins can delete users)
-    if current_user.role != 'admin':
-        return jsonify({'error': 'Permission denied'}), 403
-
     # Delete the user from the database
     db.session.delete(user)
     db.session.commit()
@@ -153,18 +236,17 @@ def delete_user(user_id):
     return jsonify({'message': 'User deleted successfully'}), 200
 
 @user.route('/users/<int:user_id>/change_password', methods=['PUT'])
+@login_required
 def change_password(user_id):
+    # Users can only change their own password.
+    if current_user().id != user_id:
+        return jsonify({'error': 'Permission denied'}), 403
+
     user = User.query.get(user_id)
 
     if user is None:
         return jsonify({'error': 'User not found'}), 404
 
-    curr_user_id = session.get('user_id')
-    if curr_user_id:
-        current_user = User.query.get(curr_user_id)
-    if current_user.id != user_id:
-        return jsonify({'error': 'Permission denied'}), 403
-
     data = request.get_json()
     curr_password = data.get('curr_password')
     new_password = data.get('new_password')
@@ -175,10 +257,14 @@ def change_password(user_id):
     if(confirm_password !=  new_password):
         return  jsonify({'error': 'New password and Confirm password do not match'}), 400
     
-    if not check_password_hash(current_user.password, curr_password):
-        return jsonify({'error': 'Current password is incorrect'}), 400
-    
-    user.password = generate_password_hash(new_password)  # Ensure you hash the password
+    hasher = get_hasher()
+    try:
+        if not hasher.verify(user.password, curr_password or ''):
+            return jsonify({'error': 'Current password is incorrect'}), 400
+
+        user.password = hasher.hash(new_password)  # Ensure you hash the password
+    except HasherBusy:
+        return jsonify({'error': 'Server busy, try again'}), 503, {'Retry-After': '1'}
     db.session.commit()
 
     return jsonify({'message': 'Password updated successfully'}), 200
@@ -0,0 +1,95 @@
+from flask import Blueprint, request, jsonify
+from sqlalchemy.exc import IntegrityError
+from .. import db
+from ..auth import require_role
+from ..models import User, Vehicle
+from ..plate_index import normalize_plate, plate_index
+vehicle = Blueprint('vehicle', __name__)
+
+@vehicle.route('/vehicles', methods=['POST'])
+@require_role('admin')
+def add_vehicle():
+    data = request.get_json()
+    plate = data.get('plate')
+    user_id = data.get('user_id')
+    if not normalize_plate(plate) or not user_id:
+        return jsonify({'error': 'Plate and user_id are required'}), 400
+    if data.get('status', 'allowed') not in Vehicle.STATUSES:
+        return jsonify({'error': f'status must be one of {list(Vehicle.STATUSES)}'}), 400
+    if User.query.get(user_id) is None:
+        return jsonify({'error': 'User not found'}), 404
+
+    new_vehicle = Vehicle(
+        user_id=user_id,
+        plate=plate,
+        status=data.get('status', 'allowed'),
+        description=data.get('description')
+    )
+    db.session.add(new_vehicle)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({'error': 'Plate already registered'}), 400
+
+    return jsonify(new_vehicle.to_dict()), 201
+
+@vehicle.route('/vehicles', methods=['GET'])
+@require_role('guard', 'admin')
+def get_vehicles():
+    # Filter by owner and/or (prefix of the) plate.
+    query = Vehicle.query
+    user_id = request.args.get('user_id', type=int)
+    if user_id:
+        query = query.filter(Vehicle.user_id == user_id)
+    plate = normalize_plate(request.args.get('plate'))
+    if plate:
+        query = query.filter(Vehicle.plate_normalized.startswith(plate))
+
+    vehicles = query.order_by(Vehicle.id).limit(request.args.get('limit', 100, type=int)).all()
+    return jsonify({'vehicles': [v.to_dict() for v in vehicles]}), 200
+
+@vehicle.route('/vehicles/<int:vehicle_id>', methods=['PUT'])
+@require_role('admin')
+def update_vehicle(vehicle_id):
+    found = Vehicle.query.get(vehicle_id)
+    if found is None:
+        return jsonify({'error': 'Vehicle not found'}), 404
+
+    data = request.get_json()
+    if 'status' in data and data['status'] not in Vehicle.STATUSES:
+        return jsonify({'error': f'status must be one of {list(Vehicle.STATUSES)}'}), 400
+    if 'plate' in data:
+        found.plate = data['plate']
+    if 'status' in data:
+        found.status = data['status']
+    if 'description' in data:
+        found.description = data['description']
+
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({'error': 'Plate already registered'}), 400
+
+    return jsonify(found.to_dict()), 200
+
+@vehicle.route('/vehicles/<int:vehicle_id>', methods=['DELETE'])
+@require_role('admin')
+def delete_vehicle(vehicle_id):
+    found = Vehicle.query.get(vehicle_id)
+    if found is None:
+        return jsonify({'error': 'Vehicle not found'}), 404
+
+    db.session.delete(found)
+    db.session.commit()
+    return jsonify({'message': 'Vehicle deleted successfully'}), 200
+
+@vehicle.route('/gate/decision', methods=['GET'])
+@require_role('guard', 'admin')
+def gate_decision():
+    # Decide on a recognised plate using the in-memory index (no database query).
+    plate = request.args.get('plate')
+    if not normalize_plate(plate):
+        return jsonify({'error': 'Plate is required'}), 400
+    return jsonify(plate_index.decide(plate)), 200
@@ -0,0 +1,76 @@
+import re
+from sqlalchemy import or_, text
+from .models import User
+
+# Full-text index over the searchable user columns. It is an external-content
+# FTS5 table, so it only stores the index; triggers keep it in sync with "user".
+USER_FTS_SETUP = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS user_fts USING fts5(
+        name, email, phone_number, content='user', content_rowid='id')""",
+    """CREATE TRIGGER IF NOT EXISTS user_fts_ai AFTER INSERT ON user BEGIN
+        INSERT INTO user_fts(rowid, name, email, phone_number)
+        VALUES (new.id, new.name, new.email, new.phone_number);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS user_fts_ad AFTER DELETE ON user BEGIN
+        INSERT INTO user_fts(user_fts, rowid, name, email, phone_number)
+        VALUES ('delete', old.id, old.name, old.email, old.phone_number);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS user_fts_au AFTER UPDATE OF name, email, phone_number ON user BEGIN
+        INSERT INTO user_fts(user_fts, rowid, name, email, phone_number)
+        VALUES ('delete', old.id, old.name, old.email, old.phone_number);
+        INSERT INTO user_fts(rowid, name, email, phone_number)
+        VALUES (new.id, new.name, new.email, new.phone_number);
+    END""",
+    # Index the users that existed before the table was created.
+    "INSERT INTO user_fts(user_fts) VALUES ('rebuild')",
+]
+
+def has_user_search(engine):
+    """ True if the user_fts index exists (SQLite with FTS5), otherwise prefix search is used. """
+    if engine.dialect.name != 'sqlite':
+        return False
+    with engine.connect() as connection:
+        return connection.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'user_fts'")).first() is not None
+
+def setup_user_search(connection):
+    """
+    Create and fill the user_fts index (schema migration 2). Does nothing if
+    the database is not SQLite or SQLite was built without FTS5.
+    """
+    if connection.dialect.name != 'sqlite':
+        return
+    try:
+        connection.execute(text("CREATE VIRTUAL TABLE temp.fts5_probe USING fts5(x)"))
+        connection.execute(text("DROP TABLE temp.fts5_probe"))
+    except Exception:
+        return  # No FTS5 module in this SQLite build.
+    for statement in USER_FTS_SETUP:
+        connection.execute(text(statement))
+
+def fts_query(term):
+    """
+    Turn a search box string into an FTS5 query: every word becomes a quoted
+    prefix term, so "john@exa" matches john@example.com and no user input is
+    parsed as FTS5 syntax.
+    """
+    words = re.findall(r'\w+', term)
+    return ' '.join(f'"{word}"*' for word in words)
+
+def user_search_filter(term, use_fts):
+    """
+    Filter clause matching users whose name, email or phone number contains a
+    word starting with term (FTS5), or that start with term (fallback).
+    The FTS5 index avoids a full table scan. The fallback generally does not:
+    name and phone_number have no index, and SQLite's case-insensitive LIKE
+    can't use the email index; it is meant for databases without FTS5.
+    """
+    if use_fts:
+        query = fts_query(term)
+        if not query:
+            return None
+        matches = text("SELECT rowid FROM user_fts WHERE user_fts MATCH :query").bindparams(query=query)
+        return User.id.in_(matches)
+    # autoescape: % and _ in the term are matched literally, not as wildcards.
+    return or_(User.email.startswith(term, autoescape=True), User.name.startswith(term, autoescape=True),
+               User.phone_number.startswith(term, autoescape=True))
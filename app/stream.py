@@ -0,0 +1,108 @@
+import itertools
+import json
+import queue
+import threading
+from collections import deque
+
+class Subscription:
+    """ One connected dashboard: a bounded buffer of SSE frames waiting to be sent. """
+
+    def __init__(self, gate_no, max_buffer):
+        self.gate_no = gate_no
+        self.frames = queue.Queue(maxsize=max_buffer)
+        self.dropped = False
+
+    def drop(self):
+        # The client fell max_buffer frames behind: discard its backlog and end the stream.
+        self.dropped = True
+        while True:
+            try:
+                self.frames.get_nowait()
+            except queue.Empty:
+                break
+        self.frames.put_nowait(None)
+
+class GateHub:
+    """
+    In-process fan-out of gate events to server-sent event subscribers.
+    Each event is encoded once per publish and the same frame is put on the
+    buffer of every subscriber of that gate (and of subscribers to all gates),
+    so the cost per event doesn't grow with the encoding work per dashboard.
+    A subscriber whose buffer is full is dropped instead of slowing down the
+    publisher; the browser's EventSource reconnects and catches up from the
+    last `replay` events of the gate using Last-Event-ID.
+    """
+
+    def __init__(self, max_buffer=100, replay=100):
+        self.max_buffer = max_buffer
+        self.subscribers = {}  # gate number (None: all gates) -> set of Subscriptions
+        self.recent = {}       # gate number -> deque of (event id, frame)
+        self.replay = replay
+        self.dropped = 0
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def publish(self, gate_no, event):
+        """ Send an event (a JSON-serialisable dict) to the subscribers of its gate. """
+        with self._lock:
+            event_id = next(self._ids)
+            frame = f"id: {event_id}\nevent: gate_event\ndata: {json.dumps(event)}\n\n"
+            self.recent.setdefault(gate_no, deque(maxlen=self.replay)).append((event_id, frame))
+            targets = list(self.subscribers.get(gate_no, ())) + list(self.subscribers.get(None, ()))
+        for subscription in targets:
+            try:
+                subscription.frames.put_nowait(frame)
+            except queue.Full:
+                self._drop(subscription)
+
+    def subscribe(self, gate_no=None, last_event_id=None):
+        """ Subscribe to one gate (None for all gates), replaying events after last_event_id. """
+        subscription = Subscription(gate_no, self.max_buffer)
+        with self._lock:
+            if last_event_id is not None:
+                gates = [gate_no] if gate_no is not None else list(self.recent)
+                missed = sorted(item for gate in gates for item in self.recent.get(gate, ()) if item[0] > last_event_id)
+                for _, frame in missed[-self.max_buffer:]:
+                    subscription.frames.put_nowait(frame)
+            self.subscribers.setdefault(gate_no, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self.subscribers.get(subscription.gate_no)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self.subscribers[subscription.gate_no]
+
+    def _drop(self, subscription):
+        self.unsubscribe(subscription)
+        subscription.drop()
+        self.dropped += 1
+
+    def stream(self, subscription, heartbeat=15.0):
+        """
+        Yield the SSE frames of a subscription until it is dropped, with a
+        comment line every `heartbeat` seconds so proxies keep the connection
+        open and disconnected clients are noticed.
+        """
+        try:
+            yield "retry: 2000\n\n"
+            while True:
+                try:
+                    frame = subscription.frames.get(timeout=heartbeat)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                if frame is None:
+                    return
+                yield frame
+        finally:
+            self.unsubscribe(subscription)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'subscribers': {str(gate): len(subs) for gate, subs in self.subscribers.items()},
+                'dropped': self.dropped
+            }
@@ -0,0 +1,183 @@
+import argparse
+import csv
+import json
+import sys
+import time
+
+import numpy as np
+
+import ocr_reader
+from metrics import OCR_FALLBACKS, OCR_STAGE_SECONDS, REGISTRY
+from number_recognition import detect_license_plate_from_bytes
+from preprocessing import PROFILES
+
+# Stages reported by the benchmark, in pipeline order, as recorded by the
+# pipeline itself in OCR_STAGE_SECONDS ('ocr' is all readtext calls of an image).
+STAGES = ['decode', 'resize', 'preprocess', 'contours', 'ocr', 'total']
+
+def load_labels(path):
+    """ Read the ground-truth label file (CSV with path and plate columns). """
+    with open(path, newline='') as f:
+        return [(row['path'], normalize(row['plate'])) for row in csv.DictReader(f)]
+
+def normalize(text):
+    """ Upper-case the plate and drop everything but letters and digits. """
+    return ''.join(c for c in (text or '').upper() if c.isalnum())
+
+def edit_distance(a, b):
+    """ Levenshtein distance between two strings. """
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        previous = current
+    return previous[-1]
+
+def run_image(path, profile, budget_ms, samples, counts):
+    """
+    Run detect_license_plate_from_bytes, the entry point the app and the OCR
+    workers use, on one image (without the result cache). Stage times (ms)
+    are taken from the metrics the pipeline records and appended to samples;
+    OCR calls and fallbacks are added to counts. Returns the plate.
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    REGISTRY.dump(reset=True)  # Start from empty metrics, so they hold this image only.
+    start = time.perf_counter()
+    result = detect_license_plate_from_bytes(data, profile, use_cache=False, budget_ms=budget_ms)
+    samples['total'].append((time.perf_counter() - start) * 1000)
+
+    metrics = REGISTRY.dump(reset=True)
+    stages = metrics[OCR_STAGE_SECONDS.name]
+    for stage in ('decode', 'resize', 'preprocess', 'contours'):
+        samples[stage].append(stages.get((stage,), [[], 0.0])[1] * 1000)
+    calls, seconds = stages.get(('readtext',), [[], 0.0])
+    samples['ocr'].append(seconds * 1000)
+    counts['ocr_calls'] += sum(calls)
+    counts['fallbacks'] += metrics[OCR_FALLBACKS.name].get((), 0)
+    return result
+
+def percentiles(values):
+    if not values:
+        return {'count': 0}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {'count': len(values), 'mean': float(np.mean(values)),
+            'p50': float(p50), 'p95': float(p95), 'p99': float(p99)}
+
+def run_benchmark(labels, profile, repeat, budget_ms=None):
+    """ Run every labelled image `repeat` times and return the report dict. """
+    samples = {stage: [] for stage in STAGES}
+    counts = {'ocr_calls': 0, 'fallbacks': 0}
+    images = []
+    for _ in range(repeat):
+        images = []
+        for path, truth in labels:
+            text, confidence = run_image(path, profile, budget_ms, samples, counts)
+            predicted = normalize(text)
+            distance = edit_distance(predicted, truth)
+            images.append({
+                'path': path, 'truth': truth, 'predicted': predicted, 'confidence': float(confidence),
+                'correct': predicted == truth,
+                'char_accuracy': max(0.0, 1.0 - distance / float(len(truth) or 1)),
+            })
+
+    total_seconds = sum(samples['total']) / 1000
+    runs = float(len(samples['total']) or 1)
+    return {
+        'profile': profile or 'default',
+        'budget_ms': budget_ms,
+        'images': len(labels),
+        'repeat': repeat,
+        'throughput': len(samples['total']) / total_seconds if total_seconds else 0.0,
+        'ocr_calls_per_image': counts['ocr_calls'] / runs,
+        'fallback_rate': counts['fallbacks'] / runs,
+        'plate_accuracy': sum(image['correct'] for image in images) / float(len(images) or 1),
+        'char_accuracy': sum(image['char_accuracy'] for image in images) / float(len(images) or 1),
+        'latency_ms': {stage: percentiles(values) for stage, values in samples.items()},
+        'results': images,
+    }
+
+def print_report(report):
+    print(f"{report['images']} images x {report['repeat']} runs, profile {report['profile']}\n")
+    print(f"{'stage (ms)':<14}{'count':>7}{'p50':>10}{'p95':>10}{'p99':>10}")
+    for stage in STAGES:
+        stats = report['latency_ms'][stage]
+        if stats['count']:
+            print(f"{stage:<14}{stats['count']:>7}{stats['p50']:>10.2f}{stats['p95']:>10.2f}{stats['p99']:>10.2f}")
+    print(f"\nThroughput:     {report['throughput']:.2f} images/s")
+    print(f"OCR calls:      {report['ocr_calls_per_image']:.2f} per image")
+    print(f"Fallback rate:  {report['fallback_rate']:.1%}")
+    print(f"Plate accuracy: {report['plate_accuracy']:.1%}")
+    print(f"Char accuracy:  {report['char_accuracy']:.1%}")
+
+def compare(report, previous, max_accuracy_drop):
+    """
+    Print the change against a previous report. Returns False if plate or
+    character accuracy dropped by more than max_accuracy_drop.
+    """
+    print(f"\nCompared with previous run (profile {previous['profile']}):")
+    for stage in STAGES:
+        new, old = report['latency_ms'][stage], previous['latency_ms'].get(stage, {})
+        if new.get('count') and old.get('count'):
+            print(f"  {stage:<14} p50 {old['p50']:.2f} -> {new['p50']:.2f} ms, p95 {old['p95']:.2f} -> {new['p95']:.2f} ms")
+    print(f"  throughput     {previous['throughput']:.2f} -> {report['throughput']:.2f} images/s")
+
+    ok = True
+    for key in ('plate_accuracy', 'char_accuracy'):
+        drop = previous[key] - report[key]
+        flag = ''
+        if drop > max_accuracy_drop:
+            flag = '  <-- accuracy regression'
+            ok = False
+        print(f"  {key:<14} {previous[key]:.1%} -> {report[key]:.1%}{flag}")
+
+    # List the images whose result changed.
+    old_results = {image['path']: image for image in previous.get('results', [])}
+    for image in report['results']:
+        old = old_results.get(image['path'])
+        if old and old['correct'] != image['correct']:
+            state = 'fixed' if image['correct'] else 'broken'
+            print(f"  {state}: {image['path']} ({old['predicted'] or '-'} -> {image['predicted'] or '-'}, truth {image['truth']})")
+    return ok
+
+def main():
+    """
+    Benchmark the ANPR pipeline over the labelled images: latency percentiles
+    per stage, throughput and plate/character accuracy. Images go through
+    the public recognition entry point, so the numbers include everything
+    that ships (candidate ranking, early exit, fallback). The report is
+    written as JSON and can be compared with a previous report.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark and accuracy check for the plate recognition pipeline.")
+    parser.add_argument("--labels", default="benchmark_labels.csv", help="CSV file with path,plate columns.")
+    parser.add_argument("--profile", choices=sorted(PROFILES), help="Preprocessing profile (default: quality).")
+    parser.add_argument("--repeat", type=int, default=1, help="Times each image is processed.")
+    parser.add_argument("--budget-ms", type=float, help="Latency budget per image, as gates can set.")
+    parser.add_argument("--output", default="benchmark_results.json", help="Where to write the JSON report.")
+    parser.add_argument("--compare", help="Previous JSON report to compare with.")
+    parser.add_argument("--max-accuracy-drop", type=float, default=0.0,
+                        help="Allowed accuracy drop against --compare before failing.")
+    args = parser.parse_args()
+
+    labels = load_labels(args.labels)
+
+    # Load the OCR model first so that model load is not counted in the timings.
+    ocr_reader.warmup()
+
+    report = run_benchmark(labels, args.profile, args.repeat, args.budget_ms)
+    print_report(report)
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nReport written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+        if not compare(report, previous, args.max_accuracy_drop):
+            sys.exit(1)
+
+# Entry point of the script.
+if __name__ == "__main__":
+    main()
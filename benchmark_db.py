@@ -0,0 +1,116 @@
+import argparse
+import logging
+import os
+import random
+import secrets
+import tempfile
+import threading
+import time
+from collections import Counter
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))] if values else 0.0
+
+def seed(app, users):
+    """ Create an admin and `users` users (pre-hashed, so seeding is fast). """
+    from app.bulk_users import import_users
+    from app.passwords import get_hasher
+    with app.app_context():
+        admin_hash = get_hasher().hash('benchmark')
+        rows = [{'name': 'Benchmark admin', 'email': 'bench-admin@example.com', 'password_hash': admin_hash,
+                 'phone_number': '0', 'role': 'admin'}]
+        rows += [{'name': f'User {i}', 'email': f'bench{i}@example.com', 'password_hash': admin_hash,
+                  'phone_number': f'9{i:09d}', 'role': random.choice(['guard', 'resident', 'staff']),
+                  'gate_no': i % 10} for i in range(users)]
+        import_users(rows)
+
+def client_loop(app, stop, write_ratio, users, samples, errors):
+    """ One simulated client: logs in as admin, then mixes reads and writes until stopped. """
+    client = app.test_client()
+    client.post('/login', json={'email': 'bench-admin@example.com', 'password': 'benchmark'})
+    while not stop.is_set():
+        user_id = random.randint(2, users + 1)
+        if random.random() < write_ratio:
+            if random.random() < 0.5:
+                op = 'update_user'
+                call = lambda: client.put(f'/users/{user_id}', json={'name': f'User {user_id} {time.time()}'})
+            else:
+                op = 'record_event'
+                call = lambda: client.post('/events', json={'plate': f'KA01AB{user_id % 10000:04d}',
+                                                            'confidence': 0.9, 'gate_no': user_id % 10})
+        else:
+            if random.random() < 0.5:
+                op = 'list_users'
+                call = lambda: client.get(f'/users?cursor=&per_page=20&gate_no={user_id % 10}')
+            else:
+                op = 'get_user'
+                call = lambda: client.get(f'/users/{user_id}')
+        start = time.perf_counter()
+        try:
+            status = call().status_code
+        except Exception as e:
+            status = type(e).__name__
+        samples.append((op, (time.perf_counter() - start) * 1000))
+        if status not in (200, 202):
+            errors[(op, status)] += 1
+
+def main():
+    """
+    Concurrency benchmark for the database settings: simulated clients mix
+    /users reads with user updates and gate events, and the report shows
+    throughput, latency per operation and errors (e.g. "database is locked").
+    Settings come from the environment, so compare runs like:
+
+        python benchmark_db.py
+        SQLITE_JOURNAL_MODE=DELETE SQLITE_BUSY_TIMEOUT=0 python benchmark_db.py
+    """
+    parser = argparse.ArgumentParser(description="Database concurrency benchmark.")
+    parser.add_argument("--database", help="Database URL (default: a temporary SQLite file).")
+    parser.add_argument("--users", type=int, default=10000, help="Users to seed.")
+    parser.add_argument("--clients", type=int, default=16, help="Concurrent clients (threads).")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds to run.")
+    parser.add_argument("--write-ratio", type=float, default=0.3, help="Fraction of requests that write.")
+    args = parser.parse_args()
+
+    # The app reads its configuration from the environment at import time.
+    os.environ['DATABASE_URL'] = args.database or 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'benchmark.db')
+    os.environ.setdefault('LOGIN_IP_LIMIT', '100000')
+    os.environ.setdefault('SECRET_KEY', secrets.token_hex(32))  # Throwaway sessions for the benchmark clients.
+    from app import create_app, db, init_services
+    app = create_app()
+    init_services(app)  # Schema and services up front, so the first timed requests don't start them.
+    app.logger.setLevel(logging.CRITICAL)  # Failed requests are counted below instead of logged.
+    seed(app, args.users)
+    with app.app_context():
+        settings = db.engine.dialect.name
+        if settings == 'sqlite':
+            pragmas = ['journal_mode', 'synchronous', 'busy_timeout']
+            settings += ' ' + ', '.join(f"{p}={db.session.execute(db.text(f'PRAGMA {p}')).scalar()}" for p in pragmas)
+    print(f"Database: {os.environ['DATABASE_URL']} ({settings})")
+
+    samples, errors = [], Counter()
+    stop = threading.Event()
+    threads = [threading.Thread(target=client_loop, args=(app, stop, args.write_ratio, args.users, samples, errors))
+               for _ in range(args.clients)]
+    for t in threads:
+        t.start()
+    time.sleep(args.duration)
+    stop.set()
+    for t in threads:
+        t.join()
+    app.extensions['event_recorder'].close()
+
+    print(f"{len(samples)} requests in {args.duration:.0f}s with {args.clients} clients: "
+          f"{len(samples) / args.duration:.0f} requests/s")
+    for op in sorted({op for op, _ in samples}):
+        times = [ms for o, ms in samples if o == op]
+        print(f"  {op:<14} {len(times):>7}  p50 {percentile(times, 0.5):7.1f} ms  "
+              f"p95 {percentile(times, 0.95):7.1f} ms  p99 {percentile(times, 0.99):7.1f} ms")
+    print(f"Event writer: {app.extensions['event_recorder'].written} written, "
+          f"{app.extensions['event_recorder'].dropped} dropped, {app.extensions['event_recorder'].failed} failed")
+    for (op, status), count in sorted(errors.items(), key=str):
+        print(f"  errors: {op} -> {status}: {count}")
+
+if __name__ == "__main__":
+    main()
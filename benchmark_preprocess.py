@@ -0,0 +1,88 @@
+import argparse
+import os
+import time
+
+import cv2
+
+from number_recognition import resize_frame, read_plate_candidates, best_plate
+from preprocessing import PROFILES, find_plate_candidates
+
+def load_images(folder_path):
+    """ Load and resize (to 800px width, like the OCR pipeline) every image in the folder. """
+    valid_extensions = ('.jpg', '.jpeg', '.png', '.webp')
+    images = {}
+    for filename in sorted(os.listdir(folder_path)):
+        if filename.lower().endswith(valid_extensions):
+            img = cv2.imread(os.path.join(folder_path, filename))
+            if img is not None:
+                images[filename] = resize_frame(img)
+    return images
+
+def run_profile(images, profile, repeat, ocr):
+    """
+    Run the candidate search (and optionally OCR) with one profile.
+    Returns the per-stage milliseconds per image, the candidate boxes and
+    the OCR result of every image.
+    """
+    timings = {}
+    candidates, plates = {}, {}
+    for _ in range(repeat):
+        for filename, img in images.items():
+            candidates[filename] = find_plate_candidates(img, profile, timings)
+    if ocr:
+        for filename, img in images.items():
+            start = time.perf_counter()
+            plates[filename] = best_plate(read_plate_candidates(img, candidates[filename]))
+            timings['ocr'] = timings.get('ocr', 0.0) + (time.perf_counter() - start) * repeat
+    runs = float(repeat * len(images))
+    stage_ms = {stage: seconds * 1000 / runs for stage, seconds in timings.items()}
+    return stage_ms, candidates, plates
+
+def main():
+    """
+    Compare the preprocessing profiles on a folder of sample images:
+    per-stage milliseconds, images with plate candidates and, with --ocr,
+    the plate detection rate and agreement with the quality profile.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark the preprocessing profiles.")
+    parser.add_argument("folder", nargs="?", default="./images", help="Folder containing images to process.")
+    parser.add_argument("--repeat", type=int, default=3, help="Times each image is processed.")
+    parser.add_argument("--ocr", action="store_true", help="Also run OCR on the candidates to compare detections.")
+    args = parser.parse_args()
+
+    images = load_images(args.folder)
+    if not images:
+        print("No images found.")
+        return
+
+    results = {profile: run_profile(images, profile, args.repeat, args.ocr) for profile in PROFILES}
+
+    stages = []
+    for stage_ms, _, _ in results.values():
+        stages.extend(stage for stage in stage_ms if stage not in stages)
+
+    # Per-stage timings, one column per profile.
+    print(f"{len(images)} images, {args.repeat} runs each (ms per image)\n")
+    print(f"{'stage':<12}" + ''.join(f"{profile:>12}" for profile in results))
+    for stage in stages + ['total']:
+        row = f"{stage:<12}"
+        for stage_ms, _, _ in results.values():
+            value = sum(stage_ms.values()) if stage == 'total' else stage_ms.get(stage, 0.0)
+            row += f"{value:>12.2f}"
+        print(row)
+
+    # Detection counts, compared with the quality profile.
+    _, base_candidates, base_plates = results['quality']
+    print()
+    for profile, (_, candidates, plates) in results.items():
+        with_candidates = sum(1 for boxes in candidates.values() if boxes)
+        line = f"{profile:<12}{with_candidates}/{len(images)} images with candidates"
+        if args.ocr:
+            detected = sum(1 for text, _ in plates.values() if text is not None)
+            same = sum(1 for filename, (text, _) in plates.items() if text == base_plates[filename][0])
+            line += f", {detected}/{len(images)} plates detected, {same}/{len(images)} same as quality"
+        print(line)
+
+# Entry point of the script.
+if __name__ == "__main__":
+    main()
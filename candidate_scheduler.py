@@ -0,0 +1,104 @@
+import time
+
+import cv2
+import numpy as np
+
+from preprocessing import to_gray
+
+# Stop evaluating candidates once a plate is read with at least this confidence.
+EARLY_EXIT_CONFIDENCE = 0.8
+
+# Weights of the cheap features used to rank plate candidates.
+WEIGHTS = {'edges': 0.5, 'fill': 0.3, 'position': 0.2}
+
+def score_candidate(gray, box):
+    """
+    Score a candidate box with cheap features, higher is more plate-like:
+    - edge density: plates have many character edges (a good density is around 15%),
+    - fill ratio: plates are mostly a bright background with dark characters,
+    - position: plates sit in the lower, central part of the frame.
+    Returns a score between 0 and 1.
+    """
+    x, y, w, h = box
+    crop = gray[y:y + h, x:x + w]
+    if crop.size == 0:
+        return 0.0
+
+    edges = cv2.Canny(crop, 100, 200)
+    edge_density = cv2.countNonZero(edges) / float(crop.size)
+    edge_score = max(0.0, 1.0 - abs(edge_density - 0.15) / 0.15)
+
+    _, bright = cv2.threshold(crop, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    fill_ratio = cv2.countNonZero(bright) / float(crop.size)
+    fill_score = max(0.0, 1.0 - abs(fill_ratio - 0.65) / 0.65)
+
+    frame_h, frame_w = gray.shape[:2]
+    center_x = (x + w / 2.0) / frame_w
+    center_y = (y + h / 2.0) / frame_h
+    position_score = (1.0 - abs(center_x - 0.5)) * (0.5 + 0.5 * center_y)
+
+    return (WEIGHTS['edges'] * edge_score
+            + WEIGHTS['fill'] * fill_score
+            + WEIGHTS['position'] * position_score)
+
+def rank_candidates(img, boxes):
+    """
+    Return the candidate boxes sorted by score, most plate-like first.
+    img can be the BGR frame or its grayscale conversion (see to_gray).
+    """
+    if len(boxes) < 2:
+        return list(boxes)
+    gray = to_gray(img)
+    scores = [score_candidate(gray, box) for box in boxes]
+    order = np.argsort(scores, kind='stable')[::-1]
+    return [boxes[i] for i in order]
+
+class Deadline:
+    """ Per-frame latency budget in milliseconds (None means no budget). """
+
+    def __init__(self, budget_ms=None):
+        self.end = None if budget_ms is None else time.perf_counter() + budget_ms / 1000.0
+
+    def remaining_ms(self):
+        if self.end is None:
+            return float('inf')
+        return (self.end - time.perf_counter()) * 1000.0
+
+    def expired(self):
+        return self.remaining_ms() <= 0
+
+class FallbackCost:
+    """
+    Running estimate (exponential moving average) of how long the full-image
+    fallback OCR takes, used to skip it when the remaining budget is too small.
+    """
+
+    def __init__(self, initial_ms=500.0, alpha=0.2):
+        self.estimate_ms = initial_ms
+        self.alpha = alpha
+
+    def fits(self, deadline):
+        return deadline.remaining_ms() >= self.estimate_ms
+
+    def record(self, elapsed_ms):
+        self.estimate_ms += self.alpha * (elapsed_ms - self.estimate_ms)
+
+def evaluate_candidates(img, boxes, read_box, min_confidence=EARLY_EXIT_CONFIDENCE, deadline=None, gray=None):
+    """
+    Run OCR on the candidates in score order and collect the plate matches.
+    read_box(img, box) returns a list of (text, confidence); candidates are
+    ranked on `gray` if the caller already converted the frame. Evaluation stops
+    as soon as a match reaches min_confidence (None disables the early exit)
+    or when the deadline expires. Returns (results, number of OCR calls).
+    """
+    deadline = deadline or Deadline()
+    results, calls = [], 0
+    for box in rank_candidates(img if gray is None else gray, boxes):
+        if deadline.expired():
+            break
+        matches = read_box(img, box)
+        calls += 1
+        results.extend(matches)
+        if min_confidence is not None and any(conf >= min_confidence for _, conf in matches):
+            break
+    return results, calls
@@ -0,0 +1,156 @@
+import argparse
+import time
+
+import cv2
+
+from number_recognition import resize_frame, find_plate_candidates, read_plate_candidates, best_plate
+from plate_tracker import PlateTracker, track_plates
+from preprocessing import PROFILES
+
+def read_frames(source, frame_step=1):
+    """
+    Read frames from a video file, camera index or stream URL (e.g. rtsp://...).
+    Yields (frame_index, frame) for every frame_step-th frame. Skipped frames
+    are only grabbed, not decoded, which is much cheaper than read().
+    """
+    capture = cv2.VideoCapture(source)
+    if not capture.isOpened():
+        raise IOError(f"Could not open video source {source!r}")
+    try:
+        frame_index = 0
+        while True:
+            # grab() fetches the next frame; retrieve() decodes it only when we need it.
+            if not capture.grab():
+                break
+            if frame_index % frame_step == 0:
+                ok, frame = capture.retrieve()
+                if not ok:
+                    break
+                yield frame_index, frame
+            frame_index += 1
+    finally:
+        capture.release()
+
+class MotionGate:
+    """
+    Cheap frame-difference check used to drop near-duplicate or motionless frames.
+    Each frame is shrunk to a small blurred grayscale thumbnail and compared with
+    the last frame that was let through; the frame passes when enough pixels changed.
+    """
+
+    def __init__(self, pixel_threshold=25, min_changed=0.01, thumb_width=160, max_skip=None):
+        self.pixel_threshold = pixel_threshold  # Grey-level difference for a pixel to count as changed.
+        self.min_changed = min_changed          # Fraction of changed pixels needed to pass a frame.
+        self.thumb_width = thumb_width
+        self.max_skip = max_skip                # Pass a frame anyway after this many dropped frames.
+        self.reference = None
+        self.skipped = 0
+
+    def thumbnail(self, frame):
+        height, width = frame.shape[:2]
+        thumb = cv2.resize(frame, (self.thumb_width, max(1, self.thumb_width * height // width)),
+                           interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(thumb, cv2.COLOR_BGR2GRAY) if thumb.ndim == 3 else thumb
+        return cv2.GaussianBlur(gray, (5, 5), 0)
+
+    def changed(self, frame):
+        """ Return True if the frame differs enough from the last passed frame. """
+        thumb = self.thumbnail(frame)
+        if self.reference is None or self.reference.shape != thumb.shape:
+            self.reference = thumb
+            self.skipped = 0
+            return True
+
+        diff = cv2.absdiff(thumb, self.reference)
+        changed = cv2.countNonZero(cv2.threshold(diff, self.pixel_threshold, 255, cv2.THRESH_BINARY)[1])
+        if changed >= self.min_changed * thumb.size or (self.max_skip is not None and self.skipped >= self.max_skip):
+            # Compare the next frames with this one, so slow drifts still add up to motion.
+            self.reference = thumb
+            self.skipped = 0
+            return True
+
+        self.skipped += 1
+        return False
+
+def changed_frames(frames, gate=None):
+    """ Filter a stream of (frame_index, frame) pairs down to the frames that changed. """
+    gate = gate or MotionGate()
+    for frame_index, frame in frames:
+        if gate.changed(frame):
+            yield frame_index, frame
+
+def plate_candidates(frames, include_empty=False, profile=None):
+    """
+    Run preprocess_image and the contour search on each frame.
+    Yields (frame_index, resized_frame, boxes) for frames with at least one
+    plate candidate (or for every frame with include_empty=True).
+    """
+    for frame_index, frame in frames:
+        img = resize_frame(frame)
+        boxes = find_plate_candidates(img, profile)
+        if boxes or include_empty:
+            yield frame_index, img, boxes
+
+def recognize_stream(source, frame_step=1, gate=None, profile=None):
+    """
+    Full streaming pipeline: read frames, drop motionless ones, find plate
+    candidates and run OCR on them. Yields (frame_index, text, confidence)
+    for every frame where a plate was read.
+    """
+    frames = changed_frames(read_frames(source, frame_step), gate)
+    for frame_index, img, boxes in plate_candidates(frames, profile=profile):
+        text, confidence = best_plate(read_plate_candidates(img, boxes))
+        if text is not None:
+            yield frame_index, text, confidence
+
+def main():
+    """
+    Run the streaming pipeline on a video file or stream and report how many
+    frames were read, passed by the motion gate and recognised, the number of
+    OCR calls and the input fps.
+    """
+    parser = argparse.ArgumentParser(description="Recognise license plates in a video file or stream.")
+    parser.add_argument("source", help="Video file, camera index or stream URL.")
+    parser.add_argument("--frame-step", type=int, default=1, help="Only look at every N-th frame.")
+    parser.add_argument("--min-changed", type=float, default=0.01, help="Fraction of changed pixels to pass a frame.")
+    parser.add_argument("--no-ocr", action="store_true", help="Stop after the contour search (no OCR).")
+    parser.add_argument("--profile", choices=sorted(PROFILES), help="Preprocessing profile (default: quality).")
+    parser.add_argument("--track", action="store_true", help="Track plates and report one read per vehicle.")
+    args = parser.parse_args()
+
+    source = int(args.source) if args.source.isdigit() else args.source
+    gate = MotionGate(min_changed=args.min_changed)
+    counts = {'read': 0, 'passed': 0, 'candidates': 0, 'ocr': 0}
+
+    def counted(frames, key):
+        for item in frames:
+            counts[key] += 1
+            yield item
+
+    start = time.perf_counter()
+    frames = counted(changed_frames(counted(read_frames(source, args.frame_step), 'read'), gate), 'passed')
+    candidates = counted(plate_candidates(frames, include_empty=args.track, profile=args.profile), 'candidates')
+    if args.track:
+        # One event per vehicle; OCR only runs on new or low-confidence tracks.
+        tracker = PlateTracker()
+        for track_id, text, confidence in track_plates(candidates, tracker):
+            print(f"Vehicle {track_id}: {text} ({confidence:.2f})")
+        counts['ocr'] = tracker.ocr_calls
+    else:
+        for frame_index, img, boxes in candidates:
+            if args.no_ocr:
+                continue
+            counts['ocr'] += len(boxes)
+            text, confidence = best_plate(read_plate_candidates(img, boxes))
+            if text is not None:
+                print(f"Frame {frame_index}: {text} ({confidence:.2f})")
+    elapsed = time.perf_counter() - start
+
+    print(f"\nRead {counts['read']} frames, {counts['passed']} passed the motion gate, "
+          f"{counts['candidates']} had plate candidates, {counts['ocr']} OCR calls")
+    if elapsed > 0:
+        print(f"Processed {counts['read'] / elapsed:.1f} input frames/s")
+
+# Entry point of the script.
+if __name__ == "__main__":
+    main()
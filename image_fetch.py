@@ -0,0 +1,148 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlsplit
+
+import cv2
+import numpy as np
+import requests
+import urllib3
+from requests.adapters import HTTPAdapter
+
+class FetchError(Exception):
+    """ Raised when an image cannot be downloaded or decoded. """
+
+class ImageFetcher:
+    """
+    Downloads camera snapshots over a pooled HTTP session.
+    Connections are kept alive and reused per host, every request has a
+    connect/read timeout and a total deadline, and at most per_camera_limit
+    requests run at the same time against one camera (host:port), so one
+    slow camera cannot tie up all workers. A request waits at most
+    slot_timeout seconds for one of its camera's slots.
+    """
+
+    def __init__(self, timeout=(3.05, 10), per_camera_limit=2, pool_size=32, max_bytes=20 * 1024 * 1024,
+                 session=None, deadline=30, slot_timeout=10):
+        self.timeout = timeout  # (connect, read) timeout in seconds
+        # Whole download in seconds, so a camera dripping data can't hold a worker. It is checked
+        # between chunks, so a download ends at most one read timeout after it.
+        self.deadline = deadline
+        self.slot_timeout = slot_timeout
+        self.per_camera_limit = per_camera_limit
+        self.max_bytes = max_bytes  # Refuse snapshots larger than this.
+        self.session = session or requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._limits = {}
+        self._lock = threading.Lock()
+
+    def _camera_limit(self, url):
+        camera = urlsplit(url).netloc
+        with self._lock:
+            limit = self._limits.get(camera)
+            if limit is None:
+                limit = self._limits[camera] = threading.BoundedSemaphore(self.per_camera_limit)
+        return limit
+
+    def _get(self, url, headers=None, allow_redirects=True):
+        """
+        Download the image body. Returns (status, response headers, body); body is
+        None for 304 Not Modified. Raises FetchError on HTTP errors, timeouts or
+        oversized bodies.
+        """
+        limit = self._camera_limit(url)
+        if not limit.acquire(timeout=self.slot_timeout):
+            raise FetchError(f"Could not fetch {url}: too many downloads from this camera")
+        try:
+            end = time.monotonic() + self.deadline
+            with self.session.get(url, headers=headers, timeout=self.timeout, stream=True,
+                                  allow_redirects=allow_redirects) as response:
+                if response.status_code == 304:
+                    return 304, response.headers, None
+                response.raise_for_status()
+                if response.is_redirect:
+                    raise FetchError(f"{url} redirects to {response.headers.get('Location')}")
+                length = int(response.headers.get('Content-Length') or 0)
+                if length > self.max_bytes:
+                    raise FetchError(f"Image at {url} is too large ({length} bytes)")
+
+                # Read straight into one buffer instead of joining chunks afterwards. read1 returns
+                # as soon as some data arrived, so the deadline is checked at least once per read
+                # timeout even when a camera sends a few bytes at a time.
+                read = getattr(response.raw, 'read1', response.raw.read)
+                body = bytearray()
+                while True:
+                    chunk = read(64 * 1024, decode_content=True)
+                    if not chunk:
+                        break
+                    body += chunk
+                    if len(body) > self.max_bytes:
+                        raise FetchError(f"Image at {url} is too large")
+                    if time.monotonic() > end:
+                        raise FetchError(f"Could not fetch {url}: took longer than {self.deadline}s")
+                return response.status_code, response.headers, body
+        except (requests.RequestException, urllib3.exceptions.HTTPError) as e:
+            raise FetchError(f"Could not fetch {url}: {e}") from e
+        finally:
+            limit.release()
+
+    def fetch_bytes(self, url, allow_redirects=True):
+        """ Download the image body. Raises FetchError on HTTP errors, timeouts or oversized bodies. """
+        return self._get(url, allow_redirects=allow_redirects)[2]
+
+    def fetch_if_changed(self, url, etag=None, last_modified=None):
+        """
+        Conditional GET with the validators of an earlier download.
+        Returns (body, etag, last_modified); body is None if the image has not changed.
+        """
+        headers = {}
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+        status, response_headers, body = self._get(url, headers)
+        if status == 304:
+            return None, etag, last_modified
+        return body, response_headers.get('ETag'), response_headers.get('Last-Modified')
+
+    def fetch(self, url):
+        """ Download and decode an image. Returns a BGR array. """
+        body = self.fetch_bytes(url)
+        # np.frombuffer wraps the downloaded buffer without copying it.
+        img = cv2.imdecode(np.frombuffer(body, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if img is None:
+            raise FetchError(f"Could not decode image from {url}")
+        return img
+
+    def fetch_many(self, urls, max_workers=8):
+        """
+        Download and decode many images concurrently (the per-camera limit still applies).
+        Yields (url, image, error) as the downloads finish, so a slow camera doesn't
+        hold back the others; image is None when error is set.
+        """
+        def fetch_one(url):
+            try:
+                return url, self.fetch(url), None
+            except FetchError as e:
+                return url, None, e
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for future in as_completed([executor.submit(fetch_one, url) for url in urls]):
+                yield future.result()
+
+    def close(self):
+        self.session.close()
+
+_default_fetcher = None
+_default_lock = threading.Lock()
+
+def get_fetcher():
+    """ Return the process-wide fetcher, so connections are shared by all callers. """
+    global _default_fetcher
+    if _default_fetcher is None:
+        with _default_lock:
+            if _default_fetcher is None:
+                _default_fetcher = ImageFetcher()
+    return _default_fetcher
@@ -0,0 +1,74 @@
+import argparse
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))] if values else 0.0
+
+def register_accounts(base_url, emails, password):
+    # Create the test accounts; already registered ones answer 400, which is fine.
+    with requests.Session() as s:
+        for i, email in enumerate(emails):
+            s.post(f'{base_url}/register', json={'name': f'Load test {i}', 'email': email, 'password': password,
+                                                 'phone': '0000000000'})
+
+def login(base_url, email, password):
+    """ One login with a fresh session (like a guard's device). Returns (status, ms). """
+    start = time.perf_counter()
+    try:
+        status = requests.post(f'{base_url}/login', json={'email': email, 'password': password}, timeout=30).status_code
+    except requests.RequestException:
+        status = 'error'
+    return status, (time.perf_counter() - start) * 1000
+
+def run(base_url, emails, password, total, concurrency, wrong_password_ratio):
+    """ Send `total` logins from `concurrency` clients and return (statuses, latencies, seconds). """
+    # Every n-th attempt uses a wrong password, to mix brute-force-like traffic in.
+    every = round(1 / wrong_password_ratio) if wrong_password_ratio else 0
+    attempts = [(emails[i % len(emails)], 'wrong-' + password if every and i % every == 0 else password)
+                for i in range(total)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(lambda a: login(base_url, *a), attempts))
+    elapsed = time.perf_counter() - start
+    return Counter(status for status, _ in results), [ms for status, ms in results if status == 200], elapsed
+
+def main():
+    """
+    Measure login throughput and latency of a running server, e.g. a shift
+    change of 200 guards logging in at once:
+
+        python loadtest_login.py --url http://localhost:5000 --accounts 200 --register
+
+    Raise LOGIN_IP_LIMIT on the server first: all requests come from one address.
+    """
+    parser = argparse.ArgumentParser(description="Login load test.")
+    parser.add_argument("--url", default="http://localhost:5000", help="Base URL of the server.")
+    parser.add_argument("--accounts", type=int, default=100, help="Number of test accounts.")
+    parser.add_argument("--email", default="loadtest{}@example.com", help="Email pattern for the test accounts.")
+    parser.add_argument("--password", default="loadtest-password", help="Password of the test accounts.")
+    parser.add_argument("--register", action="store_true", help="Register the test accounts first.")
+    parser.add_argument("--requests", type=int, default=500, help="Total login attempts.")
+    parser.add_argument("--concurrency", type=int, default=50, help="Simultaneous clients.")
+    parser.add_argument("--wrong-password-ratio", type=float, default=0.0,
+                        help="Fraction of attempts made with a wrong password.")
+    args = parser.parse_args()
+
+    emails = [args.email.format(i) for i in range(args.accounts)]
+    if args.register:
+        register_accounts(args.url, emails, args.password)
+
+    statuses, latencies, elapsed = run(args.url, emails, args.password, args.requests, args.concurrency,
+                                       args.wrong_password_ratio)
+    print(f"{args.requests} attempts in {elapsed:.1f}s: {statuses.get(200, 0) / elapsed:.1f} successful logins/s")
+    print("Responses: " + ", ".join(f"{status}: {count}" for status, count in sorted(statuses.items(), key=str)))
+    if latencies:
+        print(f"Successful login latency (ms): p50 {percentile(latencies, 0.5):.0f}, "
+              f"p95 {percentile(latencies, 0.95):.0f}, p99 {percentile(latencies, 0.99):.0f}")
+
+if __name__ == "__main__":
+    main()
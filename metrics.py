@@ -0,0 +1,157 @@
+import bisect
+import threading
+
+# Default histogram buckets in seconds, from 1 ms to 10 s.
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class Counter:
+    """ A monotonically increasing value per label combination. """
+
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.values = {}  # label values -> count
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def dump(self, reset=False):
+        with self._lock:
+            state = dict(self.values)
+            if reset:
+                self.values.clear()
+        return state
+
+    def merge(self, state):
+        with self._lock:
+            for key, value in state.items():
+                self.values[key] = self.values.get(key, 0) + value
+
+    def samples(self):
+        for key, value in sorted(self.dump().items()):
+            yield self.name, key, value
+
+class Histogram:
+    """
+    Observations counted into cumulative buckets per label combination, with
+    their sum and count. Observing is a bisect and an increment under a lock,
+    cheap enough to leave on in the request and OCR paths.
+    """
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self.values = {}  # label values -> [per-bucket counts (last is +Inf), sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self.values.get(label_values)
+            if entry is None:
+                entry = self.values[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def dump(self, reset=False):
+        with self._lock:
+            state = {key: [list(counts), total] for key, (counts, total) in self.values.items()}
+            if reset:
+                self.values.clear()
+        return state
+
+    def merge(self, state):
+        with self._lock:
+            for key, (counts, total) in state.items():
+                entry = self.values.get(key)
+                if entry is None:
+                    entry = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+                for i, count in enumerate(counts):
+                    entry[0][i] += count
+                entry[1] += total
+
+    def samples(self):
+        for key, (counts, total) in sorted(self.dump().items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                yield self.name + '_bucket', key + (('+Inf' if bound == float('inf') else repr(bound)),), cumulative
+            yield self.name + '_sum', key, total
+            yield self.name + '_count', key, cumulative
+
+class Registry:
+    """ A named set of metrics that can be rendered in the Prometheus text format. """
+
+    def __init__(self):
+        self.metrics = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, *args, **kwargs):
+        with self._lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = cls(name, *args, **kwargs)
+            return metric
+
+    def counter(self, name, documentation, labels=()):
+        return self._get_or_create(Counter, name, documentation, labels)
+
+    def histogram(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._get_or_create(Histogram, name, documentation, labels, buckets)
+
+    def dump(self, reset=False):
+        """ Raw values of all metrics (picklable), e.g. to send from a worker process. """
+        return {name: metric.dump(reset) for name, metric in self.metrics.items()}
+
+    def merge(self, state):
+        """ Add values dumped by another registry with the same metrics. """
+        for name, values in state.items():
+            metric = self.metrics.get(name)
+            if metric is not None:
+                metric.merge(values)
+
+    def render(self):
+        """ All metrics in the Prometheus text exposition format. """
+        lines = []
+        for name, metric in sorted(self.metrics.items()):
+            lines.append(f'# HELP {name} {metric.documentation}')
+            lines.append(f'# TYPE {name} {metric.kind}')
+            label_names = metric.labels + (('le',) if metric.kind == 'histogram' else ())
+            for sample, label_values, value in metric.samples():
+                if label_values:
+                    labels = ','.join(f'{label}="{escape(v)}"' for label, v in zip(label_names, label_values))
+                    lines.append(f'{sample}{{{labels}}} {value}')
+                else:
+                    lines.append(f'{sample} {value}')
+        return '\n'.join(lines) + '\n'
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+# The process-wide registry.
+REGISTRY = Registry()
+
+# OCR pipeline metrics, shared by number_recognition and the test.py CLI.
+OCR_STAGE_SECONDS = REGISTRY.histogram(
+    'anpr_ocr_stage_seconds', 'Time spent in each plate recognition stage.', ['stage'])
+OCR_CANDIDATES = REGISTRY.counter(
+    'anpr_ocr_candidates_total', 'Plate candidate regions read with OCR.')
+OCR_FALLBACKS = REGISTRY.counter(
+    'anpr_ocr_fallbacks_total', 'Full-image OCR fallbacks after no candidate region gave a plate.')
+OCR_FRAMES = REGISTRY.counter(
+    'anpr_ocr_frames_total', 'Frames run through plate recognition, by outcome.', ['result'])
+
+def observe_candidate_search(timings):
+    """ Record the find_plate_candidates timings dict as the 'preprocess' and 'contours' stages. """
+    contours = timings.get('contours', 0.0)
+    OCR_STAGE_SECONDS.observe(sum(timings.values()) - contours, 'preprocess')
+    OCR_STAGE_SECONDS.observe(contours, 'contours')
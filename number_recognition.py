@@ -1,104 +1,190 @@
 import cv2
 import numpy as np
-import easyocr
-import requests
-from io import BytesIO
-import re
-
-# Initialize the OCR reader. Using GPU for better performance and accuracy (if available).
-reader = easyocr.Reader(['en'], gpu=True)
-
-# Define a regular expression to match license plate formats (example: Indian plates).
-LICENSE_PLATE_PATTERN = re.compile(r'^[A-Z0-9]{6,10}$')
-
-def preprocess_image(img):
-    """ 
-    Preprocess the image to improve OCR results by:
-    1. Converting it to grayscale.
-    2. Applying CLAHE to enhance contrast.
-    3. Denoising to reduce noise.
-    4. Using adaptive thresholding for better binarization.
-    5. Performing morphological operations to improve edge detection.
-    """
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-    clahe = cv2.createCLAHE(clipLimit=3.0, tileGridSize=(8, 8))
-    gray = clahe.apply(gray)
-    gray = cv2.fastNlMeansDenoising(gray, h=30)
-    binary = cv2.adaptiveThreshold(
-        gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 11, 2
-    )
-    kernel = np.ones((3, 3), np.uint8)
-    binary = cv2.dilate(binary, kernel, iterations=1)
-    return binary
-
-def detect_license_plate_from_url(image_url):
+import time
+
+from candidate_scheduler import EARLY_EXIT_CONFIDENCE, Deadline, FallbackCost, evaluate_candidates
+from image_fetch import get_fetcher
+from metrics import OCR_CANDIDATES, OCR_FALLBACKS, OCR_FRAMES, OCR_STAGE_SECONDS, observe_candidate_search
+from ocr_reader import get_reader
+from plate_grammar import DEFAULT_REGION, get_grammar
+from preprocessing import DEFAULT_PROFILE, find_plate_candidates, to_gray
+from result_cache import content_hash, get_result_cache
+
+# Options shared by every OCR call on plate regions.
+OCR_OPTIONS = dict(
+    allowlist='0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ',  # Restrict characters to alphanumeric.
+    height_ths=0.5,  # Adjust threshold for text height in region.
+    width_ths=0.5    # Adjust threshold for text width in region.
+)
+
+# Running estimate of the full-image fallback cost, used with latency budgets.
+fallback_cost = FallbackCost()
+
+def detect_license_plate_from_url(image_url, profile=None, use_cache=True):
     """
     Detect and extract license plate text from an image URL.
     Downloads the image, preprocesses it, and applies OCR to extract the license plate.
+    With use_cache, the image is re-requested with its ETag/Last-Modified
+    validators and an unchanged image (304) returns the cached result.
     """
-    # Fetch the image from the URL.
-    response = requests.get(image_url)
-    img_array = np.array(bytearray(response.content), dtype=np.uint8)
-    img = cv2.imdecode(img_array, cv2.IMREAD_COLOR)
-
-    # Resize image if width is greater than 800px to maintain consistent OCR performance.
+    if not use_cache:
+        # Fetch the image from the URL over the shared, pooled HTTP session (raises FetchError).
+        img = get_fetcher().fetch(image_url)
+        return detect_license_plate_from_image(img, profile)
+
+    cache = get_result_cache()
+    url_key = f"url:{image_url}"
+    validators = cache.get(url_key)
+    if validators:
+        body, etag, last_modified = get_fetcher().fetch_if_changed(
+            image_url, validators['etag'], validators['last_modified']
+        )
+        if body is None:
+            result = cache.get(validators['key'])
+            if result is not None:
+                return tuple(result)
+            # The result expired but the image did not change: download it again.
+            body, etag, last_modified = get_fetcher().fetch_if_changed(image_url)
+    else:
+        body, etag, last_modified = get_fetcher().fetch_if_changed(image_url)
+
+    key = result_key(body, profile)
+    if etag or last_modified:
+        cache.set(url_key, {'etag': etag, 'last_modified': last_modified, 'key': key})
+    return detect_license_plate_from_bytes(body, profile, key=key)
+
+def detect_license_plates_from_urls(image_urls, profile=None, max_workers=8):
+    """
+    Detect license plates in many image URLs.
+    The images are downloaded concurrently and each one is passed to OCR as
+    soon as it arrives. Yields (url, text, confidence, error) in that order,
+    not in input order.
+    """
+    for url, img, error in get_fetcher().fetch_many(image_urls, max_workers):
+        if error is not None:
+            yield url, None, 0.0, error
+            continue
+        text, confidence = detect_license_plate_from_image(img, profile)
+        yield url, text, confidence, None
+
+def result_key(image_bytes, profile=None):
+    """ Cache key of a recognition result: the preprocessing profile, the plate region and a hash of the image bytes. """
+    return f"{profile or DEFAULT_PROFILE}:{DEFAULT_REGION}:{content_hash(image_bytes)}"
+
+def detect_license_plate_from_bytes(image_bytes, profile=None, use_cache=True, key=None, budget_ms=None):
+    """
+    Detect and extract license plate text from encoded image bytes (JPEG, PNG, ...).
+    Raises ValueError if the bytes cannot be decoded as an image.
+    With use_cache, results are cached by a hash of the bytes, so repeated
+    submissions of the same image skip decoding and OCR. budget_ms limits
+    the OCR time (see detect_license_plate_from_image); results cut short
+    by a budget are not cached.
+    """
+    if use_cache:
+        cache = get_result_cache()
+        key = key or result_key(image_bytes, profile)
+        result = cache.get(key)
+        if result is not None:
+            return tuple(result)
+
+    start = time.perf_counter()
+    img = cv2.imdecode(np.frombuffer(image_bytes, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if img is None:
+        raise ValueError("Could not decode image")
+    OCR_STAGE_SECONDS.observe(time.perf_counter() - start, 'decode')
+    text, confidence = detect_license_plate_from_image(img, profile, budget_ms=budget_ms)
+
+    if use_cache and budget_ms is None:
+        cache.set(key, [text, float(confidence)])
+    return text, confidence
+
+def resize_frame(img):
+    """ Resize the image if its width is greater than 800px to maintain consistent OCR performance. """
     height, width = img.shape[:2]
     if width > 800:
         img = cv2.resize(img, (800, int(800 * height / width)))
+    return img
 
-    # Preprocess the image to prepare it for contour detection.
-    binary = preprocess_image(img)
+def crop_plate_region(img, box, padding=10):
+    """ Crop a candidate box out of the image, with padding for better OCR results. """
+    x, y, w, h = box
+    x1, y1 = max(0, x - padding), max(0, y - padding)
+    x2, y2 = min(img.shape[1], x + w + padding), min(img.shape[0], y + h + padding)
+    return img[y1:y2, x1:x2]
 
-    # Find contours in the preprocessed binary image.
-    contours, _ = cv2.findContours(binary, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-    plate_candidates = []
+def filter_plate_results(ocr_results):
+    """
+    Keep the (text, confidence) pairs of EasyOCR results that fit the plate
+    grammar of the region (PLATE_REGION), joining reads split over adjacent
+    boxes and correcting characters OCR confuses. Best plates come first.
+    """
+    return get_grammar().read(ocr_results)
 
-    # Loop through contours and filter them based on aspect ratio and size.
-    for contour in sorted(contours, key=cv2.contourArea, reverse=True)[:15]:
-        x, y, w, h = cv2.boundingRect(contour)
-        aspect_ratio = float(w) / h
-        if 2.0 <= aspect_ratio <= 5.0 and w > 100:
-            plate_candidates.append((x, y, w, h))
+def read_plates(img):
+    """
+    Apply OCR to an image (or plate region) and return the (text, confidence)
+    pairs that fit the plate grammar of the region, best first.
+    """
+    start = time.perf_counter()
+    ocr_results = get_reader().readtext(img, **OCR_OPTIONS)
+    OCR_STAGE_SECONDS.observe(time.perf_counter() - start, 'readtext')
+    return filter_plate_results(ocr_results)
 
+def read_plate_candidates(img, plate_candidates):
+    """ Apply OCR to each candidate region and return all plate matches. """
     results = []  # Store detected license plates and confidence scores.
+    for box in plate_candidates:
+        results.extend(read_plates(crop_plate_region(img, box)))
+    return results
 
-    # Process each detected region to apply OCR.
-    for (x, y, w, h) in plate_candidates:
-        padding = 10
-        x1, y1 = max(0, x - padding), max(0, y - padding)
-        x2, y2 = min(img.shape[1], x + w + padding), min(img.shape[0], y + h + padding)
-        plate_region = img[y1:y2, x1:x2]
-
-        # Apply OCR to the detected plate region.
-        ocr_results = reader.readtext(
-            plate_region,
-            allowlist='0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ',
-            height_ths=0.5,
-            width_ths=0.5
-        )
+def best_plate(results):
+    """ Return the (text, confidence) result with the highest confidence score. """
+    if results:
+        return max(results, key=lambda x: x[1])  # First match wins on equal confidence.
+    return None, 0.0  # No valid license plate detected.
 
-        # Filter OCR results using the regex pattern for license plates.
-        for (bbox, text, conf) in ocr_results:
-            if LICENSE_PLATE_PATTERN.match(text):
-                results.append((text, conf))
+def detect_license_plate_from_image(img, profile=None, min_confidence=EARLY_EXIT_CONFIDENCE, budget_ms=None,
+                                    fallback=True):
+    """
+    Detect and extract license plate text from a decoded BGR image.
+    Preprocesses the image and applies OCR to extract the license plate.
+    The frame is converted to grayscale once for the contour search and the
+    ranking; OCR reads the BGR frame.
+    Candidates are read in order of a cheap plate-likeness score, and reading
+    stops at the first plate with at least min_confidence (None reads all).
+    budget_ms limits the time spent on the frame: no OCR is started after it
+    runs out, and the full-image fallback (which can be disabled) only runs if
+    its expected cost still fits in the budget.
+    """
+    deadline = Deadline(budget_ms)
+    start = time.perf_counter()
+    img = resize_frame(img)
+    OCR_STAGE_SECONDS.observe(time.perf_counter() - start, 'resize')
+
+    # One grayscale buffer for the contour search and the ranking.
+    timings = {}
+    start = time.perf_counter()
+    gray = to_gray(img)
+    timings['grayscale'] = time.perf_counter() - start
+    boxes = find_plate_candidates(gray, profile, timings)
+    observe_candidate_search(timings)
+
+    # Process the detected regions in score order to apply OCR.
+    results, calls = evaluate_candidates(
+        img, boxes,
+        lambda img, box: read_plate_candidates(img, [box]),
+        min_confidence, deadline, gray
+    )
+    OCR_CANDIDATES.inc(amount=calls)
 
     # If no plates are found, try a fallback OCR on the full image.
-    if not results:
-        ocr_results = reader.readtext(
-            img,
-            allowlist='0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ',
-            height_ths=0.5,
-            width_ths=0.5
-        )
-        for (bbox, text, conf) in ocr_results:
-            if LICENSE_PLATE_PATTERN.match(text):
-                results.append((text, conf))
+    if not results and fallback and fallback_cost.fits(deadline):
+        OCR_FALLBACKS.inc()
+        start = time.perf_counter()
+        results = read_plates(img)
+        fallback_cost.record((time.perf_counter() - start) * 1000)
 
     # Return the best result based on the highest confidence score.
-    if results:
-        results.sort(key=lambda x: x[1], reverse=True)
-        return results[0]  # Return the text and confidence of the best match.
-
-    return None, 0.0  # No valid license plate detected.
-
-
+    text, confidence = best_plate(results)
+    OCR_FRAMES.inc('plate' if text else 'none')
+    return text, confidence
@@ -0,0 +1,191 @@
+import multiprocessing
+import os
+import threading
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import CancelledError, Future, ProcessPoolExecutor
+
+from metrics import REGISTRY
+
+class PoolBusy(Exception):
+    """ Raised when the job queue is full and a frame cannot be accepted. """
+
+class UnknownJob(KeyError):
+    """ Raised for job ids the pool doesn't know (never submitted, or forgotten since). """
+
+def init_worker(threads_per_worker):
+    """
+    Initialise a worker process: limit the number of torch threads so the
+    workers do not fight over the cores, then load and warm the OCR reader.
+    Usable as the initializer of any process pool that runs recognition.
+    """
+    try:
+        import torch
+        torch.set_num_threads(threads_per_worker)
+    except ImportError:
+        pass
+    import ocr_reader
+    ocr_reader.warmup()
+
+def _recognize(image_bytes, profile=None, budget_ms=None):
+    """ Run plate recognition on encoded image bytes (executed in a worker process). """
+    from number_recognition import detect_license_plate_from_bytes
+    text, confidence = detect_license_plate_from_bytes(image_bytes, profile, budget_ms=budget_ms)
+    # Send the metrics recorded since the last job along to the parent, which serves /metrics.
+    return {'plate': text, 'confidence': float(confidence), 'metrics': REGISTRY.dump(reset=True)}
+
+def _public(result):
+    # The job result without the worker's metrics.
+    return {key: value for key, value in result.items() if key != 'metrics'}
+
+def _collect_metrics(future):
+    # Add a finished job's worker metrics to this process's registry.
+    if not future.cancelled() and future.exception() is None:
+        REGISTRY.merge(future.result().get('metrics', {}))
+
+class OcrWorkerPool:
+    """
+    A pool of OCR worker processes, each holding its own warmed reader.
+    Jobs go through a bounded queue: submit() raises PoolBusy instead of
+    queueing without limit when max_pending jobs are already waiting or running.
+    Waiting jobs are queued per gate and at most one job per worker runs at
+    a time. With a scheduler (an object with pick({gate: weight}), such as
+    app.gates.WeightedRoundRobin) a free worker takes the next job of the
+    gate the scheduler picks, so a busy gate can't starve the others;
+    without one, jobs run in the order they were submitted.
+    """
+
+    def __init__(self, workers=None, max_pending=None, threads_per_worker=1, keep_results=1000, scheduler=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending or self.workers * 4
+        self.keep_results = keep_results  # Number of finished jobs kept for polling.
+        self.scheduler = scheduler
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._jobs = OrderedDict()  # job id -> future, oldest first
+        self._lock = threading.Lock()
+        self._queues = {}  # gate -> deque of (future, args) waiting for a worker
+        self._weights = {}  # gate -> weight given with its latest job
+        self._running = 0
+        self._queue_lock = threading.Lock()
+        # Use spawn so workers do not inherit the Flask app or torch state of the parent.
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=init_worker,
+            initargs=(threads_per_worker,)
+        )
+
+    def submit(self, image_bytes, timeout=None, callback=None, errback=None, profile=None, budget_ms=None,
+               gate=None, weight=1):
+        """
+        Queue a frame for recognition and return its job id.
+        Waits up to `timeout` seconds for a free slot (default: don't wait),
+        then raises PoolBusy. callback(result) is called (in a pool thread)
+        when the job succeeds, errback(exception) when it fails (neither for
+        jobs cancelled by shutdown()). profile and
+        budget_ms are passed on to the recognition (e.g. a gate's settings);
+        gate and weight are the gate's share of the workers under load.
+        """
+        if not self._slots.acquire(blocking=timeout is not None, timeout=timeout):
+            raise PoolBusy("OCR queue is full")
+        future = Future()
+        future.add_done_callback(lambda _: self._slots.release())
+        future.add_done_callback(_collect_metrics)
+        if callback is not None:
+            future.add_done_callback(lambda f: not f.cancelled() and f.exception() is None and callback(_public(f.result())))
+        if errback is not None:
+            future.add_done_callback(lambda f: not f.cancelled() and f.exception() is not None and errback(f.exception()))
+
+        # Without a scheduler all jobs share one queue.
+        gate = gate if self.scheduler is not None else None
+        with self._queue_lock:
+            self._queues.setdefault(gate, deque()).append((future, (image_bytes, profile, budget_ms)))
+            self._weights[gate] = weight
+        self._dispatch()
+
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._jobs[job_id] = future
+            self._forget_old_jobs()
+        return job_id
+
+    def _dispatch(self):
+        """ Hand waiting jobs to the workers while some are free, picking the gate by the scheduler. """
+        started = []
+        with self._queue_lock:
+            while self._running < self.workers and self._queues:
+                gate = (self.scheduler.pick({g: self._weights[g] for g in self._queues})
+                        if self.scheduler is not None else next(iter(self._queues)))
+                queue = self._queues[gate]
+                future, args = queue.popleft()
+                if not queue:
+                    del self._queues[gate]
+                    del self._weights[gate]
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    started.append((future, self._executor.submit(_recognize, *args)))
+                except Exception as e:
+                    future.set_exception(e)
+                    continue
+                self._running += 1
+        # Outside the lock: a job that is already done runs its callback right away.
+        for future, running in started:
+            running.add_done_callback(lambda done, future=future: self._finished(future, done))
+
+    def _finished(self, future, done):
+        # A worker is free: start the next job, then pass the outcome on.
+        with self._queue_lock:
+            self._running -= 1
+        self._dispatch()
+        if done.cancelled():
+            future.set_exception(CancelledError("OCR pool shut down"))
+        elif done.exception() is not None:
+            future.set_exception(done.exception())
+        else:
+            future.set_result(done.result())
+
+    def _forget_old_jobs(self):
+        """ Drop the oldest finished jobs once more than keep_results are stored. """
+        excess = len(self._jobs) - self.keep_results
+        for job_id in list(self._jobs):
+            if excess <= 0:
+                break
+            if self._jobs[job_id].done():
+                del self._jobs[job_id]
+                excess -= 1
+
+    def result(self, job_id, timeout=None):
+        """
+        Wait up to `timeout` seconds for a job and return its result.
+        Raises UnknownJob for unknown job ids, concurrent.futures.TimeoutError
+        if the job is not done in time, and re-raises errors from the worker.
+        """
+        return _public(self._future(job_id).result(timeout=timeout))
+
+    def status(self, job_id):
+        """ Return 'pending', 'done' or 'failed' for a job (UnknownJob for unknown ids). """
+        future = self._future(job_id)
+        if not future.done():
+            return 'pending'
+        return 'failed' if future.exception() is not None else 'done'
+
+    def _future(self, job_id):
+        with self._lock:
+            future = self._jobs.get(job_id)
+        if future is None:
+            raise UnknownJob(job_id)
+        return future
+
+    def recognize(self, image_bytes, timeout=None):
+        """ Submit a frame and wait for its result. """
+        return self.result(self.submit(image_bytes), timeout=timeout)
+
+    def shutdown(self, wait=True):
+        with self._queue_lock:
+            waiting = [future for queue in self._queues.values() for future, _ in queue]
+            self._queues.clear()
+            self._running = self.workers  # Nothing more is dispatched.
+        for future in waiting:
+            future.cancel()
+        self._executor.shutdown(wait=wait, cancel_futures=True)
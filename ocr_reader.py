@@ -0,0 +1,63 @@
+import os
+import threading
+
+import numpy as np
+
+# Settings used when the reader is created. They can be changed with configure()
+# (or the environment variables) before the first call to get_reader().
+settings = {
+    'languages': os.environ.get('OCR_LANGUAGES', 'en').split(','),
+    'gpu': os.environ.get('OCR_GPU', '').lower() in ('1', 'true', 'yes'),  # Our gate boxes have no GPU.
+    'model_storage_directory': os.environ.get('OCR_MODEL_DIR') or None,
+}
+
+_reader = None  # One reader per process, created on first use.
+_lock = threading.Lock()
+
+def configure(languages=None, gpu=None, model_storage_directory=None):
+    """
+    Change the reader settings (languages, device and model directory).
+    Must be called before the reader is first used; raises RuntimeError otherwise.
+    """
+    with _lock:
+        if _reader is not None:
+            raise RuntimeError("OCR reader already created; configure() must be called before first use")
+        if languages is not None:
+            settings['languages'] = list(languages)
+        if gpu is not None:
+            settings['gpu'] = gpu
+        if model_storage_directory is not None:
+            settings['model_storage_directory'] = model_storage_directory
+
+def get_reader():
+    """
+    Return the process-wide EasyOCR reader, creating it on first use.
+    easyocr (and torch) are only imported here, so importing the modules that
+    use OCR does not pay for the model load.
+    """
+    global _reader
+    if _reader is None:
+        with _lock:
+            if _reader is None:
+                import easyocr
+                _reader = easyocr.Reader(
+                    settings['languages'],
+                    gpu=settings['gpu'],
+                    model_storage_directory=settings['model_storage_directory'],
+                    verbose=False
+                )
+    return _reader
+
+def warmup():
+    """
+    Load the model and run one dummy inference, so the first real vehicle
+    does not wait for model load or the first (slow) forward pass.
+    """
+    dummy = np.full((64, 256, 3), 255, dtype=np.uint8)
+    get_reader().readtext(dummy)
+
+def warmup_in_background():
+    """ Run warmup() in a daemon thread and return the thread. """
+    thread = threading.Thread(target=warmup, name='ocr-warmup', daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,303 @@
+import os
+import re
+from collections import namedtuple
+
+# Characters OCR confuses with each other. A letter read where the format
+# expects a digit (or the other way round) is mapped to its look-alike.
+TO_LETTER = {'0': 'O', '1': 'I', '2': 'Z', '4': 'A', '5': 'S', '6': 'G', '7': 'T', '8': 'B'}
+TO_DIGIT = {'O': '0', 'D': '0', 'Q': '0', 'U': '0', 'I': '1', 'L': '1', 'Z': '2', 'A': '4', 'S': '5',
+            'G': '6', 'T': '7', 'B': '8'}
+
+LETTERS = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+DIGITS = '0123456789'
+
+# One part of a plate format. kind is 'letters', 'digits', 'any' (letters or
+# digits, read as they are) or 'literal' (exactly `values`, a string).
+# chars are the characters the part may hold and values optionally
+# restricts it to a set of known codes.
+Section = namedtuple('Section', 'name kind min_len max_len chars values')
+
+def letters(name, min_len, max_len=None, values=None, chars=LETTERS):
+    return Section(name, 'letters', min_len, max_len or min_len, chars, values)
+
+def digits(name, min_len, max_len=None):
+    return Section(name, 'digits', min_len, max_len or min_len, DIGITS, None)
+
+def literal(name, text):
+    return Section(name, 'literal', len(text), len(text), text, text)
+
+def any_chars(name, min_len, max_len):
+    return Section(name, 'any', min_len, max_len, LETTERS + DIGITS, None)
+
+# A plate read that fits a format: the corrected text, the format name, the
+# text of each section and the number of characters that were corrected.
+PlateMatch = namedtuple('PlateMatch', 'text format sections substitutions')
+
+class PlateFormat:
+    """
+    One plate layout as a sequence of sections, e.g. state code, district,
+    series and number. The format is compiled to a regex that accepts every
+    character a section could hold after correction, so most garbage is
+    rejected before the (small) search over section lengths. min_len is the
+    shortest plate the format accepts (default: the sum of the section
+    minimums). check is an optional function({section: text}) -> bool for
+    rules across sections, e.g. a check digit.
+    """
+
+    def __init__(self, name, sections, check=None, min_len=None):
+        self.name = name
+        self.sections = sections
+        self.check = check
+        self.min_len = max(min_len or 0, sum(s.min_len for s in sections))
+        self.max_len = sum(s.max_len for s in sections)
+        self.pattern = re.compile(''.join(self._section_pattern(s) for s in sections))
+
+    @staticmethod
+    def _section_pattern(section):
+        chars = section.chars
+        if section.kind != 'any':
+            confusions = list(TO_LETTER.items()) + list(TO_DIGIT.items())
+            chars += ''.join(read for read, meant in confusions if meant in section.chars)
+        return f"[{''.join(sorted(set(chars)))}]{{{section.min_len},{section.max_len}}}"
+
+    @staticmethod
+    def _read_section(section, chunk):
+        """
+        Correct one section of the text. Returns (text, corrections) or None if
+        it can't fit. A free-form section (no known values) must keep at least
+        one character as read: a section made only of corrections is more
+        likely a different layout (MH12AB is not MH12A8).
+        """
+        if section.kind == 'any':
+            return chunk, 0
+        if section.kind == 'literal':
+            expected = section.values
+            fixes = sum(a != b for a, b in zip(chunk, expected))
+            fits = all(a == b or TO_LETTER.get(a) == b or TO_DIGIT.get(a) == b for a, b in zip(chunk, expected))
+            return (expected, fixes) if fits else None
+        mapping = TO_LETTER if section.kind == 'letters' else TO_DIGIT
+        chars, fixes = [], 0
+        for char in chunk:
+            if char not in section.chars:
+                char = mapping.get(char)
+                if char is None or char not in section.chars:
+                    return None
+                fixes += 1
+            chars.append(char)
+        text = ''.join(chars)
+        if section.values is not None and text not in section.values:
+            return None
+        if section.values is None and chunk and fixes == len(chunk):
+            return None
+        return text, fixes
+
+    def parse(self, text, max_substitutions):
+        """
+        Fit cleaned text to the format. Tries every split of the text into
+        section lengths (longest first) and returns the PlateMatch that needs
+        the fewest corrections (that passes check), or None.
+        """
+        if not self.min_len <= len(text) <= self.max_len or not self.pattern.fullmatch(text):
+            return None
+        best = None
+
+        def search(index, position, parts, fixes):
+            nonlocal best
+            if fixes > max_substitutions or (best is not None and fixes >= best[1]):
+                return
+            if index == len(self.sections):
+                if position == len(text) and (self.check is None or self.check(self._named(parts))):
+                    best = (list(parts), fixes)
+                return
+            section = self.sections[index]
+            for length in range(section.max_len, section.min_len - 1, -1):
+                if position + length > len(text):
+                    continue
+                read = self._read_section(section, text[position:position + length])
+                if read is not None:
+                    parts.append(read[0])
+                    search(index + 1, position + length, parts, fixes + read[1])
+                    parts.pop()
+
+        search(0, 0, [], 0)
+        if best is None:
+            return None
+        parts, fixes = best
+        return PlateMatch(''.join(parts), self.name, self._named(parts), fixes)
+
+    def _named(self, parts):
+        return dict(zip((s.name for s in self.sections), parts))
+
+# Indian registration marks: state or union territory code, RTO district
+# number, optional series letters (never I or O) and a number of up to four
+# digits (KA01AB1234, DL3CAF0001, MH12A123), and the Bharat series (22BH1234AB).
+# A plate has at least 6 characters and a series or a full 4-digit number, so
+# the top line of a two-line plate (MH12) is not a plate on its own.
+INDIAN_STATE_CODES = frozenset([
+    'AN', 'AP', 'AR', 'AS', 'BR', 'CG', 'CH', 'DD', 'DL', 'DN', 'GA', 'GJ', 'HP', 'HR', 'JH', 'JK', 'KA',
+    'KL', 'LA', 'LD', 'MH', 'ML', 'MN', 'MP', 'MZ', 'NL', 'OD', 'OR', 'PB', 'PY', 'RJ', 'SK', 'TG', 'TN',
+    'TR', 'TS', 'UA', 'UK', 'UP', 'WB',
+])
+
+SERIES_LETTERS = LETTERS.replace('I', '').replace('O', '')
+
+INDIAN_FORMATS = [
+    PlateFormat('in-standard', [
+        letters('state', 2, values=INDIAN_STATE_CODES),
+        digits('district', 1, 2),
+        letters('series', 0, 3, chars=SERIES_LETTERS),
+        digits('number', 1, 4),
+    ], check=lambda parts: bool(parts['series']) or len(parts['number']) == 4, min_len=6),
+    PlateFormat('in-bharat', [
+        digits('year', 2),
+        literal('bh', 'BH'),
+        digits('number', 4),
+        letters('series', 1, 2, chars=SERIES_LETTERS),
+    ]),
+]
+
+# Any 6 to 10 letters and digits, no corrections: the old single-regex filter.
+GENERIC_FORMATS = [PlateFormat('generic', [any_chars('text', 6, 10)])]
+
+# Plate formats by region. Add a region with register_region.
+REGIONS = {
+    'IN': INDIAN_FORMATS,
+    'generic': GENERIC_FORMATS,
+}
+
+# Region used when none is given. 'generic' accepts any plate the old filter
+# did (e.g. the Vietnamese sample in benchmark_labels.csv); set
+# PLATE_REGION=IN for Indian-only formats with character corrections.
+DEFAULT_REGION = os.environ.get('PLATE_REGION', 'generic')
+
+def register_region(name, formats):
+    """ Add or replace the plate formats of a region. """
+    REGIONS[name] = list(formats)
+    _grammars.pop(name, None)
+
+def clean_text(text):
+    """ Uppercase OCR text and drop everything but letters and digits (spaces, dashes, dots). """
+    return re.sub(r'[^A-Z0-9]', '', text.upper())
+
+def box_bounds(bbox):
+    """ (x1, y1, x2, y2) of an EasyOCR box given as four corner points. """
+    xs = [point[0] for point in bbox]
+    ys = [point[1] for point in bbox]
+    return min(xs), min(ys), max(xs), max(ys)
+
+def adjacent(a, b):
+    """
+    True if text box b continues the plate after box a: to its right on the
+    same line (one-line plates split in two), or right below it (two-line
+    plates, state and district on top and the number below).
+    """
+    ax1, ay1, ax2, ay2 = a
+    bx1, by1, bx2, by2 = b
+    height = max(ay2 - ay1, by2 - by1, 1)
+    v_overlap = min(ay2, by2) - max(ay1, by1)
+    h_overlap = min(ax2, bx2) - max(ax1, bx1)
+    same_line = v_overlap >= 0.5 * min(ay2 - ay1, by2 - by1) and -0.3 * height <= bx1 - ax2 <= 1.5 * height
+    next_line = h_overlap >= 0.3 * min(ax2 - ax1, bx2 - bx1) and -0.3 * height <= by1 - ay2 <= 0.8 * height
+    return same_line or next_line
+
+def merge_adjacent(ocr_results, max_parts=3):
+    """
+    Join OCR boxes that sit next to each other into longer reads.
+    Returns (text, confidence, boxes) for every box on its own and for every
+    chain of up to max_parts adjacent boxes in reading order, boxes being the
+    indexes of the OCR results it is made of; a chain gets the confidence of
+    its least confident box.
+    """
+    boxes = [(box_bounds(bbox), clean_text(text), conf) for bbox, text, conf in ocr_results]
+    reads = [(text, conf, (i,)) for i, (_, text, conf) in enumerate(boxes) if text]
+    if len(boxes) < 2 or max_parts < 2:
+        return reads
+    following = [[j for j, other in enumerate(boxes) if j != i and adjacent(box[0], other[0])]
+                 for i, box in enumerate(boxes)]
+
+    def extend(chain, text, conf):
+        for j in following[chain[-1]]:
+            if j in chain:
+                continue
+            joined, joined_conf = text + boxes[j][1], min(conf, boxes[j][2])
+            reads.append((joined, joined_conf, tuple(chain) + (j,)))
+            if len(chain) + 1 < max_parts:
+                extend(chain + [j], joined, joined_conf)
+
+    for i, (_, text, conf) in enumerate(boxes):
+        extend([i], text, conf)
+    return reads
+
+class PlateGrammar:
+    """
+    Validates and ranks OCR reads against the plate formats of a region.
+    Reads are cleaned, adjacent boxes are joined, characters that contradict
+    the format at their position are corrected through the confusion tables
+    (at most max_substitutions per read), and every correction lowers the
+    confidence by substitution_penalty.
+    """
+
+    def __init__(self, formats, max_substitutions=2, substitution_penalty=0.9):
+        self.formats = formats
+        self.max_substitutions = max_substitutions
+        self.substitution_penalty = substitution_penalty
+        self.min_len = min(f.min_len for f in formats)
+        self.max_len = max(f.max_len for f in formats)
+
+    def parse(self, text):
+        """ The best PlateMatch of text over all formats (fewest corrections first), or None. """
+        text = clean_text(text)
+        if not self.min_len <= len(text) <= self.max_len:
+            return None
+        best = None
+        for plate_format in self.formats:
+            match = plate_format.parse(text, self.max_substitutions)
+            if match is not None and (best is None or match.substitutions < best.substitutions):
+                best = match
+                if not match.substitutions:
+                    break
+        return best
+
+    def is_valid(self, text):
+        """ True if text fits a format as it is, without corrections. """
+        match = self.parse(text)
+        return match is not None and match.substitutions == 0
+
+    def rank(self, reads):
+        """
+        Turn (text, confidence) reads into valid plates: corrected text with a
+        confidence lowered per correction, one entry per plate, best first.
+        Reads may carry the OCR boxes they were joined from (see
+        merge_adjacent); a plate read from part of the boxes of another valid
+        plate is dropped, so a two-line plate wins over its top line.
+        """
+        matches = []
+        for read in reads:
+            match = self.parse(read[0])
+            if match is not None:
+                boxes = frozenset(read[2]) if len(read) > 2 else None
+                matches.append((match.text, read[1] * self.substitution_penalty ** match.substitutions, boxes))
+        chains = [boxes for _, _, boxes in matches if boxes is not None and len(boxes) > 1]
+        plates = {}
+        for text, score, boxes in matches:
+            if boxes is not None and any(boxes < chain for chain in chains):
+                continue
+            if score > plates.get(text, -1.0):
+                plates[text] = score
+        return sorted(plates.items(), key=lambda item: item[1], reverse=True)
+
+    def read(self, ocr_results):
+        """ Valid plates, as ranked (text, confidence) pairs, from EasyOCR (bbox, text, confidence) results. """
+        return self.rank(merge_adjacent(ocr_results))
+
+_grammars = {}
+
+def get_grammar(region=None):
+    """ Return the (cached) grammar of a region by name (the default region if None). """
+    name = region or DEFAULT_REGION
+    grammar = _grammars.get(name)
+    if grammar is None:
+        if name not in REGIONS:
+            raise ValueError(f"Unknown plate region {name!r}, expected one of {sorted(REGIONS)}")
+        grammar = _grammars[name] = PlateGrammar(REGIONS[name])
+    return grammar
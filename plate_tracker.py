@@ -0,0 +1,167 @@
+from collections import Counter, defaultdict
+
+from number_recognition import read_plate_candidates, best_plate
+
+def iou(a, b):
+    """ Intersection over union of two (x, y, w, h) boxes. """
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    iw = min(ax + aw, bx + bw) - max(ax, bx)
+    ih = min(ay + ah, by + bh) - max(ay, by)
+    if iw <= 0 or ih <= 0:
+        return 0.0
+    inter = iw * ih
+    return inter / float(aw * ah + bw * bh - inter)
+
+class Track:
+    """ A plate region followed across frames, with the OCR reads collected for it. """
+
+    def __init__(self, track_id, box, frame_index):
+        self.track_id = track_id
+        self.box = box
+        self.first_seen = frame_index
+        self.last_seen = frame_index
+        self.missing = 0       # Processed frames since the track was last matched
+        self.reads = []       # (text, confidence) of every OCR read on this track
+        self.ocr_frame = None  # Frame of the last OCR read
+
+    def add_read(self, text, confidence):
+        self.reads.append((text, confidence))
+
+    def plate(self):
+        """
+        Combine the reads into one plate string by voting per character.
+        Only reads with the most common length take part; each character
+        position is voted on separately, weighted by the read confidence.
+        Returns (text, confidence) or (None, 0.0) when there are no reads.
+        """
+        if not self.reads:
+            return None, 0.0
+
+        # Pick the plate length that has the most confidence behind it.
+        length_weight = Counter()
+        for text, conf in self.reads:
+            length_weight[len(text)] += conf
+        length = length_weight.most_common(1)[0][0]
+        reads = [(text, conf) for text, conf in self.reads if len(text) == length]
+
+        # Vote on each character position.
+        chars, confidences = [], []
+        total = sum(conf for _, conf in reads) or 1.0
+        for position in range(length):
+            votes = defaultdict(float)
+            for text, conf in reads:
+                votes[text[position]] += conf
+            char, weight = max(votes.items(), key=lambda item: item[1])
+            chars.append(char)
+            confidences.append(weight / total)
+
+        # Overall confidence: the best read's confidence, scaled by how much the reads agree.
+        best_conf = max(conf for _, conf in reads)
+        return ''.join(chars), best_conf * min(confidences)
+
+    def confidence(self):
+        return max((conf for _, conf in self.reads), default=0.0)
+
+class PlateTracker:
+    """
+    Keeps plate bounding boxes across frames (IoU matching) and only runs OCR
+    on new tracks or on tracks whose reads are not confident yet. When a track
+    has not been matched in max_missing processed frames it is closed and
+    reported once, with the voted plate string. Only frames passed to update()
+    count, not frame indices: while a vehicle waits at the barrier the motion
+    gate drops its frames, and its track stays open until it moves on.
+    """
+
+    def __init__(self, iou_threshold=0.3, min_confidence=0.6, max_reads=5, reread_interval=5, max_missing=10):
+        self.iou_threshold = iou_threshold      # Minimum IoU to match a box to a track.
+        self.min_confidence = min_confidence    # Tracks below this keep getting OCR reads...
+        self.max_reads = max_reads              # ...up to this many reads per track...
+        self.reread_interval = reread_interval  # ...at most once every this many frames.
+        self.max_missing = max_missing
+        self.tracks = []
+        self.next_id = 1
+        self.ocr_calls = 0
+
+    def match(self, boxes, frame_index):
+        """
+        Match this frame's boxes to the open tracks (greedy, best IoU first) and
+        start new tracks for unmatched boxes. Returns the (track, box) pairs.
+        """
+        pairs = sorted(
+            ((iou(track.box, box), t, b) for t, track in enumerate(self.tracks) for b, box in enumerate(boxes)),
+            reverse=True
+        )
+        used_tracks, used_boxes, matches = set(), set(), []
+        for score, t, b in pairs:
+            if score < self.iou_threshold:
+                break
+            if t in used_tracks or b in used_boxes:
+                continue
+            used_tracks.add(t)
+            used_boxes.add(b)
+            matches.append((self.tracks[t], boxes[b]))
+
+        for b, box in enumerate(boxes):
+            if b not in used_boxes:
+                track = Track(self.next_id, box, frame_index)
+                self.next_id += 1
+                self.tracks.append(track)
+                matches.append((track, box))
+
+        for track in self.tracks:
+            track.missing += 1
+        for track, box in matches:
+            track.box = box
+            track.last_seen = frame_index
+            track.missing = 0
+        return matches
+
+    def needs_ocr(self, track, frame_index):
+        """ New tracks are always read; others only while their confidence is low. """
+        if track.ocr_frame is None:
+            return True
+        return (track.confidence() < self.min_confidence
+                and len(track.reads) < self.max_reads
+                and frame_index - track.ocr_frame >= self.reread_interval)
+
+    def update(self, frame_index, img, boxes):
+        """
+        Process the plate candidate boxes of one frame: match them to tracks,
+        run OCR where needed, and return the tracks closed in this frame as
+        a list of (track_id, text, confidence) gate events.
+        """
+        for track, box in self.match(boxes, frame_index):
+            if self.needs_ocr(track, frame_index):
+                self.ocr_calls += 1
+                track.ocr_frame = frame_index
+                text, confidence = best_plate(read_plate_candidates(img, [box]))
+                if text is not None:
+                    track.add_read(text, confidence)
+        return self.close(lambda track: track.missing > self.max_missing)
+
+    def close(self, expired=lambda track: True):
+        """ Close the expired tracks (all by default) and return their gate events. """
+        events, open_tracks = [], []
+        for track in self.tracks:
+            if not expired(track):
+                open_tracks.append(track)
+                continue
+            text, confidence = track.plate()
+            if text is not None:
+                events.append((track.track_id, text, confidence))
+        self.tracks = open_tracks
+        return events
+
+def track_plates(candidates, tracker=None):
+    """
+    Turn a stream of (frame_index, img, boxes) plate candidates (see
+    frame_stream.plate_candidates) into one (track_id, text, confidence)
+    event per vehicle. Remaining tracks are closed when the stream ends.
+    """
+    tracker = tracker or PlateTracker()
+    for frame_index, img, boxes in candidates:
+        for event in tracker.update(frame_index, img, boxes):
+            yield event
+    for event in tracker.close():
+        yield event
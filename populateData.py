@@ -1,42 +1,43 @@
-from app.models import User
+from app import create_app, prepare_database
+from app.bulk_users import import_users
 
-# Creating dummy data
-user1 = User(
-    name="John Doe",
-    email="johndoe@example.com",
-    password="password123",
-    phone_number=1234567890,
-    role="Admin",
-    status="Active",
-    gate_no=1
-)
+# Dummy users; passwords are hashed by import_users.
+users = [
+    {
+        'name': "John Doe",
+        'email': "johndoe@example.com",
+        'password': "password123",
+        'phone_number': "1234567890",
+        'role': "admin",
+        'status': "active",
+        'gate_no': 1
+    },
+    {
+        'name': "Jane Smith",
+        'email': "janesmith@example.com",
+        'password': "password456",
+        'phone_number': "9876543210",
+        'role': "guard",
+        'status': "inactive",
+        'gate_no': 2
+    },
+    {
+        'name': "Alice Johnson",
+        'email': "alicej@example.com",
+        'password': "password789",
+        'phone_number': "5555555555",
+        'role': "user",
+        'status': "active",
+        'gate_no': 3
+    },
+]
 
-user2 = User(
-    name="Jane Smith",
-    email="janesmith@example.com",
-    password="password456",
-    phone_number=9876543210,
-    role="Guard",
-    status="Inactive",
-    gate_no=2
-)
-
-user3 = User(
-    name="Alice Johnson",
-    email="alicej@example.com",
-    password="password789",
-    phone_number=5555555555,
-    role="User",
-    status="Active",
-    gate_no=3
-)
-
-# Adding users to the session
-db.session.add(user1)
-db.session.add(user2)
-db.session.add(user3)
-
-# Committing the session to save users in the database
-db.session.commit()
-
-print("Dummy data inserted successfully.")
+if __name__ == '__main__':
+    # For bigger files use the CLI: flask --app run users import users.csv
+    app = create_app()
+    prepare_database(app)
+    with app.app_context():
+        report = import_users(users)
+    for error in report.errors:
+        print(f"Row {error['row']} ({error['email']}): {error['error']}")
+    print(f"Dummy data inserted: {report.imported} users.")
@@ -0,0 +1,281 @@
+import argparse
+import json
+import multiprocessing
+import os
+import sqlite3
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+from ocr_pool import init_worker
+from preprocessing import PROFILES
+from result_cache import content_hash
+
+VALID_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp')
+
+def _list_directory(directory, extensions):
+    """
+    Return the images of a directory as (path, mtime_ns, size) and its
+    subdirectories, both sorted by name. Unreadable entries are reported and
+    skipped.
+    """
+    try:
+        with os.scandir(directory) as entries:
+            entries = sorted(entries, key=lambda entry: entry.name)
+    except OSError as e:
+        print(f"Skipping {directory}: {e}", file=sys.stderr)
+        return [], []
+    files, subdirectories = [], []
+    for entry in entries:
+        try:
+            if entry.is_dir(follow_symlinks=False):
+                subdirectories.append(entry.path)
+            elif entry.name.lower().endswith(extensions) and entry.is_file():
+                stat = entry.stat()
+                files.append((entry.path, stat.st_mtime_ns, stat.st_size))
+        except OSError as e:
+            print(f"Skipping {entry.path}: {e}", file=sys.stderr)
+    return files, subdirectories
+
+def scan(roots, extensions=VALID_EXTENSIONS, threads=8):
+    """
+    Walk directory trees and yield (path, mtime_ns, size) of every image.
+    Directories are listed by a pool of threads (the subdirectories of a
+    directory are listed while its files are being processed, which matters
+    on network storage), but files are yielded in the same sorted, depth
+    first order on every run. Nothing is listed up front.
+    """
+    executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='scan')
+    try:
+        stack = [executor.submit(_list_directory, os.path.abspath(root), extensions) for root in reversed(roots)]
+        while stack:
+            files, subdirectories = stack.pop().result()
+            stack.extend(reversed([executor.submit(_list_directory, subdirectory, extensions)
+                                   for subdirectory in subdirectories]))
+            yield from files
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+def _process(path, data, profile):
+    """ Recognise one image (executed in a worker process). Errors are returned, not raised. """
+    from number_recognition import detect_license_plate_from_bytes
+    start = time.perf_counter()
+    record = {'hash': None, 'plate': None, 'confidence': 0.0, 'error': None}
+    try:
+        if data is None:
+            with open(path, 'rb') as f:
+                data = f.read()
+        record['hash'] = content_hash(data)
+        text, confidence = detect_license_plate_from_bytes(data, profile, use_cache=False)
+        record.update(plate=text, confidence=float(confidence))
+    except Exception as e:
+        record['error'] = f"{type(e).__name__}: {e}"
+    record['seconds'] = round(time.perf_counter() - start, 4)
+    return record
+
+class NdjsonStore:
+    """
+    Results as one JSON object per line, appended as they come in. The file
+    is also the checkpoint: on start the records already in it are loaded,
+    and a line cut off by a crash is ignored.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.files = {}     # path -> (mtime_ns, size, failed)
+        self.hashes = set()  # content hashes of files processed without error
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                for line in f:
+                    try:
+                        self._remember(json.loads(line))
+                    except (ValueError, KeyError, TypeError):
+                        continue  # A cut off or foreign line.
+        self._file = open(path, 'ab')
+        if self._file.tell() and not self._ends_with_newline():
+            self._file.write(b'\n')
+
+    def _ends_with_newline(self):
+        with open(self.path, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b'\n'
+
+    def _remember(self, record):
+        self.files[record['path']] = (record['mtime_ns'], record['size'], record['error'] is not None)
+        if record['error'] is None and record['hash']:
+            self.hashes.add(record['hash'])
+
+    def seen(self, path, mtime_ns, size, retry_errors=False):
+        known = self.files.get(path)
+        return known is not None and known[:2] == (mtime_ns, size) and not (retry_errors and known[2])
+
+    def seen_hash(self, digest):
+        return digest in self.hashes
+
+    def add(self, record):
+        self._remember(record)
+        self._file.write(json.dumps(record).encode() + b'\n')
+
+    def checkpoint(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        self.checkpoint()
+        self._file.close()
+
+class SqliteStore:
+    """
+    Results in a SQLite table, one row per file (a re-processed file replaces
+    its row). Rows are committed at every checkpoint, so after a crash only
+    the results since the last checkpoint are processed again.
+    """
+
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS results (path TEXT PRIMARY KEY, mtime_ns INTEGER, size INTEGER, "
+            "hash TEXT, plate TEXT, confidence REAL, error TEXT, seconds REAL, processed_at REAL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS results_hash ON results (hash)")
+        self.conn.commit()
+
+    def seen(self, path, mtime_ns, size, retry_errors=False):
+        row = self.conn.execute("SELECT mtime_ns, size, error FROM results WHERE path = ?", (path,)).fetchone()
+        return row is not None and row[:2] == (mtime_ns, size) and not (retry_errors and row[2] is not None)
+
+    def seen_hash(self, digest):
+        return self.conn.execute(
+            "SELECT 1 FROM results WHERE hash = ? AND error IS NULL LIMIT 1", (digest,)).fetchone() is not None
+
+    def add(self, record):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO results VALUES (:path, :mtime_ns, :size, :hash, :plate, :confidence, "
+            ":error, :seconds, :processed_at)", record
+        )
+
+    def checkpoint(self):
+        self.conn.commit()
+
+    def close(self):
+        self.checkpoint()
+        self.conn.close()
+
+def open_store(path, fmt=None):
+    """ Open the result store, SQLite for .db/.sqlite files (or fmt='sqlite'), NDJSON otherwise. """
+    fmt = fmt or ('sqlite' if path.lower().endswith(('.db', '.sqlite', '.sqlite3')) else 'ndjson')
+    return SqliteStore(path) if fmt == 'sqlite' else NdjsonStore(path)
+
+def reprocess(roots, store, workers=None, profile=None, match='path', retry_errors=False,
+              checkpoint_every=100, threads_per_worker=1, progress=True, scan_threads=8):
+    """
+    Recognise every image below roots that the store has no result for and
+    add the results to the store. Files are matched by path, mtime and size,
+    or with match='hash' by content (renamed or copied files are skipped too,
+    at the cost of reading every file up front). Returns the counts.
+    """
+    workers = workers or os.cpu_count() or 1
+    max_pending = workers * 4  # Bounds memory: files are read as the workers need them.
+    counts = {'scanned': 0, 'skipped': 0, 'processed': 0, 'plates': 0, 'errors': 0}
+    start = time.perf_counter()
+    pending = {}
+
+    def collect(done):
+        for future in done:
+            path, mtime_ns, size = pending.pop(future)
+            try:
+                record = future.result()
+            except Exception as e:
+                record = {'hash': None, 'plate': None, 'confidence': 0.0,
+                          'error': f"{type(e).__name__}: {e}", 'seconds': None}
+            record.update(path=path, mtime_ns=mtime_ns, size=size, processed_at=time.time())
+            store.add(record)
+            counts['processed'] += 1
+            counts['plates'] += record['plate'] is not None
+            counts['errors'] += record['error'] is not None
+            if counts['processed'] % checkpoint_every == 0:
+                store.checkpoint()
+                if progress:
+                    rate = counts['processed'] / (time.perf_counter() - start)
+                    print(f"{counts['processed']} processed, {counts['skipped']} skipped, "
+                          f"{counts['errors']} errors ({rate:.1f} images/s)", file=sys.stderr)
+
+    # Use spawn so workers load their own OCR reader, like the OCR worker pool.
+    executor = ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=init_worker,
+        initargs=(threads_per_worker,)
+    )
+    try:
+        for path, mtime_ns, size in scan(roots, threads=scan_threads):
+            counts['scanned'] += 1
+            if store.seen(path, mtime_ns, size, retry_errors):
+                counts['skipped'] += 1
+                continue
+            data = None
+            if match == 'hash':
+                try:
+                    with open(path, 'rb') as f:
+                        data = f.read()
+                except OSError:
+                    data = None  # The worker records the error.
+                if data is not None and store.seen_hash(content_hash(data)):
+                    counts['skipped'] += 1
+                    continue
+            while len(pending) >= max_pending:
+                collect(wait(pending, return_when=FIRST_COMPLETED).done)
+            pending[executor.submit(_process, path, data, profile)] = (path, mtime_ns, size)
+        while pending:
+            collect(wait(pending, return_when=FIRST_COMPLETED).done)
+    finally:
+        # On Ctrl-C or a crash, keep what finished; the rest is picked up by the next run.
+        executor.shutdown(wait=False, cancel_futures=True)
+        store.checkpoint()
+    counts['seconds'] = time.perf_counter() - start
+    return counts
+
+def main():
+    """
+    Re-run plate recognition over archives of gate captures, e.g. after a
+    model or preprocessing change. Directory trees are scanned recursively
+    by a pool of threads and the images are recognised in parallel worker
+    processes. Results go
+    to an NDJSON or SQLite file that doubles as the checkpoint: run the same
+    command again after an interruption and it resumes, skipping files that
+    already have a result. Use a new output file to reprocess everything.
+
+        python reprocess.py /data/captures --output results-2024-06.db
+    """
+    parser = argparse.ArgumentParser(description="Re-run plate recognition over directories of images.")
+    parser.add_argument("roots", nargs="+", help="Directories to scan recursively.")
+    parser.add_argument("--output", required=True, help="Result file: .db/.sqlite for SQLite, NDJSON otherwise.")
+    parser.add_argument("--format", choices=['ndjson', 'sqlite'], help="Override the format chosen by extension.")
+    parser.add_argument("--workers", type=int, help="Worker processes (default: number of CPUs).")
+    parser.add_argument("--threads-per-worker", type=int, default=1, help="Torch threads per worker.")
+    parser.add_argument("--profile", choices=sorted(PROFILES), help="Preprocessing profile (default: quality).")
+    parser.add_argument("--match", choices=['path', 'hash'], default='path',
+                        help="Skip files with a result for the same path, mtime and size, or the same content.")
+    parser.add_argument("--retry-errors", action="store_true", help="Process files that failed before again.")
+    parser.add_argument("--scan-threads", type=int, default=8, help="Threads listing directories.")
+    parser.add_argument("--checkpoint-every", type=int, default=100, help="Results between checkpoints.")
+    args = parser.parse_args()
+
+    store = open_store(args.output, args.format)
+    try:
+        counts = reprocess(args.roots, store, args.workers, args.profile, args.match, args.retry_errors,
+                           args.checkpoint_every, args.threads_per_worker,
+                           scan_threads=args.scan_threads)
+    except KeyboardInterrupt:
+        print("Interrupted, run the same command again to resume.", file=sys.stderr)
+        sys.exit(130)
+    finally:
+        store.close()
+
+    rate = counts['processed'] / counts['seconds'] if counts['seconds'] else 0.0
+    print(f"Scanned {counts['scanned']} images: {counts['processed']} processed ({rate:.1f} images/s), "
+          f"{counts['skipped']} already done, {counts['plates']} plates, {counts['errors']} errors")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+def content_hash(data):
+    """
+    Hash of image content used as cache key: either the encoded bytes or a
+    decoded image array (its shape is part of the hash).
+    """
+    # sha256 is hardware accelerated on most CPUs, which makes it faster than blake2b here.
+    digest = hashlib.sha256()
+    if isinstance(data, np.ndarray):
+        digest.update(str(data.shape).encode())
+        data = np.ascontiguousarray(data)
+    digest.update(data)
+    return digest.hexdigest()[:32]
+
+class ResultCache:
+    """
+    LRU cache of recognition results with size and TTL based eviction.
+    Entries can optionally be backed by a SQLite file on local disk, so that
+    they survive restarts and are shared by the worker processes.
+    hits and misses count lookups in memory and on disk.
+    """
+
+    def __init__(self, max_entries=10000, ttl=3600, path=None):
+        self.max_entries = max_entries
+        self.ttl = ttl  # Seconds an entry stays valid (None: forever).
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (stored_at, value), least recently used first
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        if path:
+            with self._connect() as conn:
+                conn.execute('CREATE TABLE IF NOT EXISTS results '
+                             '(key TEXT PRIMARY KEY, stored_at REAL NOT NULL, value TEXT NOT NULL)')
+
+    def _connect(self):
+        # sqlite3 connections cannot be shared between threads, so keep one per thread.
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.path, timeout=5)
+        return conn
+
+    def _expired(self, stored_at, now):
+        return self.ttl is not None and now - stored_at > self.ttl
+
+    def get(self, key, default=None):
+        """ Return the cached value for key, or default if missing or expired. """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if not self._expired(entry[0], now):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._entries[key]
+
+        if self.path:
+            row = self._connect().execute('SELECT stored_at, value FROM results WHERE key = ?', (key,)).fetchone()
+            if row is not None and not self._expired(row[0], now):
+                value = json.loads(row[1])
+                self._store(key, row[0], value)
+                with self._lock:
+                    self.hits += 1
+                return value
+
+        with self._lock:
+            self.misses += 1
+        return default
+
+    def _store(self, key, stored_at, value):
+        with self._lock:
+            self._entries[key] = (stored_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def set(self, key, value):
+        """ Store a JSON-serialisable value. """
+        now = time.time()
+        self._store(key, now, value)
+        if self.path:
+            with self._connect() as conn:
+                conn.execute('INSERT OR REPLACE INTO results (key, stored_at, value) VALUES (?, ?, ?)',
+                             (key, now, json.dumps(value)))
+
+    def purge(self):
+        """ Drop expired entries from memory and disk. """
+        now = time.time()
+        with self._lock:
+            for key in [key for key, (stored_at, _) in self._entries.items() if self._expired(stored_at, now)]:
+                del self._entries[key]
+        if self.path and self.ttl is not None:
+            with self._connect() as conn:
+                conn.execute('DELETE FROM results WHERE stored_at < ?', (now - self.ttl,))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self.path:
+            with self._connect() as conn:
+                conn.execute('DELETE FROM results')
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses,
+                    'hit_rate': self.hits / float(lookups) if lookups else 0.0}
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+def get_result_cache():
+    """
+    Return the process-wide result cache, configured from RESULT_CACHE_SIZE,
+    RESULT_CACHE_TTL (seconds) and RESULT_CACHE_PATH (SQLite file, optional).
+    """
+    global _default_cache
+    if _default_cache is None:
+        with _default_lock:
+            if _default_cache is None:
+                _default_cache = ResultCache(
+                    max_entries=int(os.environ.get('RESULT_CACHE_SIZE', 10000)),
+                    ttl=float(os.environ.get('RESULT_CACHE_TTL', 3600)),
+                    path=os.environ.get('RESULT_CACHE_PATH') or None
+                )
+    return _default_cache
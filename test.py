@@ -1,121 +1,168 @@
 import cv2
-import numpy as np
-import easyocr
+import argparse
 import os
-import re
-
-# Initialize the OCR reader. Using GPU for better performance and accuracy (if available).
-reader = easyocr.Reader(['en'], gpu=True)
-
-# Define a regular expression to match license plate formats (example: Indian plates).
-# Adjust this regex for other regions as needed.
-LICENSE_PLATE_PATTERN = re.compile(r'^[A-Z0-9]{6,10}$')
-
-def preprocess_image(img):
-    """ 
-    Preprocess the image to improve OCR results by:
-    1. Converting it to grayscale.
-    2. Applying CLAHE to enhance contrast.
-    3. Denoising to reduce noise.
-    4. Using adaptive thresholding for better binarization.
-    5. Performing morphological operations to improve edge detection.
+import time
+
+import ocr_reader
+from candidate_scheduler import EARLY_EXIT_CONFIDENCE, rank_candidates
+from metrics import OCR_CANDIDATES, OCR_FALLBACKS, OCR_FRAMES, OCR_STAGE_SECONDS, observe_candidate_search
+from number_recognition import (OCR_OPTIONS, best_plate, crop_plate_region, detect_license_plate_from_image,
+                                filter_plate_results, resize_frame)
+from ocr_reader import get_reader
+from preprocessing import PROFILES, find_plate_candidates, to_gray
+
+def read_image(image):
+    """ Decode an image file (decoded BGR arrays are used as they are). Raises ValueError if it can't be read. """
+    if not isinstance(image, str):
+        return image
+    start = time.perf_counter()
+    img = cv2.imread(image)
+    if img is None:
+        raise ValueError(f"Could not read image {image}")
+    OCR_STAGE_SECONDS.observe(time.perf_counter() - start, 'decode')
+    return img
+
+def load_image(image):
     """
-    # Convert the image to grayscale for easier processing.
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-
-    # Use CLAHE (Contrast Limited Adaptive Histogram Equalization) for better contrast.
-    clahe = cv2.createCLAHE(clipLimit=3.0, tileGridSize=(8, 8))
-    gray = clahe.apply(gray)
-
-    # Apply fast Non-Local Means Denoising to remove image noise.
-    gray = cv2.fastNlMeansDenoising(gray, h=30)
-
-    # Use adaptive thresholding for binarization (handles varying lighting conditions).
-    binary = cv2.adaptiveThreshold(
-        gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 11, 2
-    )
-
-    # Use dilation to emphasize edges and contours.
-    kernel = np.ones((3, 3), np.uint8)
-    binary = cv2.dilate(binary, kernel, iterations=1)
-
-    return binary
-
-def detect_license_plate(image_path):
+    Load an image for plate detection.
+    Accepts either a file path or an already decoded BGR array, resizes
+    frames wider than 800px like number_recognition does.
+    """
+    img = read_image(image)
+    start = time.perf_counter()
+    img = resize_frame(img)
+    OCR_STAGE_SECONDS.observe(time.perf_counter() - start, 'resize')
+    return img
+
+def detect_license_plate(image_path, profile=None, min_confidence=EARLY_EXIT_CONFIDENCE, budget_ms=None,
+                         fallback=True):
     """ 
     Detect and extract license plate text from the given image.
-    The function:
+    Runs number_recognition.detect_license_plate_from_image, the pipeline
+    the app uses:
     1. Preprocesses the image.
     2. Finds contours to detect possible license plate regions.
     3. Filters regions based on aspect ratio and size.
-    4. Runs OCR on candidate regions.
+    4. Runs OCR on candidate regions, most plate-like first, and stops at the
+       first plate with at least min_confidence (None reads all candidates).
     5. Returns the best match based on confidence.
+    budget_ms limits the time spent per image, including the optional fallback.
+    """
+    return detect_license_plate_from_image(read_image(image_path), profile, min_confidence, budget_ms, fallback)
+
+def pad_to_shape(img, height, width):
+    """
+    Pad an image with black borders (bottom and right) up to the given size.
+    Padding keeps the text geometry intact, unlike resizing, so the OCR
+    detector finds the same text boxes as on the original crop.
     """
-    # Load the image from the given path.
-    img = cv2.imread(image_path)
-
-    # Resize image if width is greater than 800px to maintain consistent OCR performance.
-    height, width = img.shape[:2]
-    if width > 800:
-        img = cv2.resize(img, (800, int(800 * height / width)))
-
-    # Preprocess the image to prepare it for contour detection.
-    binary = preprocess_image(img)
-
-    # Find contours in the preprocessed binary image.
-    contours, _ = cv2.findContours(binary, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-    plate_candidates = []
-
-    # Loop through contours and filter them based on aspect ratio and size.
-    for contour in sorted(contours, key=cv2.contourArea, reverse=True)[:15]:
-        x, y, w, h = cv2.boundingRect(contour)
-        aspect_ratio = float(w) / h
-
-        # Check if the contour matches typical license plate dimensions.
-        if 2.0 <= aspect_ratio <= 5.0 and w > 100:
-            plate_candidates.append((x, y, w, h))
-
-    results = []  # Store detected license plates and confidence scores.
-
-    # Process each detected region to apply OCR.
-    for (x, y, w, h) in plate_candidates:
-        # Add padding to the detected region for better OCR results.
-        padding = 10
-        x1, y1 = max(0, x - padding), max(0, y - padding)
-        x2, y2 = min(img.shape[1], x + w + padding), min(img.shape[0], y + h + padding)
-        plate_region = img[y1:y2, x1:x2]
-
-        # Apply OCR to the detected plate region.
-        ocr_results = reader.readtext(
-            plate_region,
-            allowlist='0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ',  # Restrict characters to alphanumeric.
-            height_ths=0.5,  # Adjust threshold for text height in region.
-            width_ths=0.5    # Adjust threshold for text width in region.
-        )
-
-        # Filter OCR results using the regex pattern for license plates.
-        for (bbox, text, conf) in ocr_results:
-            if LICENSE_PLATE_PATTERN.match(text):
-                results.append((text, conf))
-
-    # If no plates are found, try a fallback OCR on the full image.
-    if not results:
-        ocr_results = reader.readtext(
-            img,
-            allowlist='0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ',
-            height_ths=0.5,
-            width_ths=0.5
-        )
-        for (bbox, text, conf) in ocr_results:
-            if LICENSE_PLATE_PATTERN.match(text):
-                results.append((text, conf))
-
-    # Return the best result based on the highest confidence score.
-    if results:
-        results.sort(key=lambda x: x[1], reverse=True)
-        return results[0]  # Return the text and confidence of the best match.
-
-    return None, 0.0  # No valid license plate detected.
+    pad_bottom, pad_right = height - img.shape[0], width - img.shape[1]
+    if pad_bottom == 0 and pad_right == 0:
+        return img
+    return cv2.copyMakeBorder(img, 0, pad_bottom, 0, pad_right, cv2.BORDER_CONSTANT, value=0)
+
+def readtext_batched(crops, batch_size=8, bucket=64):
+    """
+    Run OCR on many crops using EasyOCR's batched recognition.
+    readtext_batched needs equally sized inputs, so crops are grouped into
+    size buckets (rounded up to a multiple of `bucket` pixels) and padded to
+    the bucket size. Returns one list of OCR results per crop, in input order.
+    Each batch's time is recorded as the 'readtext' stage, split evenly over
+    its crops, so the metrics count one OCR read per crop like the
+    single-image path.
+    """
+    results = [None] * len(crops)
+
+    # Group crops by their padded size so that padding overhead stays small.
+    buckets = {}
+    for index, crop in enumerate(crops):
+        height = -(-crop.shape[0] // bucket) * bucket
+        width = -(-crop.shape[1] // bucket) * bucket
+        buckets.setdefault((height, width), []).append(index)
+
+    # Run each bucket through the OCR model, batch_size crops at a time.
+    for (height, width), indices in buckets.items():
+        for start in range(0, len(indices), batch_size):
+            chunk = indices[start:start + batch_size]
+            padded = [pad_to_shape(crops[i], height, width) for i in chunk]
+            start_time = time.perf_counter()
+            batch_results = get_reader().readtext_batched(padded, batch_size=batch_size, **OCR_OPTIONS)
+            elapsed = (time.perf_counter() - start_time) / len(chunk)
+            for _ in chunk:
+                OCR_STAGE_SECONDS.observe(elapsed, 'readtext')
+            for i, ocr_results in zip(chunk, batch_results):
+                results[i] = ocr_results
+
+    return results
+
+def detect_license_plates(images, batch_size=8, profile=None, min_confidence=EARLY_EXIT_CONFIDENCE):
+    """
+    Detect license plates in many images at once.
+    Same pipeline and result per image as detect_license_plate(image,
+    profile, min_confidence), but the candidate crops from all frames are
+    gathered and sent to the OCR model in batches:
+    1. Loads every image and finds its plate candidates, in score order.
+    2. Runs batched OCR on all candidate crops.
+    3. Keeps each frame's reads up to the first crop with a plate of at
+       least min_confidence, like the single-image early exit (None keeps all).
+    4. Runs a batched fallback OCR on the frames with no valid plate.
+    5. Returns the best (text, confidence) per image, in input order.
+    Differences: every candidate is read (the early exit only picks the
+    results), there is no latency budget, and crops are padded to their
+    size bucket (see readtext_batched), which can change what EasyOCR reads
+    on a crop compared with the unpadded single-image read.
+    """
+    frames = [load_image(image) for image in images]
+
+    # Gather candidate crops from every frame and remember which frame they came from.
+    # Score order, as in the single-image path, so the early exit stops at the same crop.
+    crops, owners = [], []
+    for frame_index, img in enumerate(frames):
+        timings = {}
+        start = time.perf_counter()
+        gray = to_gray(img)  # For the contour search and the ranking; OCR reads the BGR crops.
+        timings['grayscale'] = time.perf_counter() - start
+        boxes = find_plate_candidates(gray, profile, timings)
+        observe_candidate_search(timings)
+        for box in rank_candidates(gray, boxes):
+            crops.append(crop_plate_region(img, box))
+            owners.append(frame_index)
+    OCR_CANDIDATES.inc(amount=len(crops))
+
+    results = [[] for _ in frames]  # Detected plates and confidence scores per frame.
+
+    # Apply OCR to all candidate regions and map the results back to their frame.
+    done = set()  # Frames that reached min_confidence: later crops are ignored, as if never read.
+    for frame_index, ocr_results in zip(owners, readtext_batched(crops, batch_size)):
+        if frame_index in done:
+            continue
+        matches = filter_plate_results(ocr_results)
+        results[frame_index].extend(matches)
+        if min_confidence is not None and any(conf >= min_confidence for _, conf in matches):
+            done.add(frame_index)
+
+    # Fallback OCR on the full image for the frames where no plate was found.
+    missing = [i for i, frame_results in enumerate(results) if not frame_results]
+    if missing:
+        OCR_FALLBACKS.inc(amount=len(missing))
+        fallback = readtext_batched([frames[i] for i in missing], batch_size)
+        for frame_index, ocr_results in zip(missing, fallback):
+            results[frame_index].extend(filter_plate_results(ocr_results))
+
+    plates = [best_plate(frame_results) for frame_results in results]
+    for text, _ in plates:
+        OCR_FRAMES.inc('plate' if text else 'none')
+    return plates
+
+def report(filename, result):
+    """ Print the detection result of one image and return its confidence (0 if nothing was found). """
+    text, confidence = result
+    if text is None:
+        print(f"\n{filename}: No license plate detected")
+        return 0.0
+    print(f"\n{filename}: Detected Text: {text}")
+    print(f"Confidence: {confidence:.2f}")
+    return confidence
 
 def main():
     """ 
@@ -123,35 +170,66 @@ def main():
     For each image:
     1. Detect license plates and extract text.
     2. Calculate the average confidence of all successful detections.
+    3. Report the throughput in images per second.
+    With --batch, images are processed batch_size at a time through
+    detect_license_plates instead of one by one.
     """
-    folder_path = "./images"  # Folder containing images to process.
+    parser = argparse.ArgumentParser(description="Detect license plates in a folder of images.")
+    parser.add_argument("folder", nargs="?", default="./images", help="Folder containing images to process.")
+    parser.add_argument("--batch", action="store_true", help="Use the batched multi-image API.")
+    parser.add_argument("--batch-size", type=int, default=8, help="Images (and OCR crops) per batch.")
+    parser.add_argument("--profile", choices=sorted(PROFILES), help="Preprocessing profile (default: quality).")
+    parser.add_argument("--budget-ms", type=float, help="Latency budget per image (single-image mode).")
+    parser.add_argument("--no-fallback", action="store_true", help="Skip the full-image fallback OCR.")
+    parser.add_argument("--gpu", action="store_true", help="Run the OCR model on the GPU.")
+    parser.add_argument("--model-dir", help="Directory holding the EasyOCR model files.")
+    args = parser.parse_args()
+
+    # Load the OCR model up front so that model load is not counted in the timings.
+    ocr_reader.configure(gpu=args.gpu or None, model_storage_directory=args.model_dir)
+    ocr_reader.warmup()
+
+    folder_path = args.folder  # Folder containing images to process.
     valid_extensions = ('.jpg', '.jpeg', '.png', '.webp')
+    filenames = [f for f in sorted(os.listdir(folder_path)) if f.lower().endswith(valid_extensions)]
 
     total_confidence = 0.0  # Sum of all confidence scores.
     num_detections = 0      # Count of successful detections.
+    start = time.perf_counter()
 
-    # Loop through all files in the folder and process valid images.
-    for filename in os.listdir(folder_path):
-        if filename.lower().endswith(valid_extensions):
-            print(f"\nProcessing {filename}...")
+    if args.batch:
+        # Process the images batch_size at a time.
+        for start_index in range(0, len(filenames), args.batch_size):
+            names = filenames[start_index:start_index + args.batch_size]
+            paths = [os.path.join(folder_path, filename) for filename in names]
+            try:
+                results = detect_license_plates(paths, batch_size=args.batch_size, profile=args.profile)
+            except Exception as e:
+                print(f"Error processing batch {names}: {str(e)}")
+                continue
+            for filename, result in zip(names, results):
+                confidence = report(filename, result)
+                if result[0] is not None:
+                    total_confidence += confidence
+                    num_detections += 1
+    else:
+        # Loop through all files in the folder and process valid images.
+        for filename in filenames:
             img_path = os.path.join(folder_path, filename)
-
             try:
                 # Detect license plate and get the result.
-                result = detect_license_plate(img_path)
-                if result:
-                    text, confidence = result
-                    print(f"Detected Text: {text}")
-                    print(f"Confidence: {confidence:.2f}")
-
+                result = detect_license_plate(img_path, args.profile, budget_ms=args.budget_ms,
+                                              fallback=not args.no_fallback)
+                confidence = report(filename, result)
+                if result[0] is not None:
                     # Accumulate confidence scores and count successful detections.
                     total_confidence += confidence
                     num_detections += 1
-                else:
-                    print("No license plate detected")
             except Exception as e:
                 print(f"Error processing {filename}: {str(e)}")
 
+    elapsed = time.perf_counter() - start
+
     # Calculate and display the average confidence score.
     if num_detections > 0:
         avg_confidence = total_confidence / num_detections
@@ -159,6 +237,10 @@ def main():
     else:
         print("\nNo valid license plates detected in any image.")
 
+    # Display the throughput so single and batch mode can be compared.
+    if filenames:
+        print(f"Processed {len(filenames)} images in {elapsed:.2f}s ({len(filenames) / elapsed:.2f} images/s)")
+
 # Entry point of the script.
 if __name__ == "__main__":
     main()
@@ -0,0 +1,52 @@
+from plate_grammar import get_grammar
+
+def box(x1, y1, x2, y2):
+    # EasyOCR box: four corner points, clockwise from the top left.
+    return [[x1, y1], [x2, y1], [x2, y2], [x1, y2]]
+
+def test_one_line_plate():
+    grammar = get_grammar('IN')
+    assert grammar.read([(box(10, 10, 210, 50), 'KA 01 AB 1234', 0.9)]) == [('KA01AB1234', 0.9)]
+    assert grammar.is_valid('DL3CAF0001')
+    assert grammar.is_valid('MH12A123')
+    assert grammar.is_valid('MH121234')
+
+def test_one_line_plate_corrections():
+    grammar = get_grammar('IN')
+    match = grammar.parse('KA0IAB1234')
+    assert match.text == 'KA01AB1234' and match.substitutions == 1
+    # Series letters are never I or O: a fifth character there means a misread, not a longer series.
+    assert grammar.parse('KA01IAB1234') is None
+
+def test_fragments_are_not_plates():
+    grammar = get_grammar('IN')
+    assert grammar.parse('MH12') is None
+    assert grammar.parse('KA01') is None
+    assert grammar.parse('MH1A1') is None
+    # A number made only of corrections is a different layout, not a misread.
+    assert grammar.parse('MH12AB') is None
+
+def test_one_line_plate_split_in_two_boxes():
+    results = [(box(10, 10, 90, 50), 'KA01', 0.95), (box(100, 10, 200, 50), 'AB1234', 0.9)]
+    assert get_grammar('IN').read(results) == [('KA01AB1234', 0.9)]
+
+def test_two_line_plate():
+    results = [(box(40, 10, 160, 50), 'MH12', 0.95), (box(20, 60, 180, 100), 'AB1234', 0.9)]
+    assert get_grammar('IN').read(results) == [('MH12AB1234', 0.9)]
+
+def test_chain_wins_over_valid_fragment():
+    # MH12A123 is a plate by itself, but it is part of the longer joined read.
+    results = [(box(10, 10, 150, 50), 'MH12A123', 0.95), (box(155, 10, 175, 50), '4', 0.9)]
+    assert get_grammar('IN').read(results) == [('MH12A1234', 0.9)]
+
+def test_bharat_series_plate():
+    grammar = get_grammar('IN')
+    match = grammar.parse('22 BH 1234 AB')
+    assert match.text == '22BH1234AB' and match.format == 'in-bharat'
+    assert grammar.parse('22BH1234A8').text == '22BH1234AB'
+    assert grammar.read([(box(10, 10, 210, 50), '22BH1234AA', 0.8)]) == [('22BH1234AA', 0.8)]
+
+def test_generic_region():
+    grammar = get_grammar('generic')
+    assert grammar.is_valid('ABC123')
+    assert grammar.parse('AB12') is None
@@ -0,0 +1,33 @@
+import plate_tracker
+from plate_tracker import PlateTracker, track_plates
+
+def fake_ocr(monkeypatch, text='KA01AB1234', confidence=0.9):
+    # Every candidate box reads as the same plate; no OCR model needed.
+    monkeypatch.setattr(plate_tracker, 'read_plate_candidates', lambda img, boxes: [(text, confidence)])
+    monkeypatch.setattr(plate_tracker, 'best_plate', lambda reads: reads[0])
+
+def test_one_event_per_vehicle(monkeypatch):
+    fake_ocr(monkeypatch)
+    frames = [(i, None, [(100 + 2 * i, 200, 120, 30)]) for i in range(5)]
+    frames += [(i, None, []) for i in range(5, 20)]
+    assert list(track_plates(frames, PlateTracker(max_missing=3))) == [(1, 'KA01AB1234', 0.9)]
+
+def test_stop_and_go_keeps_the_track(monkeypatch):
+    # The car stops at the barrier: the motion gate drops frames 5-199. When it drives
+    # off, the first moving frames have no plate candidate (motion blur).
+    fake_ocr(monkeypatch)
+    frames = [(i, None, [(100 + 2 * i, 200, 120, 30)]) for i in range(5)]
+    frames += [(i, None, []) for i in range(200, 202)]
+    frames += [(i, None, [(110 + 2 * (i - 202), 200, 120, 30)]) for i in range(202, 207)]
+    frames += [(i, None, []) for i in range(207, 220)]
+    tracker = PlateTracker(max_missing=10)
+    assert list(track_plates(frames, tracker)) == [(1, 'KA01AB1234', 0.9)]
+    assert tracker.ocr_calls == 1
+
+def test_two_vehicles_in_a_row(monkeypatch):
+    fake_ocr(monkeypatch)
+    frames = [(i, None, [(100, 200, 120, 30)]) for i in range(3)]
+    frames += [(i, None, []) for i in range(3, 8)]
+    frames += [(i, None, [(100, 200, 120, 30)]) for i in range(8, 11)]
+    events = list(track_plates(frames, PlateTracker(max_missing=3)))
+    assert [track_id for track_id, _, _ in events] == [1, 2]